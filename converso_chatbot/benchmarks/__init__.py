@@ -0,0 +1,8 @@
+"""
+Benchmarks for the chatbot hot paths.
+
+They run against local stand-ins of the external services, so they don't need
+a network connection. Run them from the converso_chatbot folder, e.g.:
+
+    python -m benchmarks.bench_rabbitmq_producer
+"""
@@ -0,0 +1,115 @@
+"""
+Measures the throughput and the turn latency of the agent graph on recorded LLM responses,
+reproducibly and without network.
+
+The responses of --turns turns (a tool call and the answer, each taking --llm-latency seconds)
+are recorded from the ChatModelStandIn in the cassette, unless it already has them.
+The turns are then replayed by --concurrency threads, waiting the recorded latency of every
+response and with no latency: the second run measures the overhead of the graph itself.
+
+    python -m benchmarks.bench_agent_graph --turns 50 --concurrency 8
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from langchain.tools import StructuredTool
+
+from converso_chatbot.conversational_engine.form_agent import (
+    ChatFormAgentExecutor, cassette_chat_model, model_factory)
+from converso_chatbot.conversational_engine.form_agent.cassette_chat_model import \
+    get_cassette
+from converso_chatbot.conversational_engine.form_agent.model_factory import \
+    ModelFactory
+from converso_chatbot.conversational_engine.turn_context import (
+    TurnContext, use_turn_context)
+
+from .stand_ins import ChatModelStandIn
+
+
+def lookup(query: str) -> str:
+    """Looks up the opening hours of a shop"""
+    return f"{query}: open from 9 to 18"
+
+
+def build_tools() -> List[StructuredTool]:
+    return [StructuredTool.from_function(func=lookup, name="Lookup")]
+
+
+def use_cassette(mode: str, path: str, latency: str, chat_model: ChatModelStandIn) -> None:
+    """The LLMs built by the ModelFactory from now on answer from the cassette"""
+    cassette_chat_model.LLM_CASSETTE_MODE = mode
+    cassette_chat_model.LLM_CASSETTE_PATH = path
+    cassette_chat_model.LLM_CASSETTE_LATENCY = latency
+    model_factory.ChatOpenAI = lambda **params: chat_model
+    ModelFactory.llm_cache.clear()
+    ModelFactory.agent_cache.clear()
+
+
+def run_turn(graph: ChatFormAgentExecutor, turn: int) -> float:
+    inputs = {
+        "input": f"When is shop {turn} open?",
+        "chat_history": [],
+        "intermediate_steps": [],
+        "active_form_tool": None
+    }
+    start = time.perf_counter()
+    with use_turn_context(TurnContext(chat_id=str(turn), tools=build_tools())):
+        for output in graph.app.stream(inputs, config={"recursion_limit": 25}):
+            pass
+    if "open from 9 to 18" not in graph.parse_output(output):
+        raise RuntimeError(f"Unexpected answer in turn {turn}")
+    return time.perf_counter() - start
+
+
+def run(name: str, graph: ChatFormAgentExecutor, turns: int, concurrency: int) -> dict:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = sorted(executor.map(
+            lambda turn: run_turn(graph, turn), range(turns)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "run": name,
+        "turns": turns,
+        "concurrency": concurrency,
+        "turns/s": round(turns / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.2,
+                        help="Seconds of each recorded LLM response")
+    parser.add_argument("--cassette", default=os.path.join(
+        tempfile.gettempdir(), "converso_bench_agent_graph.jsonl"))
+    args = parser.parse_args()
+
+    # The graph warns about the state_update channel at every step
+    logging.disable(logging.WARNING)
+    chat_model = ChatModelStandIn(tool_name="Lookup", latency=args.llm_latency)
+    graph = ChatFormAgentExecutor()
+
+    use_cassette("auto", args.cassette, "0", chat_model)
+    for turn in range(args.turns):
+        run_turn(graph, turn)
+    print({"recorded_llm_calls": chat_model.calls, "cassette": args.cassette})
+
+    for name, latency in (("replay, recorded latency", "recorded"), ("replay, no latency", "0")):
+        use_cassette("replay", args.cassette, latency, chat_model)
+        print(run(name, graph, args.turns, args.concurrency))
+    print(get_cassette(args.cassette).stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compares the size and the (de)serialization time of the agent state stored in redis,
+pickled (the previous format) and versioned JSON (zstd-compressed when zstandard is installed).
+
+    python -m benchmarks.bench_agent_state_serialization --iterations 200
+"""
+
+import argparse
+import time
+from typing import Optional
+
+from converso_chatbot.conversational_engine.form_agent import memory
+from converso_chatbot.conversational_engine.form_agent.memory import \
+    StoredAgentState
+from converso_chatbot.conversational_engine.tools import GoogleCalendarCreator
+
+QUESTION = "Can you find me a restaurant near the city center for tomorrow at 8pm? We are four people and one of us is vegetarian."
+ANSWER = " ".join([
+    "Here are a few options near the city center that have vegetarian dishes and tables for four tomorrow at 8pm:",
+    "1. Trattoria da Mario, traditional cuisine, 4.5 stars.",
+    "2. Green Bistro, fully vegetarian menu, 4.7 stars.",
+    "3. Osteria del Porto, seafood and vegetarian options, 4.3 stars.",
+    "Do you want me to create a calendar event for the reservation?"
+])
+
+
+def build_state(exchanges: int, with_form: bool) -> StoredAgentState:
+    stored_agent_state = StoredAgentState()
+    for exchange in range(exchanges):
+        stored_agent_state.memory.save_context(
+            inputs={"messages": f"{QUESTION} ({exchange})"},
+            outputs={"output": f"{ANSWER} ({exchange})"}
+        )
+    if with_form:
+        stored_agent_state.active_form_tool = build_form_tool()
+    return stored_agent_state
+
+
+def build_form_tool() -> Optional[GoogleCalendarCreator]:
+    form_tool = GoogleCalendarCreator(chat_id="1")
+    form_tool.enter_active_state()
+    form_tool.update(summary="Dinner at Green Bistro")
+    return form_tool
+
+
+def measure(dump, load, build, iterations: int) -> dict:
+    dump_elapsed = load_elapsed = 0
+    for _ in range(iterations):
+        # Pickling mutates the form tool, so every iteration gets a new state
+        stored_agent_state = build()
+        start = time.perf_counter()
+        serialized = dump(stored_agent_state)
+        dump_elapsed += time.perf_counter() - start
+
+        start = time.perf_counter()
+        load(serialized)
+        load_elapsed += time.perf_counter() - start
+
+    return {
+        "bytes": len(serialized),
+        "dump us": round(dump_elapsed / iterations * 1e6, 1),
+        "load us": round(load_elapsed / iterations * 1e6, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    print({"zstandard": memory.zstandard is not None})
+    for exchanges in (2, memory.HISTORY_LENGTH, 5 * memory.HISTORY_LENGTH):
+        for with_form in (False, True):
+            def build(): return build_state(exchanges, with_form)
+            tools = [GoogleCalendarCreator(chat_id="1")]
+            for format, dump, load in (
+                ("pickle", StoredAgentState.to_pickle, StoredAgentState.from_pickle),
+                ("json", StoredAgentState.to_bytes,
+                 lambda serialized: StoredAgentState.from_bytes(serialized, tools))
+            ):
+                print({
+                    "exchanges": exchanges,
+                    "form": with_form,
+                    "format": format,
+                    **measure(dump, load, build, args.iterations)
+                })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+End-to-end load test of the chat pipeline: synthetic ChatPayload messages are published to
+converso_in at --rates messages per second, spread over --chats chats, and consumed by the
+RabbitMQConsumer with the real process_message, until their answers reach converso_out.
+
+Redis and RabbitMQ are in-memory stand-ins, and the LLM responses are replayed from a cassette,
+first recorded from the ChatModelStandIn with --llm-latency seconds per response.
+A share of the turns (--tool-share) calls the PythonCodeInterpreter, the others are answered
+directly. For each rate it reports the latency of the turns (from the publish of the message to
+the publish of its answer), the turns per second and, per turn, the Redis round trips and the
+messages published to converso_out by type.
+
+    python -m benchmarks.bench_chat_pipeline --messages 200 --chats 50 --rates 5 10 20
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+from unittest.mock import patch
+
+from converso_chatbot.clients.rabbitmq import (RabbitMQConsumer,
+                                               RabbitMQProducer)
+from converso_chatbot.constants import MessageQueues, MessageType
+from converso_chatbot.conversational_engine import message_consumer
+from converso_chatbot.conversational_engine.form_agent.cassette_chat_model import \
+    get_cassette
+
+from .bench_agent_graph import use_cassette
+from .stand_ins import AsyncRedisStandIn, BrokerStandIn, ChatModelStandIn
+
+IN_QUEUE = MessageQueues.converso_IN.value
+OUT_QUEUE = MessageQueues.converso_OUT.value
+
+COMPUTE_PATTERN = re.compile(r"^Compute (\d+) \* 7$")
+
+
+def python_code_arguments(content: str) -> Optional[dict]:
+    """The turns asking to compute something call the PythonCodeInterpreter"""
+    match = COMPUTE_PATTERN.match(content)
+    return {"code": f"result = {match.group(1)} * 7"} if match else None
+
+
+def build_payloads(messages: int, chats: int, tool_share: float) -> List[dict]:
+    payloads = []
+    for i in range(messages):
+        calls_tool = int((i + 1) * tool_share) > int(i * tool_share)
+        payloads.append({
+            "chat_id": f"chat-{i % chats}",
+            "content": f"Compute {i} * 7" if calls_tool else f"Hello, this is message {i}"
+        })
+    return payloads
+
+
+class _IncomingMessageStandIn:
+    """An aio_pika message, releasing its place in the prefetch window when processed"""
+
+    def __init__(self, body: bytes, window: asyncio.Semaphore):
+        self.body = body
+        self.window = window
+
+    @asynccontextmanager
+    async def process(self):
+        try:
+            yield
+        finally:
+            self.window.release()
+
+
+class PublishLog:
+    """
+    Time of every message published to the broker, by queue and chat, and the answers
+    published before the TEXT_DELTA messages of their streams
+    """
+
+    def __init__(self):
+        self.published_at: Dict[Tuple[str, str], List[float]] = defaultdict(list)
+        self.types: Counter = Counter()
+        self.streams = set()
+        self.out_of_order = 0
+
+    def __call__(self, routing_key: str, body: bytes):
+        message = json.loads(body)
+        if routing_key == OUT_QUEUE:
+            self.types[message["type"]] += 1
+            if message["type"] == MessageType.TEXT_DELTA.value:
+                self.streams.add(message["stream_id"])
+            if message["type"] != MessageType.TEXT.value:
+                return
+            if not self.streams.issuperset(message["stream_ids"]):
+                self.out_of_order += 1
+        self.published_at[(routing_key, message["chat_id"])].append(
+            time.perf_counter())
+
+    def turn_latencies(self) -> List[float]:
+        """The k-th answer of a chat is the answer to its k-th message"""
+        latencies = []
+        for (routing_key, chat_id), published_at in self.published_at.items():
+            if routing_key != IN_QUEUE:
+                continue
+            answered_at = self.published_at.get((OUT_QUEUE, chat_id), [])
+            latencies.extend(
+                answer - message for message, answer in zip(published_at, answered_at))
+        return sorted(latencies)
+
+    def last_answer_at(self) -> float:
+        return max(
+            max(published_at) for (routing_key, _), published_at in self.published_at.items()
+            if routing_key == OUT_QUEUE
+        )
+
+
+class PublishErrors:
+    """
+    Errors raised by the publishes of the producer. The callbacks publishing TEXT_DELTA and
+    TOOL_START/TOOL_END messages only log them, so the run would otherwise report the turns
+    missing those messages as if they were complete.
+    """
+
+    def __init__(self):
+        self.errors: List[BaseException] = []
+
+    def watch(self, producer: RabbitMQProducer):
+        publish = producer.publish
+
+        def watched_publish(*args, **kwargs):
+            try:
+                return publish(*args, **kwargs)
+            except BaseException as e:
+                self.errors.append(e)
+                raise
+        producer.publish = watched_publish
+
+    def check(self):
+        if self.errors:
+            raise RuntimeError(
+                f"{len(self.errors)} publishes failed, the first with {self.errors[0]!r}"
+            ) from self.errors[0]
+
+
+def percentile(values: List[float], p: float) -> float:
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+async def run(payloads: List[dict], rate: float, redis_latency: float) -> dict:
+    # As in main.py, bounded as the agent_executor, which asyncio.run would shut down
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(
+        max_workers=message_consumer.AGENT_EXECUTOR_MAX_WORKERS))
+    broker = BrokerStandIn()
+    publish_log = PublishLog()
+    broker.add_listener(publish_log)
+    redis = AsyncRedisStandIn(round_trip_latency=redis_latency)
+    publish_errors = PublishErrors()
+
+    with patch("pika.BlockingConnection", broker.blocking_connection):
+        message_consumer.redis_client = redis
+        message_consumer.rabbitmq_producer = RabbitMQProducer(
+            "localhost", 5672, "user", "password")
+        publish_errors.watch(message_consumer.rabbitmq_producer)
+        consumer = RabbitMQConsumer(
+            queue_name=IN_QUEUE,
+            on_message_callback=message_consumer.process_message
+        )
+        window = asyncio.Semaphore(consumer.prefetch_count)
+
+        start = time.perf_counter()
+        deliveries = []
+        for i, payload in enumerate(payloads):
+            if rate:
+                await asyncio.sleep(max(0, start + i / rate - time.perf_counter()))
+            body = json.dumps(payload).encode()
+            broker.publish(IN_QUEUE, body)
+            # The broker delivers the messages while fewer than prefetch_count are not acked
+            await window.acquire()
+            deliveries.append(asyncio.create_task(
+                consumer.on_message(_IncomingMessageStandIn(body, window))))
+        await asyncio.gather(*deliveries)
+
+    publish_errors.check()
+    if publish_log.out_of_order:
+        raise RuntimeError(
+            f"{publish_log.out_of_order} answers were published before their TEXT_DELTA messages")
+    turns = len(payloads)
+    latencies = publish_log.turn_latencies()
+    if len(latencies) != turns:
+        raise RuntimeError(f"{turns - len(latencies)} turns were not answered")
+    return {
+        "rate": rate or "burst",
+        "turns": turns,
+        "turns/s": round(turns / (publish_log.last_answer_at() - start), 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000),
+        "p95_ms": round(percentile(latencies, 95) * 1000),
+        "p99_ms": round(percentile(latencies, 99) * 1000),
+        "redis_round_trips/turn": round(redis.round_trips / turns, 2),
+        "redis_commands/turn": round(redis.commands / turns, 2),
+        "published/turn": {
+            type: round(count / turns, 2) for type, count in sorted(publish_log.types.items())},
+        "broker_handshakes": broker.handshakes
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--rates", type=float, nargs="+", default=[5, 10, 20],
+                        help="Messages per second published to converso_in, 0 for a burst")
+    parser.add_argument("--tool-share", type=float, default=0.5)
+    parser.add_argument("--llm-latency", type=float, default=0.3,
+                        help="Seconds of each recorded LLM response")
+    parser.add_argument("--redis-latency", type=float, default=0.0005)
+    parser.add_argument("--cassette", default=os.path.join(
+        tempfile.gettempdir(), "converso_bench_chat_pipeline.jsonl"))
+    args = parser.parse_args()
+
+    # The graph warns about the state_update channel at every step
+    logging.disable(logging.WARNING)
+    payloads = build_payloads(args.messages, args.chats, args.tool_share)
+    chat_model = ChatModelStandIn(
+        tool_name="PythonCodeInterpreter",
+        tool_arguments=python_code_arguments,
+        latency=args.llm_latency
+    )
+
+    # Every run starts from empty chats, so it sends the requests recorded here
+    use_cassette("auto", args.cassette, "0", chat_model)
+    asyncio.run(run(payloads, rate=0, redis_latency=0))
+    print({"recorded_llm_calls": chat_model.calls, "cassette": args.cassette})
+
+    use_cassette("replay", args.cassette, "recorded", chat_model)
+    for rate in args.rates:
+        print(asyncio.run(run(payloads, rate, args.redis_latency)))
+    print(get_cassette(args.cassette).stats())
+
+
+if __name__ == "__main__":
+    main()
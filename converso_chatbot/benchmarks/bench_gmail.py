@@ -0,0 +1,99 @@
+"""
+Compares GoogleClient.get_emails with the previous implementation (one messages().get
+round trip per email), against a Gmail stand-in serving recorded-like responses.
+
+    python -m benchmarks.bench_gmail --emails 20 --round-trip-latency 0.05
+"""
+
+import argparse
+import base64
+import time
+from unittest.mock import patch
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+
+from benchmarks.stand_ins import GoogleApiStandIn
+from converso_chatbot.clients.google import GetEmailsPayload, GoogleClient
+
+BODY = base64.urlsafe_b64encode(
+    b"Hi, the meeting is moved to Thursday at 10am. See you there!").decode()
+
+
+def message_response(uri: str, body) -> dict:
+    message_id = uri.split("?")[0].rsplit("/", 1)[-1]
+    return {
+        "id": message_id,
+        "snippet": "Hi, the meeting is moved to Thursday at 10am.",
+        "payload": {
+            "mimeType": "text/plain",
+            "headers": [
+                {"name": "From", "value": "colleague@example.com"},
+                {"name": "Date", "value": "Mon, 1 Jan 2024 10:00:00 +0000"},
+                {"name": "Subject", "value": f"Meeting {message_id}"}
+            ],
+            "body": {"data": BODY}
+        }
+    }
+
+
+def get_emails_sequential(credentials: Credentials, payload: GetEmailsPayload):
+    """The previous implementation: one round trip per email"""
+    service = build('gmail', 'v1', credentials=credentials)
+    messages = service.users().messages().list(
+        userId='me', maxResults=payload.number_of_emails).execute().get('messages', [])
+    return [
+        service.users().messages().get(userId="me", id=message['id']).execute()
+        for message in messages
+    ]
+
+
+def get_emails_batched(credentials: Credentials, payload: GetEmailsPayload):
+    return GoogleClient(credentials).get_emails(payload, full_content=False)
+
+
+def iter_emails_batched(credentials: Credentials, payload: GetEmailsPayload):
+    """Time to the first email of the streaming variant"""
+    return next(GoogleClient(credentials).iter_emails(payload, full_content=False))
+
+
+def run(get_emails, emails: int, round_trip_latency: float, repeat: int) -> dict:
+    api = GoogleApiStandIn(round_trip_latency=round_trip_latency)
+    api.on("GET", "/users/me/messages", lambda uri, body: {
+        "messages": [{"id": str(index)} for index in range(emails)]
+    })
+    api.on("GET", "", message_response)
+    credentials = Credentials(token="token")
+    payload = GetEmailsPayload(number_of_emails=emails)
+
+    with patch("googleapiclient.http.build_http", api.build_http), \
+            patch("converso_chatbot.clients.google.build_http", api.build_http):
+        get_emails(credentials, payload)
+        api.requests = 0
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            get_emails(credentials, payload)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "implementation": get_emails.__name__,
+        "emails": emails,
+        "ms": round(elapsed / repeat * 1e3, 1),
+        "round trips": api.requests // repeat
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--emails", type=int, default=20)
+    parser.add_argument("--round-trip-latency", type=float, default=0.05)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for get_emails in (get_emails_sequential, get_emails_batched, iter_emails_batched):
+        print(run(get_emails, args.emails, args.round_trip_latency, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
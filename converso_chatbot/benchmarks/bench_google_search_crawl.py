@@ -0,0 +1,82 @@
+"""
+Compares GoogleSearchClient.crawl with the previous implementation (one blocking requests.get
+per result, in order, until num_expanded_results contents are found), against local websites
+serving the pages in benchmarks/fixtures/html. One of the results is a slow website, one is broken.
+
+    python -m benchmarks.bench_google_search_crawl --searches 5 --latency 0.15 --slow-latency 3
+"""
+
+import argparse
+import logging
+import pathlib
+import time
+
+import requests
+
+from benchmarks.stand_ins import WebsiteStandIn
+from converso_chatbot.clients.google_search import GoogleSearchClient
+from converso_chatbot.helpers import HtmlProcessor
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures" / "html"
+
+
+def crawl_sequential(client: GoogleSearchClient, urls, num_results: int):
+    texts = []
+    for url in urls:
+        if len(texts) < num_results:
+            try:
+                response = requests.get(url, headers=client.headers)
+                response.raise_for_status()
+            except requests.exceptions.RequestException:
+                continue
+            texts.append(HtmlProcessor.clear_html(response.text))
+    return texts
+
+
+def bench(name, crawl, website: WebsiteStandIn, urls, searches: int, num_results: int):
+    HtmlProcessor.cache.clear()
+    website.requests = website.connections = 0
+    latencies = []
+    for _ in range(searches):
+        start = time.perf_counter()
+        texts = crawl(urls, num_results)
+        latencies.append(time.perf_counter() - start)
+    print(
+        f"{name:<24} avg {sum(latencies) / searches * 1000:>7.0f} ms  max {max(latencies) * 1000:>7.0f} ms  "
+        f"contents {len(texts)}/{num_results}  requests {website.requests}  connections {website.connections}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--searches", type=int, default=5)
+    parser.add_argument("--num-results", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.15)
+    parser.add_argument("--slow-latency", type=float, default=3)
+    args = parser.parse_args()
+    # The broken website is logged at every search
+    logging.disable(logging.ERROR)
+
+    website = WebsiteStandIn()
+    pages = sorted(FIXTURES.glob("*.html"))
+    urls = [
+        website.page("/slow", pages[0].read_text(), latency=args.slow_latency),
+        website.page("/broken", "Internal error", latency=args.latency, status=500)
+    ] + [
+        website.page(f"/{path.stem}", path.read_text(), latency=args.latency)
+        for path in pages
+    ]
+
+    client = GoogleSearchClient()
+    print(f"{len(urls)} results per search, {args.num_results} contents wanted")
+    bench("sequential requests.get",
+          lambda urls, n: crawl_sequential(client, urls, n),
+          website, urls, args.searches, args.num_results)
+    bench("crawl",
+          lambda urls, n: client.crawl(urls, n),
+          website, urls, args.searches, args.num_results)
+    website.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Measures the latency of the Google tools against a stubbed HTTP transport, before and after
+caching the deserialized credentials and the API service objects.
+
+    python -m benchmarks.bench_google_tools --calls 100
+"""
+
+import argparse
+import pickle
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+
+from benchmarks.stand_ins import GoogleApiStandIn
+from converso_chatbot.conversational_engine.tools import GoogleCalendarCreator
+from converso_chatbot.conversational_engine.turn_context import (
+    TurnContext, use_turn_context)
+
+EVENT = {
+    "summary": "Dinner",
+    "description": "Dinner at Green Bistro",
+    "start": datetime(2024, 1, 1, 20, 0),
+    "end": datetime(2024, 1, 1, 22, 0)
+}
+
+
+def create_event_uncached(serialized_credentials: bytes):
+    """The previous implementation: credentials unpickled and service built for every call"""
+    credentials = pickle.loads(serialized_credentials)
+    service = build('calendar', 'v3', credentials=credentials)
+    service.events().insert(calendarId='primary', body={
+        'summary': EVENT["summary"],
+        'description': EVENT["description"],
+        'start': {'dateTime': EVENT["start"].isoformat(), 'timeZone': 'UTC'},
+        'end': {'dateTime': EVENT["end"].isoformat(), 'timeZone': 'UTC'},
+    }).execute()
+
+
+def create_event_cached(serialized_credentials: bytes):
+    tool = GoogleCalendarCreator(chat_id="1")
+    with use_turn_context(TurnContext(
+        chat_id="1",
+        tools=[tool],
+        google_credentials=serialized_credentials
+    )):
+        tool._run_when_complete(**EVENT)
+
+
+def run(create_event, calls: int, round_trip_latency: float) -> dict:
+    api = GoogleApiStandIn(round_trip_latency=round_trip_latency)
+    api.on("POST", "/calendars/primary/events", lambda uri, body: {"id": "1"})
+    serialized_credentials = pickle.dumps(Credentials(token="token"))
+
+    with patch("googleapiclient.http.build_http", api.build_http), \
+            patch("converso_chatbot.clients.google.build_http", api.build_http):
+        # Warm up the process-wide caches
+        create_event(serialized_credentials)
+
+        start = time.perf_counter()
+        for _ in range(calls):
+            create_event(serialized_credentials)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "tool": create_event.__name__,
+        "calls": calls,
+        "ms/call": round(elapsed / calls * 1e3, 2),
+        "overhead ms/call": round((elapsed / calls - round_trip_latency) * 1e3, 2),
+        "requests": api.requests
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--round-trip-latency", type=float, default=0.002)
+    args = parser.parse_args()
+
+    for create_event in (create_event_uncached, create_event_cached):
+        print(run(create_event, args.calls, args.round_trip_latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Compares HtmlProcessor.clear_html with the previous implementation (readability Document
+followed by a full BeautifulSoup parse), on the saved pages in benchmarks/fixtures/html.
+
+Besides the throughput, reports the quality of the extracted text: the recall of the
+key phrases of each page, and the boilerplate phrases that leaked into the text.
+The previous implementation needs the bench dependency group (poetry install --with bench).
+
+    python -m benchmarks.bench_html_processor --repeat 20
+"""
+
+import argparse
+import json
+import pathlib
+import time
+
+from bs4 import BeautifulSoup
+
+from converso_chatbot.helpers import HTML_MAX_TEXT_LENGTH, HtmlProcessor
+
+try:
+    from readability import Document
+except ImportError:
+    # readability-lxml needs lxml_html_clean with lxml >= 5.2
+    Document = None
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures" / "html"
+
+
+def clear_html_previous(html: str) -> str:
+    doc = Document(html)
+    main_content = doc.summary()
+    soup = BeautifulSoup(main_content, 'html.parser')
+    for script in soup(['script', 'style']):
+        script.decompose()
+    return soup.get_text(separator='\n', strip=True)
+
+
+def clear_html_streaming(html: str) -> str:
+    # Without the memo, to measure the extraction
+    return HtmlProcessor._extract_text(html.encode(), HTML_MAX_TEXT_LENGTH)
+
+
+def load_corpus():
+    phrases = json.loads((FIXTURES / "expected_phrases.json").read_text())
+    pages = {
+        path.stem: path.read_text()
+        for path in sorted(FIXTURES.glob("*.html"))
+    }
+    return pages, phrases["expected"], phrases["noise"]
+
+
+def bench(name, clear_html, pages, expected, noise, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        texts = {page: clear_html(html) for page, html in pages.items()}
+    elapsed = time.perf_counter() - start
+
+    found = total = leaked = 0
+    for page, text in texts.items():
+        found += sum(phrase in text for phrase in expected[page])
+        total += len(expected[page])
+        leaked += sum(phrase in text for phrase in noise)
+
+    parsed_mb = sum(len(html) for html in pages.values()) * repeat / 1e6
+    print(
+        f"{name:<22} {len(pages) * repeat / elapsed:>8.0f} pages/s {parsed_mb / elapsed:>7.1f} MB/s  "
+        f"avg text {sum(map(len, texts.values())) // len(texts):>5} chars  "
+        f"recall {found}/{total}  boilerplate {leaked}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    pages, expected, noise = load_corpus()
+    print(f"{len(pages)} pages, {sum(map(len, pages.values())) // 1000} KB")
+
+    if Document:
+        bench("readability + bs4", clear_html_previous,
+              pages, expected, noise, args.repeat)
+    else:
+        print("readability-lxml is not importable, skipping the previous implementation")
+    bench("streaming lxml", clear_html_streaming,
+          pages, expected, noise, args.repeat)
+
+    HtmlProcessor.cache.clear()
+    bench("streaming lxml, memo", HtmlProcessor.clear_html,
+          pages, expected, noise, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
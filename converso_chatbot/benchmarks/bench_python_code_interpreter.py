@@ -0,0 +1,83 @@
+"""
+Latency and throughput of the PythonCodeInterpreter sandbox, compared with the previous
+in-process exec and with a new interpreter started for every call.
+
+    python -m benchmarks.bench_python_code_interpreter --calls 200 --concurrency 4
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from converso_chatbot.conversational_engine.tools.python_sandbox import \
+    SandboxPool
+
+# Typical calls of the LLM, and a CPU bound one
+QUICK_CODE = "import datetime\nresult = datetime.datetime.now()"
+CPU_BOUND_CODE = "result = sum(i * i for i in range(300000))"
+
+
+def run_in_process(code: str) -> str:
+    local_vars = {}
+    exec(code, {}, local_vars)
+    return str(local_vars.get('result'))
+
+
+def run_in_new_interpreter(code: str) -> str:
+    return subprocess.run(
+        [sys.executable, "-I", "-c", code + "\nprint(result)"],
+        capture_output=True, check=True, text=True
+    ).stdout
+
+
+def bench_latency(name, run, code, calls):
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        run(code)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    print(
+        f"  {name:<22} p50 {statistics.median(latencies):>8.2f} ms   "
+        f"p95 {latencies[int(len(latencies) * 0.95) - 1]:>8.2f} ms"
+    )
+
+
+def bench_throughput(name, run, code, calls, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        list(executor.map(lambda _: run(code), range(calls)))
+        elapsed = time.perf_counter() - start
+    print(f"  {name:<22} {calls / elapsed:>8.0f} calls/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    pool = SandboxPool(workers=args.concurrency)
+    # Wait for the workers to import the preloaded modules
+    for _ in range(args.concurrency):
+        pool.run("result = 1")
+
+    print("Latency per call, quick code")
+    bench_latency("in-process exec", run_in_process, QUICK_CODE, args.calls)
+    bench_latency("new interpreter", run_in_new_interpreter,
+                  QUICK_CODE, min(args.calls, 20))
+    bench_latency("sandbox pool", pool.run, QUICK_CODE, args.calls)
+
+    print(f"Throughput, CPU bound code, {args.concurrency} concurrent calls")
+    bench_throughput("in-process exec", run_in_process,
+                     CPU_BOUND_CODE, args.calls, args.concurrency)
+    bench_throughput("sandbox pool", pool.run,
+                     CPU_BOUND_CODE, args.calls, args.concurrency)
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compares the publish throughput of the pooled RabbitMQProducer with the previous
+connect-per-publish implementation, against a local broker stand-in.
+
+    python -m benchmarks.bench_rabbitmq_producer --messages 500 --threads 8
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pika
+
+from benchmarks.stand_ins import BrokerStandIn
+from converso_chatbot.clients.rabbitmq import RabbitMQProducer
+
+
+class ConnectPerPublishProducer:
+    """The previous implementation: a new connection and a queue_declare per message"""
+
+    def __init__(self, host, port, user, password):
+        self.connection_params = pika.ConnectionParameters(
+            host=host,
+            port=port,
+            credentials=pika.PlainCredentials(user, password)
+        )
+
+    def publish(self, queue: str, message: str):
+        connection = pika.BlockingConnection(self.connection_params)
+        channel = connection.channel()
+        channel.queue_declare(queue=queue, durable=True)
+        channel.basic_publish(exchange='', routing_key=queue, body=message)
+
+
+def run(producer_class, messages: int, threads: int) -> dict:
+    broker = BrokerStandIn()
+    with patch("pika.BlockingConnection", broker.blocking_connection):
+        producer = producer_class("localhost", 5672, "user", "password")
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(
+                lambda i: producer.publish("converso_out", f"message {i}"),
+                range(messages)
+            ))
+        elapsed = time.perf_counter() - start
+
+    assert broker.published == messages
+    return {
+        "producer": producer_class.__name__,
+        "threads": threads,
+        "messages/s": round(messages / elapsed),
+        "handshakes": broker.handshakes,
+        "declarations": broker.declarations
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    for threads in sorted({1, args.threads}):
+        for producer_class in (ConnectPerPublishProducer, RabbitMQProducer):
+            print(run(producer_class, args.messages, threads))
+
+
+if __name__ == "__main__":
+    main()
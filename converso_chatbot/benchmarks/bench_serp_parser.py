@@ -0,0 +1,113 @@
+"""
+Compares serp_parser.parse_serp with the previous parsing of the search result pages
+(parsel selectors, with the XPath strings evaluated on every search, some of them from the
+root of the page), on the pages in tests/unit/clients/fixtures/serp.
+
+    python -m benchmarks.bench_serp_parser --repeat 50
+"""
+
+import argparse
+import pathlib
+import time
+
+from parsel import Selector
+
+from converso_chatbot.clients.serp_parser import parse_serp
+
+FIXTURES = pathlib.Path(__file__).parent.parent / \
+    "tests" / "unit" / "clients" / "fixtures" / "serp"
+
+
+def get_xpath_with_alternatives(selector, xpaths, extract_first=False):
+    for xpath in xpaths:
+        result = selector.xpath(xpath)
+        if result:
+            return result.extract_first().strip() if extract_first else result
+    return "Not found"
+
+
+def scrape_financial_data(selector):
+    financial_data = get_xpath_with_alternatives(selector, [
+        '//div[@data-attrid="Converter"]',
+        '//div[@data-attrid="kc:/finance/stock:asset chart"]'
+    ])
+    asset_name = get_xpath_with_alternatives(financial_data, [
+        '//div[@class="cbXzDb"]//span[2]//text()',
+        '//div[@class="oPhL2e"]//span[@data-attrid="Company Name"]//text()'
+    ], extract_first=True)
+    value = get_xpath_with_alternatives(financial_data, [
+        '//span[@class="pclqee"]//text()',
+        '//span[@jsname="vWLAgc"]//text()'
+    ], extract_first=True)
+    currency = get_xpath_with_alternatives(financial_data, [
+        '//span[@class="dvZgKd"]//text()',
+        '//span[@jsname="T3Us2d"]//text()'
+    ], extract_first=True)
+    variation = get_xpath_with_alternatives(financial_data, [
+        '//span[@class="iXabQc vgpkr"]',
+        '//span[@class="iXabQc ASafz"]',
+        '//span[contains(@class, "WlRRw") and contains(@class, "IsqQVc")]'
+    ])
+    absolute_variation = get_xpath_with_alternatives(variation, [
+        '//span[@jsname="SwWl3d"]//text()',
+        '//span[@jsname="qRSVye"]//text()'
+    ], extract_first=True)
+    percentage_variation = get_xpath_with_alternatives(variation, [
+        '//span[@jsname="rfaVEf"]//text()',
+        '//span[@class="IsqQVc fw-price-up"]//text()'
+    ], extract_first=True)
+    return (asset_name, value, currency, absolute_variation, percentage_variation)
+
+
+def parse_previous(html: str):
+    selector = Selector(html)
+    try:
+        financial_data = scrape_financial_data(selector)
+    except BaseException:
+        financial_data = None
+    info_box = selector.xpath("//div[@class='I6TXqe']").extract_first()
+    results = []
+    for result in selector.xpath("//div[@id='rso']/*"):
+        try:
+            result_element = result.xpath(".//a[1]")
+            url = result_element[0].xpath("@href").extract_first()
+            title = result_element[0].xpath(".//h3[1]//text()").extract()
+            if url != "#":
+                results.append({"url": url, "title": title})
+        except IndexError:
+            pass
+    return financial_data, info_box, results
+
+
+def bench(name, parse, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages.values():
+            parse(html)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<18} {elapsed / (repeat * len(pages)) * 1000:>6.2f} ms/page")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    pages = {path.stem: path.read_text()
+             for path in sorted(FIXTURES.glob("*.html"))}
+    print(f"{len(pages)} pages, {sum(map(len, pages.values())) // 1000} KB")
+
+    # Both parsers find the same blocks
+    for name, html in pages.items():
+        financial_data, info_box, results = parse_previous(html)
+        serp = parse_serp(html)
+        assert (financial_data is None) == (serp.financial_data is None), name
+        assert (info_box is None) == (serp.info_box is None), name
+        assert results == serp.results, name
+
+    bench("parsel selectors", parse_previous, pages, args.repeat)
+    bench("parse_serp", parse_serp, pages, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
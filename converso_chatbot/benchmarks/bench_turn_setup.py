@@ -0,0 +1,76 @@
+"""
+Measures the setup cost of a conversation turn (tools, callback handler and graph),
+before and after caching the compiled graph and the stateless tools.
+
+    python -m benchmarks.bench_turn_setup --turns 200
+"""
+
+import argparse
+import time
+
+from converso.conversational_engine.form_agent import FormAgentExecutor
+from converso_chatbot.conversational_engine.message_consumer import (
+    build_turn_tools, get_agent_executor)
+from converso_chatbot.conversational_engine.tool_callback_handler import \
+    ToolCallbackHandler
+from converso_chatbot.conversational_engine.tools import *
+from converso_chatbot.conversational_engine.turn_context import TurnContext
+
+
+def setup_turn_uncached(chat_id: str):
+    """The previous implementation: everything is built for every message"""
+    tools = [
+        GoogleSearch(),
+        GoogleCalendarCreator(chat_id=chat_id),
+        GoogleCalendarRetriever(chat_id=chat_id),
+        GmailRetriever(chat_id=chat_id),
+        GmailSender(chat_id=chat_id),
+        OnlinePurchase(),
+        PythonCodeInterpreter()
+    ]
+    tool_callback_handler = ToolCallbackHandler(chat_id=chat_id, tools=tools)
+    return FormAgentExecutor(
+        tools=tools,
+        on_tool_start=tool_callback_handler.on_tool_start,
+        on_tool_end=tool_callback_handler.on_tool_end
+    )
+
+
+def setup_turn_cached(chat_id: str):
+    tools = build_turn_tools(chat_id)
+    tool_callback_handler = ToolCallbackHandler(chat_id=chat_id, tools=tools)
+    turn_context = TurnContext(
+        chat_id=chat_id,
+        tools=tools,
+        tool_callback_handler=tool_callback_handler
+    )
+    return get_agent_executor(), turn_context
+
+
+def run(setup_turn, turns: int) -> dict:
+    # Warm up the process-wide caches
+    setup_turn("warmup")
+
+    start = time.perf_counter()
+    for turn in range(turns):
+        setup_turn(str(turn))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "setup": setup_turn.__name__,
+        "turns": turns,
+        "us/turn": round(elapsed / turns * 1e6, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    for setup_turn in (setup_turn_uncached, setup_turn_cached):
+        print(run(setup_turn, args.turns))
+
+
+if __name__ == "__main__":
+    main()
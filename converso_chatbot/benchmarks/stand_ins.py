@@ -0,0 +1,376 @@
+"""
+In-memory stand-ins of external services, used by the benchmarks.
+Latencies are simulated with time.sleep, so that the cost of round trips is visible.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict
+from email.feedparser import FeedParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httplib2
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class BrokerStandIn:
+    """
+    A local stand-in for the RabbitMQ broker.
+    Counts connection handshakes, queue declarations and published messages,
+    and calls the listeners with the queue and the body of every published message.
+    """
+
+    def __init__(
+        self,
+        handshake_latency: float = 0.005,
+        round_trip_latency: float = 0.0005
+    ):
+        self.handshake_latency = handshake_latency
+        self.round_trip_latency = round_trip_latency
+        self.queues: Dict[str, List[bytes]] = defaultdict(list)
+        self.handshakes = 0
+        self.declarations = 0
+        self.listeners: List[Callable[[str, bytes], None]] = []
+        self.lock = threading.Lock()
+
+    def blocking_connection(self, *args, **kwargs):
+        """Drop-in replacement of pika.BlockingConnection"""
+        return _BlockingConnectionStandIn(self)
+
+    def add_listener(self, listener: Callable[[str, bytes], None]):
+        self.listeners.append(listener)
+
+    def publish(self, routing_key: str, body: bytes):
+        with self.lock:
+            self.queues[routing_key].append(body)
+        for listener in self.listeners:
+            listener(routing_key, body)
+
+    @property
+    def published(self) -> int:
+        return sum(len(messages) for messages in self.queues.values())
+
+
+class _BlockingConnectionStandIn:
+
+    def __init__(self, broker: BrokerStandIn):
+        self.broker = broker
+        # TCP + AMQP handshake
+        time.sleep(broker.handshake_latency)
+        with broker.lock:
+            broker.handshakes += 1
+        self.is_open = True
+
+    def channel(self):
+        time.sleep(self.broker.round_trip_latency)
+        return _BlockingChannelStandIn(self)
+
+    def process_data_events(self, time_limit: float = 0):
+        # Nothing is received from the broker while idle
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+class _BlockingChannelStandIn:
+
+    def __init__(self, connection: _BlockingConnectionStandIn):
+        self.connection = connection
+        self.broker = connection.broker
+        self.confirms = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.connection.is_open
+
+    def queue_declare(self, queue: str, durable: bool = False):
+        time.sleep(self.broker.round_trip_latency)
+        with self.broker.lock:
+            self.broker.declarations += 1
+
+    def confirm_delivery(self):
+        time.sleep(self.broker.round_trip_latency)
+        self.confirms = True
+
+    def basic_publish(self, exchange: str, routing_key: str, body):
+        self.broker.publish(routing_key, body)
+        # With publisher confirms, basic_publish waits for the ack of the broker
+        if self.confirms:
+            time.sleep(self.broker.round_trip_latency)
+
+
+class AsyncRedisStandIn:
+    """
+    A local stand-in for redis.asyncio.Redis, with the commands used by the chatbot.
+    Every command, or pipeline, is a round trip of round_trip_latency seconds.
+    """
+
+    def __init__(self, round_trip_latency: float = 0.0005):
+        self.round_trip_latency = round_trip_latency
+        self.data = {}
+        self.round_trips = 0
+        self.commands = 0
+
+    def pipeline(self, transaction: bool = True):
+        return _AsyncPipelineStandIn(self)
+
+    async def round_trip(self, commands: List[Tuple[str, tuple]]) -> list:
+        self.round_trips += 1
+        self.commands += len(commands)
+        await asyncio.sleep(self.round_trip_latency)
+        return [getattr(self, f"_{command}")(*args) for command, args in commands]
+
+    def __getattr__(self, command):
+        if not hasattr(type(self), f"_{command}"):
+            raise AttributeError(command)
+
+        async def execute(*args):
+            return (await self.round_trip([(command, args)]))[0]
+        return execute
+
+    def _get(self, name):
+        return self.data.get(name)
+
+    def _set(self, name, value, ex=None):
+        self.data[name] = _to_bytes(value)
+
+    def _hget(self, name, key):
+        return self.data.get(name, {}).get(key)
+
+    def _hset(self, name, key, value):
+        self.data.setdefault(name, {})[key] = _to_bytes(value)
+
+    def _hdel(self, name, *keys):
+        for key in keys:
+            self.data.get(name, {}).pop(key, None)
+
+    def _hmget(self, name, keys):
+        return [self.data.get(name, {}).get(key) for key in keys]
+
+    def _rpush(self, name, *values):
+        self.data.setdefault(name, []).extend(map(_to_bytes, values))
+
+    def _ltrim(self, name, start, end):
+        self.data[name] = self._lrange(name, start, end)
+
+    def _lrange(self, name, start, end):
+        values = self.data.get(name, [])
+        start = max(len(values) + start, 0) if start < 0 else start
+        end = len(values) + end if end < 0 else end
+        return values[start:end + 1]
+
+
+class _AsyncPipelineStandIn:
+
+    def __init__(self, redis: AsyncRedisStandIn):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def __getattr__(self, command):
+        def queue(*args):
+            self.commands.append((command, args))
+            return self
+        return queue
+
+    async def execute(self):
+        commands, self.commands = self.commands, []
+        return await self.redis.round_trip(commands)
+
+
+def _to_bytes(value):
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
+class GoogleApiStandIn:
+    """
+    A local stand-in for the Google APIs, used as the httplib2 transport of googleapiclient.
+    Answers every request with the response registered for its method and path (default: an empty object).
+    """
+
+    def __init__(self, round_trip_latency: float = 0.002):
+        self.round_trip_latency = round_trip_latency
+        self.responses: Dict[str, Callable[[str, bytes], dict]] = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def on(self, method: str, path: str, response: Callable[[str, bytes], dict]):
+        """Registers the response to the requests whose url path ends with path"""
+        self.responses[f"{method} {path}"] = response
+
+    def build_http(self):
+        """Drop-in replacement of googleapiclient.http.build_http"""
+        return _HttpStandIn(self)
+
+
+class _HttpStandIn:
+
+    def __init__(self, api: GoogleApiStandIn):
+        self.api = api
+        self.timeout = None
+        self.redirect_codes = set()
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        time.sleep(self.api.round_trip_latency)
+        with self.api.lock:
+            self.api.requests += 1
+
+        if urlparse(uri).path.startswith("/batch"):
+            return self._batch_response(body, headers)
+
+        return (
+            httplib2.Response({"status": "200", "content-type": "application/json"}),
+            json.dumps(self._response(method, uri, body)).encode("utf-8")
+        )
+
+    def _response(self, method: str, uri: str, body) -> dict:
+        path = urlparse(uri).path
+        for key, build_response in self.api.responses.items():
+            registered_method, registered_path = key.split(" ", 1)
+            if registered_method == method and path.endswith(registered_path):
+                return build_response(uri, body)
+        return {}
+
+    def _batch_response(self, body: str, headers: dict):
+        """Answers every request of a multipart/mixed batch in a single multipart/mixed response"""
+        parser = FeedParser()
+        parser.feed(f"content-type: {headers['content-type']}\r\n\r\n{body}")
+        boundary = "batch_stand_in"
+        parts = []
+        for part in parser.close().get_payload():
+            request_line = part.get_payload().splitlines()[0]
+            method, uri, _ = request_line.split(" ", 2)
+            parts.append("\r\n".join([
+                f"--{boundary}",
+                "Content-Type: application/http",
+                f"Content-ID: <response-{part['Content-ID'][1:]}",
+                "",
+                "HTTP/1.1 200 OK",
+                "Content-Type: application/json",
+                "",
+                json.dumps(self._response(method, uri, None))
+            ]))
+
+        return (
+            httplib2.Response({
+                "status": "200",
+                "content-type": f"multipart/mixed; boundary={boundary}"
+            }),
+            ("\r\n".join(parts) + f"\r\n--{boundary}--").encode("utf-8")
+        )
+
+
+class WebsiteStandIn:
+    """
+    A local HTTP server standing in for the websites crawled by the search client.
+    Serves the registered pages after their latency, and counts the requests and the
+    TCP connections opened (HTTP/1.1 keep-alive is supported).
+    """
+
+    def __init__(self):
+        self.pages: Dict[str, Tuple[int, bytes, float]] = {}
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _website_handler(self))
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def page(self, path: str, body: str, latency: float = 0.0, status: int = 200) -> str:
+        """Registers a page and returns its url"""
+        self.pages[path] = (status, body.encode("utf-8"), latency)
+        return f"http://127.0.0.1:{self.server.server_port}{path}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _website_handler(website: WebsiteStandIn):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with website.lock:
+                website.connections += 1
+
+        def do_GET(self):
+            status, body, latency = website.pages.get(
+                self.path, (404, b"Not found", 0.0))
+            with website.lock:
+                website.requests += 1
+            time.sleep(latency)
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client gave up on the page
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class ChatModelStandIn(BaseChatModel):
+    """
+    A local stand-in for the OpenAI chat model, answering after latency seconds.
+    The first request of a turn calls tool_name with the arguments built from the user input
+    by tool_arguments, or answers directly when they are None. The request with the tool output
+    answers with it. The tool call ids are derived from the input, so the same turn always
+    sends the same requests.
+    """
+
+    tool_name: str
+    tool_arguments: Callable[[str], Optional[dict]] = lambda content: {
+        "query": content}
+    latency: float = 0.2
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stand-in"
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        self.calls += 1
+        last_message = messages[-1]
+        if last_message.type in ("tool", "function"):
+            message = AIMessage(
+                content=f"Here is what I found: {last_message.content}")
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        tool_arguments = self.tool_arguments(str(last_message.content))
+        if tool_arguments is None:
+            message = AIMessage(
+                content=f"You said: {last_message.content}. How can I help you?")
+        else:
+            call_id = hashlib.md5(str(last_message.content).encode()).hexdigest()[:12]
+            message = AIMessage(content="", additional_kwargs={"tool_calls": [{
+                "id": f"call_{call_id}",
+                "type": "function",
+                "function": {
+                    "name": self.tool_name,
+                    "arguments": json.dumps(tool_arguments)
+                }
+            }]})
+        return ChatResult(generations=[ChatGeneration(message=message)])
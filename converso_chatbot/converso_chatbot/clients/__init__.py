@@ -6,6 +6,10 @@ Dep are FastAPI dependencies that can be injected into FastAPI routes
 from .google import (CreateCalendarEventPayload, GetCalendarEventsPayload,
                      GetEmailsPayload, GoogleClient, SendEmailPayload)
 from .google_search import GoogleSearchClient, GoogleSearchClientPayload
-from .rabbitmq import (RabbitMQConsumer, RabbitMQProducer, RabbitMQProducerDep,
-                       get_rabbitmq_consumer, get_rabbitmq_producer)
-from .redis import RedisClientDep, get_redis_client
+from .rabbitmq import (RabbitMQConsumer, RabbitMQProducer,
+                       RabbitMQProducerDep, get_rabbitmq_consumer,
+                       get_rabbitmq_producer)
+from .redis import (AsyncRedisClientDep, RedisClientDep,
+                    get_async_redis_client, get_async_redis_connection_pool,
+                    get_redis_client, get_redis_connection_pool)
+from .search_cache import SearchCache, SearchContentType, get_search_cache
@@ -1,20 +1,36 @@
 import base64
+import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from email.message import EmailMessage
+from functools import lru_cache
 from textwrap import dedent
-from typing import Any, List, Optional
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
 
+import google_auth_httplib2
 from dateutil.parser import parse
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import Resource, build_from_document
+from googleapiclient.http import HttpRequest, build_http
 from pydantic import BaseModel, Field, field_validator
 
-#from converso_chatbot.helpers import HtmlProcessor
+from converso_chatbot.helpers import HtmlProcessor, LRUCache
 
 REDIS_HOST = os.environ.get('REDIS_HOST')
 REDIS_PASSWORD = os.environ.get('REDIS_PASSWORD')
 GET_FULL_CONTENT = True
+# Gmail suggests batches of at most 50 requests
+GMAIL_BATCH_SIZE = int(os.environ.get('GMAIL_BATCH_SIZE', 10))
+GMAIL_MAX_CONCURRENT_BATCHES = int(
+    os.environ.get('GMAIL_MAX_CONCURRENT_BATCHES', 2))
+# Headers fetched when the full content of the emails is not needed
+EMAIL_HEADERS = ['From', 'Date', 'Subject']
+# Credentials whose services are kept
+GOOGLE_SERVICES_CACHE_SIZE = int(
+    os.environ.get('GOOGLE_SERVICES_CACHE_SIZE', 256))
 
 
 class CreateCalendarEventPayload(BaseModel):
@@ -76,6 +92,94 @@ class SendEmailPayload(BaseModel):
     #         raise ValueError("Invalid email address")
 
 
+@lru_cache(maxsize=None)
+def get_discovery_document(api: str, version: str) -> dict:
+    """The discovery document bundled with googleapiclient, parsed once per api and version"""
+    return json.loads(discovery_cache.get_static_doc(api, version))
+
+
+class _CredentialsResources:
+    """
+    Services and collections built for a credentials object, by api, version and collection path,
+    and the authorized httplib2.Http objects of their requests.
+    """
+
+    def __init__(self, credentials: Credentials) -> None:
+        self.credentials = credentials
+        self.resources: Dict[Tuple[str, str, str], Resource] = {}
+        self.local = threading.local()
+
+    def build_request(self, http, *args, **kwargs) -> HttpRequest:
+        """
+        Service objects are shared between threads, httplib2.Http objects are not:
+        the requests built by a thread share its own Http, which keeps its connections alive.
+        """
+        authorized_http = getattr(self.local, "http", None)
+        if authorized_http is None:
+            authorized_http = self.local.http = google_auth_httplib2.AuthorizedHttp(
+                self.credentials, http=build_http())
+        return HttpRequest(authorized_http, *args, **kwargs)
+
+
+# The services hold their credentials, so they are cached by a key of the grant
+# rather than by the credentials object itself
+_resources = LRUCache(maxsize=GOOGLE_SERVICES_CACHE_SIZE)
+_resources_lock = threading.RLock()
+
+
+def _credentials_key(credentials: Credentials) -> Hashable:
+    return (
+        credentials.client_id,
+        credentials.refresh_token or credentials.token,
+        tuple(sorted(credentials.scopes or ()))
+    )
+
+
+def _get_resources(credentials: Credentials) -> _CredentialsResources:
+    """
+    The resources built for the credentials. The credentials of a chat deserialized again
+    (see the credentials cache of the Google tools) replace the resources built for the
+    previous object, so that they don't outlive it.
+    """
+    key = _credentials_key(credentials)
+    entry: Optional[_CredentialsResources] = _resources.get(key)
+    if entry is None or entry.credentials is not credentials:
+        entry = _CredentialsResources(credentials)
+        _resources.set(key, entry)
+    return entry
+
+
+def get_service(api: str, version: str, credentials: Credentials) -> Resource:
+    """Like googleapiclient.discovery.build, reusing the service built for the same api, version and credentials"""
+    with _resources_lock:
+        entry = _get_resources(credentials)
+        service = entry.resources.get((api, version, ""))
+        if service is None:
+            service = build_from_document(
+                get_discovery_document(api, version),
+                credentials=credentials,
+                requestBuilder=entry.build_request
+            )
+            entry.resources[(api, version, "")] = service
+        return service
+
+
+def get_resource(api: str, version: str, credentials: Credentials, path: str) -> Resource:
+    """
+    Returns a collection of the service, e.g. "users.messages" for service.users().messages().
+    Collections build all of their methods when they are created, so they are reused too.
+    """
+    with _resources_lock:
+        entry = _get_resources(credentials)
+        resource = entry.resources.get((api, version, path))
+        if resource is None:
+            resource = get_service(api, version, credentials)
+            for name in path.split("."):
+                resource = getattr(resource, name)()
+            entry.resources[(api, version, path)] = resource
+        return resource
+
+
 class GoogleClient:
 
     def __init__(
@@ -88,7 +192,7 @@ class GoogleClient:
         self,
         data: CreateCalendarEventPayload
     ):
-        service = build('calendar', 'v3', credentials=self.credentials)
+        events = get_resource('calendar', 'v3', self.credentials, 'events')
 
         event = {
             'summary': data.summary,
@@ -97,19 +201,19 @@ class GoogleClient:
             'end': {'dateTime': data.end.isoformat(), 'timeZone': 'UTC'},
         }
 
-        event = service.events().insert(calendarId='primary', body=event).execute()
+        event = events.insert(calendarId='primary', body=event).execute()
 
     def get_calendar_events(
         self,
         data: GetCalendarEventsPayload
     ) -> List[Any]:
-        service = build('calendar', 'v3', credentials=self.credentials)
+        events = get_resource('calendar', 'v3', self.credentials, 'events')
 
         # Google API need the timezone. For simplicity we set UTC
         data.start = data.start.replace(tzinfo=timezone.utc)
         data.end = data.end.replace(tzinfo=timezone.utc)
 
-        events_result = service.events().list(
+        events_result = events.list(
             calendarId='primary',
             timeMin=data.start.isoformat(),
             timeMax=data.end.isoformat() if data.end else None,
@@ -147,69 +251,132 @@ class GoogleClient:
 
     def get_emails(
         self,
-        payload: GetEmailsPayload
-    ):
-        service = build('gmail', 'v1', credentials=self.credentials)
+        payload: GetEmailsPayload,
+        full_content: bool = GET_FULL_CONTENT
+    ) -> List[dict]:
+        return list(self.iter_emails(payload, full_content))
 
-        messages_list = service.users().messages().list(
+    def iter_emails(
+        self,
+        payload: GetEmailsPayload,
+        full_content: bool = GET_FULL_CONTENT
+    ) -> Iterator[dict]:
+        """
+        Yields the last emails, in order, as soon as they are loaded.
+        Messages are fetched with Gmail batch requests of GMAIL_BATCH_SIZE messages, GMAIL_MAX_CONCURRENT_BATCHES at a time.
+        Only the headers and the snippet are fetched when the full content is not needed.
+        """
+        gmail_messages = get_resource(
+            'gmail', 'v1', self.credentials, 'users.messages')
+
+        messages_list = gmail_messages.list(
             userId='me', maxResults=payload.number_of_emails).execute()
-        messages = messages_list.get('messages', [])
-
-        result = []
-
-        for message in messages:
-            msg = service.users().messages().get(
-                userId="me", id=message['id']).execute()
-
-            # Extracting sender, time, and content from the message
-            sender = next((header['value'] for header in msg['payload']
-                          ['headers'] if header['name'] == 'From'), None)
-            time = next((header['value'] for header in msg['payload']
-                        ['headers'] if header['name'] == 'Date'), None)
-            subject = next((header['value'] for header in msg['payload']
-                           ['headers'] if header['name'] == 'Subject'), None)
-
-            full_content = ''
-
-            if GET_FULL_CONTENT:
-                # Check if the email is in multipart format
-                if 'multipart' in msg['payload']['mimeType']:
-                    parts = msg['payload']['parts']
-                    full_content = ''
-                    for part in parts:
-                        if 'body' in part and 'data' in part['body']:
-                            data = part['body']['data']
-                            decoded_data = base64.urlsafe_b64decode(
-                                data.encode('UTF-8')).decode('UTF-8')
-                            full_content += decoded_data
-                else:
-                    # If the email is in plain text format
-                    full_content = base64.urlsafe_b64decode(
-                        msg['payload']['body']['data'].encode('UTF-8')).decode('UTF-8')
-
-                # Clear the full content
-                full_content = HtmlProcessor.clear_html(full_content)
-            else:
-                full_content = msg['snippet']
+        message_ids = [
+            message['id'] for message in messages_list.get('messages', [])
+        ]
+        if not message_ids:
+            return
+
+        batches = [
+            message_ids[start:start + GMAIL_BATCH_SIZE]
+            for start in range(0, len(message_ids), GMAIL_BATCH_SIZE)
+        ]
+        executor = ThreadPoolExecutor(
+            max_workers=min(GMAIL_MAX_CONCURRENT_BATCHES, len(batches)),
+            thread_name_prefix="gmail"
+        )
+        try:
+            futures = [
+                executor.submit(self.__get_messages, batch, full_content)
+                for batch in batches
+            ]
+            for future in futures:
+                for message in future.result():
+                    yield self.__parse_email(message, full_content)
+        finally:
+            # The caller may stop iterating before all the batches are loaded
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def __get_messages(
+        self,
+        message_ids: List[str],
+        full_content: bool
+    ) -> List[dict]:
+        """Fetches the messages with a single batch request, and returns them in the same order"""
+        gmail_messages = get_resource(
+            'gmail', 'v1', self.credentials, 'users.messages')
+        request_params = {"format": "full"} if full_content else {
+            "format": "metadata",
+            "metadataHeaders": EMAIL_HEADERS
+        }
 
-            result.append({
-                "sender": sender,
-                "time": time,
-                "subject": subject,
-                "content": full_content
-            })
+        messages = {}
+        errors = []
 
-        return result
+        def on_message(request_id, response, exception):
+            if exception is not None:
+                errors.append(exception)
+            else:
+                messages[request_id] = response
+
+        batch = get_service('gmail', 'v1', self.credentials).new_batch_http_request(
+            callback=on_message)
+        for message_id in message_ids:
+            batch.add(
+                gmail_messages.get(
+                    userId="me", id=message_id, **request_params),
+                request_id=message_id
+            )
+        batch.execute()
+
+        if errors:
+            raise errors[0]
+        return [messages[message_id] for message_id in message_ids]
+
+    def __parse_email(self, msg: dict, full_content: bool) -> dict:
+        # Extracting sender, time, and content from the message
+        headers = {
+            header['name']: header['value'] for header in msg['payload']['headers']
+        }
+
+        if full_content:
+            # Check if the email is in multipart format
+            if 'multipart' in msg['payload']['mimeType']:
+                parts = msg['payload']['parts']
+                content = ''
+                for part in parts:
+                    if 'body' in part and 'data' in part['body']:
+                        data = part['body']['data']
+                        decoded_data = base64.urlsafe_b64decode(
+                            data.encode('UTF-8')).decode('UTF-8')
+                        content += decoded_data
+            else:
+                # If the email is in plain text format
+                content = base64.urlsafe_b64decode(
+                    msg['payload']['body']['data'].encode('UTF-8')).decode('UTF-8')
+
+            # Clear the full content
+            content = HtmlProcessor.clear_html(content)
+        else:
+            content = msg['snippet']
+
+        return {
+            "sender": headers.get('From'),
+            "time": headers.get('Date'),
+            "subject": headers.get('Subject'),
+            "content": content
+        }
 
     def get_emails_html(
         self,
         payload: GetEmailsPayload
     ) -> str:
-        emails = self.get_emails(payload)
+        # Emails are formatted while the next ones are loading
+        emails = self.iter_emails(payload)
         emails_string = self.__emails_result_to_html_string(emails)
         return emails_string
 
-    def __emails_result_to_html_string(self, emails: List[Any]) -> str:
+    def __emails_result_to_html_string(self, emails: Iterable[Any]) -> str:
 
         emails_string = ""
         for idx, email in enumerate(emails):
@@ -233,12 +400,12 @@ class GoogleClient:
         self,
         payload: SendEmailPayload
     ):
-        service = build('gmail', 'v1', credentials=self.credentials)
+        users = get_resource('gmail', 'v1', self.credentials, 'users')
 
-        profile = service.users().getProfile(userId="me").execute()
+        profile = users.getProfile(userId="me").execute()
         message = self.__create_message(
             sender=profile["emailAddress"], to=payload.to, subject=payload.subject, body=payload.body)
-        message = self.__send_message(service, 'me', message)
+        message = self.__send_message('me', message)
         return "Email sent successfully!"
 
     def __create_message(self, sender: str, to: str, subject: str, body: str):
@@ -251,7 +418,9 @@ class GoogleClient:
             message.as_bytes()).decode()
         return {'raw': encoded_message}
 
-    def __send_message(self, service, user_id: str, message: dict):
-        message = service.users().messages().send(
+    def __send_message(self, user_id: str, message: dict):
+        gmail_messages = get_resource(
+            'gmail', 'v1', self.credentials, 'users.messages')
+        message = gmail_messages.send(
             userId=user_id, body=message).execute()
         return message
@@ -1,15 +1,58 @@
 import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from functools import lru_cache
 from textwrap import dedent
-from typing import Dict, List
+from typing import List
 
 import requests
-from parsel import Selector
 from pydantic import BaseModel, Field
-
-#from converso_chatbot.helpers import HtmlProcessor
+from requests.adapters import HTTPAdapter
+
+from converso_chatbot.clients.search_cache import (SEARCH_CACHE_FINANCIAL_TTL,
+                                                   SEARCH_CACHE_PAGE_TTL,
+                                                   SEARCH_CACHE_SERP_TTL,
+                                                   SearchContentType,
+                                                   get_search_cache,
+                                                   normalize_query,
+                                                   normalize_url)
+from converso_chatbot.clients.serp_parser import (FinancialData,
+                                                  SearchResultPage, parse_serp)
+from converso_chatbot.helpers import HtmlProcessor
 
 logger = logging.getLogger(__name__)
 
+# The client is shared by all the conversations of the process: remember
+# only the most recent queries
+MAX_PREVIOUS_SEARCHES = 100
+# Seconds to wait for the connection and for each read of a response
+SEARCH_REQUEST_TIMEOUT = float(os.environ.get("SEARCH_REQUEST_TIMEOUT", 10))
+CRAWL_REQUEST_TIMEOUT = float(os.environ.get("CRAWL_REQUEST_TIMEOUT", 5))
+# Seconds to wait for the results to crawl, in total
+CRAWL_DEADLINE = float(os.environ.get("CRAWL_DEADLINE", 8))
+CRAWL_MAX_WORKERS = int(os.environ.get("CRAWL_MAX_WORKERS", 4))
+# Hosts whose connections are kept alive, and connections kept alive per host
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", 32))
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 16))
+
+
+@lru_cache(maxsize=1)
+def get_http_session() -> requests.Session:
+    """
+    The session shared by the search clients of the process,
+    keeping alive the connections to Google and to the crawled websites
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
 
 class GoogleSearchClientPayload(BaseModel):
     query: str = Field(
@@ -47,7 +90,9 @@ class GoogleSearchClient:
             'upgrade-insecure-requests': '1',
             'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36 Edg/109.0.1518.78',
         }
-        self.previous_searches = []
+        self.previous_searches = deque(maxlen=MAX_PREVIOUS_SEARCHES)
+        self.session = get_http_session()
+        self.cache = get_search_cache()
 
     def search(
         self,
@@ -57,21 +102,33 @@ class GoogleSearchClient:
             raise ValueError("Query cannot be empty")
 
         logging.info(f"Searching the internet with query: {payload.query}")
-        params = {'q': payload.query}
-
-        response = self.make_request(
-            'https://www.google.com/search', params=params)
-
-        if response:
-            selector = Selector(response.text)
-            result = self.parse_search_results(selector, payload=payload)
-            self.previous_searches.append(payload.query)
-            return result
-
-    def make_request(self, url, params=None):
+        query = normalize_query(payload.query)
+        html = self.cache.get(SearchContentType.SERP, query)
+        from_cache = html is not None
+
+        if not from_cache:
+            params = {'q': payload.query}
+            response = self.make_request(
+                'https://www.google.com/search', params=params)
+            if not response:
+                return None
+            html = response.text
+
+        serp = parse_serp(html)
+        result = self.parse_search_results(serp, payload=payload)
+        self.previous_searches.append(payload.query)
+        # Pages without results (e.g. consent pages) raise above, and are not cached
+        if not from_cache:
+            ttl = SEARCH_CACHE_FINANCIAL_TTL if serp.financial_data else SEARCH_CACHE_SERP_TTL
+            self.cache.set(SearchContentType.SERP, query, html, ttl=ttl,
+                           source_bytes=len(response.content))
+        return result
+
+    def make_request(self, url, params=None, timeout=SEARCH_REQUEST_TIMEOUT):
         params = params or {}
         try:
-            response = requests.get(url, params=params, headers=self.headers)
+            response = self.session.get(
+                url, params=params, headers=self.headers, timeout=timeout)
             response.raise_for_status()
             return response
         except requests.exceptions.RequestException as e:
@@ -79,35 +136,32 @@ class GoogleSearchClient:
 
     def parse_search_results(
         self,
-        selector: Selector,
+        serp: SearchResultPage,
         payload: GoogleSearchClientPayload
-    ) -> List[Dict[str, str]]:
+    ) -> str:
         # Add parser for other data...
 
         financial_data = None
-        try:
-            financial_data = self.__scrape_financial_data(selector)
+        if serp.financial_data:
+            financial_data = self._format_financial_data(serp.financial_data)
             logging.info(f"Found financial data: {financial_data}")
-        except BaseException as e:
+        else:
             logging.info(f"No financial data found")
 
         info_box = None
-        try:
-            info_box = self._scrape_info_box(selector)
+        if serp.info_box:
+            info_box = self._format_info_box(serp.info_box)
             logging.info(f"Found info box: {info_box}")
-        except BaseException as e:
+        else:
             logger.info(f"No info box found")
 
         if self._enable_expanded_results(query=payload.query):
-            results_list = self._scrape_results_list(selector)
-            texts = []
-            for result in results_list:
-                if len(texts) < payload.num_expanded_results:
-                    text = self.get_main_content_from_url(result["url"])
-                    if text:
-                        texts.append(text)
-            if results_list:
-                logging.info(f"Found results from websites: {results_list}")
+            texts = self.crawl(
+                [result["url"] for result in serp.results],
+                num_results=payload.num_expanded_results
+            )
+            if serp.results:
+                logging.info(f"Found results from websites: {serp.results}")
         else:
             texts = []
             logging.info(
@@ -123,137 +177,84 @@ class GoogleSearchClient:
             {"".join(texts)}
         """)
 
-    def __scrape_financial_data(
-            self, selector: Selector) -> List[Dict[str, str]]:
-        """
-        Scrape financial data from Google search results.
-        The first xpath is for "Converter" result type; the second is for "asset chart" result type.
-        """
-
-        financial_data = self._get_xpath_with_alternatives(
-            selector,
-            [
-                '//div[@data-attrid="Converter"]',
-                '//div[@data-attrid="kc:/finance/stock:asset chart"]'
-            ]
-        )
-
-        asset_name = self._get_xpath_with_alternatives(
-            financial_data,
-            [
-                '//div[@class="cbXzDb"]//span[2]//text()',
-                '//div[@class="oPhL2e"]//span[@data-attrid="Company Name"]//text()'],
-            extract_first=True)
-
-        value = self._get_xpath_with_alternatives(
-            financial_data,
-            [
-                '//span[@class="pclqee"]//text()',
-                '//span[@jsname="vWLAgc"]//text()'
-            ],
-            extract_first=True
-        )
-
-        currency = self._get_xpath_with_alternatives(
-            financial_data,
-            [
-                '//span[@class="dvZgKd"]//text()',
-                '//span[@jsname="T3Us2d"]//text()'
-            ],
-            extract_first=True
-        )
-
-        variation = self._get_xpath_with_alternatives(
-            financial_data,
-            [
-                '//span[@class="iXabQc vgpkr"]',
-                '//span[@class="iXabQc ASafz"]',
-                '//span[contains(@class, "WlRRw") and contains(@class, "IsqQVc")]'])
-
-        absolute_variation = self._get_xpath_with_alternatives(
-            variation,
-            [
-                '//span[@jsname="SwWl3d"]//text()',
-                '//span[@jsname="qRSVye"]//text()'
-            ],
-            extract_first=True
-        )
-
-        percentage_variation = self._get_xpath_with_alternatives(
-            variation,
-            [
-                '//span[@jsname="rfaVEf"]//text()',
-                '//span[@class="IsqQVc fw-price-up"]//text()'
-            ],
-            extract_first=True
-        )
-
+    def _format_financial_data(self, financial_data: FinancialData) -> str:
+        currency = financial_data.currency
         # remove indentation
         return dedent(f"""
-            Financial data for {asset_name}:
-            Value: {value} {currency}
-            Daily variation: {absolute_variation} {currency} {percentage_variation}
+            Financial data for {financial_data.asset_name}:
+            Value: {financial_data.value} {currency}
+            Daily variation: {financial_data.absolute_variation} {currency} {financial_data.percentage_variation}
         """)
 
-    def _scrape_info_box(self, selector: Selector) -> List[Dict[str, str]]:
-        info_box = selector.xpath("//div[@class='I6TXqe']").extract_first()
-        if info_box:
-            return dedent(f"""
+    def _format_info_box(self, info_box: str) -> str:
+        return dedent(f"""
                 Found info box:
                 {HtmlProcessor.clear_html(info_box)}
             """)
 
-    def _scrape_results_list(self, selector: Selector) -> List[Dict[str, str]]:
-        parsed = []
-        results = selector.xpath("//div[@id='rso']/*")
-
-        for result in results:
-            try:
-                result_element = result.xpath(".//a[1]")
-                result_url = result_element[0].xpath("@href").extract_first()
-                result_title = result_element[0].xpath(
-                    ".//h3[1]//text()").extract()
-
-                if result_url != "#":
-                    parsed.append({
-                        "url": result_url,
-                        "title": result_title
-                    })
-            except IndexError as e:
-                logging.exception(f"Error parsing search result: {e}")
+    def crawl(
+        self,
+        urls: List[str],
+        num_results: int,
+        deadline: float = CRAWL_DEADLINE
+    ) -> List[str]:
+        """
+        Returns the main content of the first num_results urls that load, in the order of urls.
+        Urls are fetched CRAWL_MAX_WORKERS at a time: the ones not fetched yet when enough contents
+        are found, or after deadline seconds, are cancelled, and the ones loading are abandoned.
+        """
+        if not urls or num_results <= 0:
+            return []
 
-        return parsed
+        texts = {}
+        executor = ThreadPoolExecutor(
+            max_workers=min(CRAWL_MAX_WORKERS, len(urls)),
+            thread_name_prefix="crawler"
+        )
+        try:
+            futures = {
+                executor.submit(self.get_main_content_from_url, url): index
+                for index, url in enumerate(urls)
+            }
+            for future in as_completed(futures, timeout=deadline):
+                text = future.result()
+                if text:
+                    texts[futures[future]] = text
+                    if len(texts) >= num_results:
+                        break
+        except FuturesTimeoutError:
+            # Not the builtin TimeoutError before Python 3.11
+            logger.warning(
+                f"Crawling deadline of {deadline}s exceeded, found {len(texts)} of {num_results} results")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return [texts[index] for index in sorted(texts)]
 
     def get_main_content_from_url(
         self,
         url: str
     ):
+        normalized_url = normalize_url(url)
+        text_content = self.cache.get(SearchContentType.PAGE, normalized_url)
+        if text_content is not None:
+            return text_content
 
-        try:
-            response = self.make_request(url)
-        except requests.exceptions.MissingSchema as e:
+        response = self.make_request(url, timeout=CRAWL_REQUEST_TIMEOUT)
+        if not response:
             logging.info(f"Cannot get content from {url}")
+            return None
 
         try:
-            if response:
-                text_content = HtmlProcessor.clear_html(response.text)
-                logging.info(f"Found content from {url}")
-                return text_content
-        except requests.exceptions.RequestException as e:
+            text_content = HtmlProcessor.clear_html(response.text)
+            logging.info(f"Found content from {url}")
+            if text_content:
+                self.cache.set(SearchContentType.PAGE, normalized_url, text_content,
+                               ttl=SEARCH_CACHE_PAGE_TTL, source_bytes=len(response.content))
+            return text_content
+        except Exception as e:
             logging.exception(f"Error getting main content from {url}: {e}")
 
-    def _get_xpath_with_alternatives(
-        self,
-        selector: Selector,
-        xpaths: List[str],
-        extract_first: bool = False
-    ) -> [Selector | str]:
-        for xpath in xpaths:
-            result = selector.xpath(xpath)
-            if result:
-                return result.extract_first().strip() if extract_first else result
-        return "Not found"
-
     def _enable_expanded_results(self, query: str) -> bool:
         """
         The first time a query is executed, we try to answer it with quick information (e.g. financial data, info box).
@@ -1,2 +1,4 @@
+from .keyed_scheduler import KeyedScheduler
 from .rabbitmq_consumer import RabbitMQConsumer, get_rabbitmq_consumer
-from .rabbitmq_producer import RabbitMQProducerDep, RabbitMQProducer, get_rabbitmq_producer
+from .rabbitmq_producer import (RabbitMQProducer, RabbitMQProducerDep,
+                                get_rabbitmq_producer)
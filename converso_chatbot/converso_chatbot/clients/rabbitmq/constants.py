@@ -9,3 +9,20 @@ RABBITMQ_USER = 'user'
 # automatically populates some env variables from the services)
 if isinstance(RABBITMQ_PORT, str) and ':' in RABBITMQ_PORT:
     RABBITMQ_PORT = int(RABBITMQ_PORT.split(':')[-1])
+
+# Number of unacknowledged messages the broker delivers to each consumer.
+# Acts as backpressure: when all of them are being processed, RabbitMQ stops
+# delivering until some are acked.
+RABBITMQ_PREFETCH_COUNT = int(os.environ.get('RABBITMQ_PREFETCH_COUNT', 20))
+
+# Maximum number of conversations processed concurrently by each consumer.
+# Messages belonging to the same chat are always processed in order.
+RABBITMQ_MAX_CONCURRENCY = int(os.environ.get('RABBITMQ_MAX_CONCURRENCY', 8))
+
+# Maximum number of channels kept open by each producer.
+RABBITMQ_PRODUCER_POOL_SIZE = int(
+    os.environ.get('RABBITMQ_PRODUCER_POOL_SIZE', 4))
+
+# Seconds between the heartbeats of the producer connections. A pooled connection idle for
+# longer is opened again, since it may have been dropped without its socket noticing.
+RABBITMQ_HEARTBEAT = int(os.environ.get('RABBITMQ_HEARTBEAT', 60))
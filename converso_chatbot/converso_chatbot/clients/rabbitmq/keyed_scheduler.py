@@ -0,0 +1,98 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class KeyedScheduler:
+    """
+    Runs coroutines so that jobs sharing the same key are executed in submission order,
+    while jobs with different keys run concurrently, up to max_concurrency at a time.
+
+    Usage:
+        scheduler = KeyedScheduler(max_concurrency=8)
+        result = await scheduler.submit(chat_id, process_message, body)
+    """
+
+    def __init__(self, max_concurrency: int = 1):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Last submitted job for each key: the next job with the same key waits for it
+        self._tails: Dict[Hashable, asyncio.Future] = {}
+        self._queued: Dict[Hashable, int] = defaultdict(int)
+        self._in_flight: Dict[Hashable, int] = defaultdict(int)
+
+    def submit(
+        self,
+        key: Hashable,
+        coroutine_function: Callable[..., Awaitable[Any]],
+        *args: Any
+    ) -> asyncio.Future:
+        """
+        Schedules coroutine_function(*args) and returns a future with its result.
+        The job is enqueued synchronously, so jobs submitted in order for the same key run in order.
+        """
+        previous = self._tails.get(key)
+        self._queued[key] += 1
+        job = asyncio.ensure_future(
+            self._run(key, previous, coroutine_function, args))
+        self._tails[key] = job
+        job.add_done_callback(lambda _: self._on_job_done(key, job))
+        return job
+
+    async def _run(
+        self,
+        key: Hashable,
+        previous: asyncio.Future,
+        coroutine_function: Callable[..., Awaitable[Any]],
+        args: tuple
+    ) -> Any:
+        started = False
+        try:
+            if previous is not None and not previous.done():
+                # asyncio.wait does not propagate the exception of the
+                # previous job
+                await asyncio.wait([previous])
+
+            async with self._semaphore:
+                self._queued[key] -= 1
+                self._in_flight[key] += 1
+                started = True
+                try:
+                    return await coroutine_function(*args)
+                finally:
+                    self._in_flight[key] -= 1
+        finally:
+            # The job was cancelled before it could start
+            if not started:
+                self._queued[key] -= 1
+
+    def _on_job_done(self, key: Hashable, job: asyncio.Future):
+        if self._tails.get(key) is job:
+            del self._tails[key]
+        if not self._queued.get(key):
+            self._queued.pop(key, None)
+        if not self._in_flight.get(key):
+            self._in_flight.pop(key, None)
+
+    @property
+    def queued(self) -> int:
+        """Number of jobs waiting for their key or for a free slot."""
+        return sum(self._queued.values())
+
+    @property
+    def in_flight(self) -> int:
+        """Number of jobs currently running."""
+        return sum(self._in_flight.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "active_keys": len(self._tails),
+            "queued_by_key": {
+                str(key): count for key, count in self._queued.items() if count
+            }
+        }
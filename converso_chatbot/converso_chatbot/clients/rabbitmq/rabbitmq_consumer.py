@@ -1,36 +1,52 @@
-import asyncio
 import json
 import logging
 from typing import Coroutine
 
 import aio_pika
 
-from .constants import (RABBITMQ_HOST, RABBITMQ_PASSWORD, RABBITMQ_PORT,
-                        RABBITMQ_USER)
+from .constants import (RABBITMQ_HOST, RABBITMQ_MAX_CONCURRENCY,
+                        RABBITMQ_PASSWORD, RABBITMQ_PORT,
+                        RABBITMQ_PREFETCH_COUNT, RABBITMQ_USER)
+from .keyed_scheduler import KeyedScheduler
 
 logger = logging.getLogger(__name__)
 
 
 class RabbitMQConsumer:
+    """
+    Consumes messages from a queue and processes them with on_message_callback.
+
+    Messages with the same value of `key` (by default the chat_id) are processed in order,
+    while messages of different chats are processed concurrently, up to max_concurrency.
+    prefetch_count bounds the number of unacknowledged messages held by the consumer.
+    """
+
     def __init__(
         self,
         on_message_callback: Coroutine[dict, None, None],
-        queue_name: str
+        queue_name: str,
+        key: str = "chat_id",
+        max_concurrency: int = RABBITMQ_MAX_CONCURRENCY,
+        prefetch_count: int = RABBITMQ_PREFETCH_COUNT
     ):
         self.queue_name = queue_name
         self.on_message_callback = on_message_callback
+        self.key = key
+        self.prefetch_count = prefetch_count
         self.connection = None
-        self.lock = asyncio.Lock()
+        self.scheduler = KeyedScheduler(max_concurrency=max_concurrency)
 
     async def on_message(self, message):
         async with message.process():
-            async with self.lock:
-                body = json.loads(message.body.decode())
-                logging.debug(f" [x] Received {body}")
-                await self.on_message_callback(body)
-                # Your processing logic here
-                # For example, you can call an async function:
-                # await process_message(body)
+            # Nothing before submit suspends, so jobs are enqueued in
+            # delivery order
+            body = json.loads(message.body.decode())
+            logging.debug(f" [x] Received {body}")
+            await self.scheduler.submit(
+                body.get(self.key),
+                self.on_message_callback,
+                body
+            )
 
     async def setup_consumer(self):
         self.connection = await aio_pika.connect_robust(
@@ -42,12 +58,21 @@ class RabbitMQConsumer:
             fail_fast=0
         )
         channel = await self.connection.channel()
+        await channel.set_qos(prefetch_count=self.prefetch_count)
         queue = await channel.declare_queue(self.queue_name, durable=True)
         await queue.consume(self.on_message)
 
     async def run_consumer(self):
         await self.setup_consumer()
 
+    def stats(self) -> dict:
+        """Queue depth and in-flight counts of this worker."""
+        return {
+            "queue": self.queue_name,
+            "prefetch_count": self.prefetch_count,
+            **self.scheduler.stats()
+        }
+
 
 def get_rabbitmq_consumer(
     on_message_callback: Coroutine[dict, None, None],
@@ -1,22 +1,67 @@
 import os
+from functools import lru_cache
 from typing import Annotated
 
 import redis
+import redis.asyncio
 
 REDIS_HOST = os.environ.get('REDIS_HOST')
 REDIS_PASSWORD = os.environ.get('REDIS_PASSWORD')
+# Connections of each pool (sync and async). When all of them are in use,
+# commands wait for one to be released
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 32))
+REDIS_POOL_TIMEOUT = int(os.environ.get('REDIS_POOL_TIMEOUT', 20))
 
 
-def get_redis_client():
-    return redis.Redis(
+@lru_cache(maxsize=1)
+def get_redis_connection_pool() -> redis.BlockingConnectionPool:
+    """The connection pool shared by the sync clients of the process"""
+    return redis.BlockingConnectionPool(
+        host=REDIS_HOST,
+        password=REDIS_PASSWORD,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT
+    )
+
+
+@lru_cache(maxsize=1)
+def get_async_redis_connection_pool() -> redis.asyncio.BlockingConnectionPool:
+    """
+    The connection pool shared by the async clients of the process.
+    Its connections are bound to the event loop that opens them.
+    """
+    return redis.asyncio.BlockingConnectionPool(
         host=REDIS_HOST,
-        password=REDIS_PASSWORD
+        password=REDIS_PASSWORD,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT
     )
 
 
+def get_redis_client():
+    return redis.Redis(connection_pool=get_redis_connection_pool())
+
+
+def get_async_redis_client():
+    return redis.asyncio.Redis(
+        connection_pool=get_async_redis_connection_pool())
+
+
+async def async_redis_client_dependency():
+    """FastAPI dependency that releases the client connections to the pool after the request"""
+    redis_client = get_async_redis_client()
+    try:
+        yield redis_client
+    finally:
+        await redis_client.aclose()
+
+
 RedisClientDep = None
+AsyncRedisClientDep = None
 try:
     from fastapi import Depends
     RedisClientDep = Annotated[redis.Redis, Depends(get_redis_client)]
+    AsyncRedisClientDep = Annotated[redis.asyncio.Redis, Depends(
+        async_redis_client_dependency)]
 except ImportError:
     pass
@@ -0,0 +1,194 @@
+"""
+Cache of the Google search result pages and of the text of the crawled websites,
+shared by the workers in redis and kept in-process for the most recent entries.
+
+Queries and urls are normalized, so that the same search written differently,
+or the same page linked with tracking parameters, is fetched once.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import redis
+
+from converso_chatbot.clients.redis import get_redis_client
+from converso_chatbot.helpers import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Seconds the entries are valid, by content type. Result pages showing financial data
+# are valid for less time, since the prices they show change
+SEARCH_CACHE_SERP_TTL = int(os.environ.get("SEARCH_CACHE_SERP_TTL", 3600))
+SEARCH_CACHE_FINANCIAL_TTL = int(
+    os.environ.get("SEARCH_CACHE_FINANCIAL_TTL", 60))
+SEARCH_CACHE_PAGE_TTL = int(os.environ.get("SEARCH_CACHE_PAGE_TTL", 86400))
+# Entries kept in-process. Result pages are some hundreds of KB each
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", 128))
+
+_WHITESPACE = re.compile(r"\s+")
+# Query parameters that don't change the content of a page
+_TRACKING_PARAMETERS = re.compile(r"^(utm_\w+|gclid|fbclid|ved|usg|sa|ei)$")
+
+
+class SearchContentType(str, Enum):
+    SERP = "serp"
+    PAGE = "page"
+
+
+def normalize_query(query: str) -> str:
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", query)).strip().casefold()
+
+
+def normalize_url(url: str) -> str:
+    """Lowercases scheme and host, drops fragment and tracking parameters, sorts the query parameters"""
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _TRACKING_PARAMETERS.match(name)
+    )
+    return urlunsplit((
+        parts.scheme.lower(),
+        parts.netloc.lower(),
+        parts.path or "/",
+        urlencode(query),
+        ""
+    ))
+
+
+class _CachedEntry:
+
+    def __init__(self, value: str, source_bytes: int, expires_at: float) -> None:
+        self.value = value
+        self.source_bytes = source_bytes
+        self.expires_at = expires_at
+
+
+class SearchCache:
+    """
+    Two-tier cache: an in-process LRUCache in front of redis.
+    Entries found in redis are copied in-process, for the time they have left.
+    Redis errors are logged and handled as misses: the search works without the cache.
+    """
+
+    def __init__(
+        self,
+        redis_client_factory: Callable[[], redis.Redis] = get_redis_client,
+        maxsize: int = SEARCH_CACHE_SIZE
+    ) -> None:
+        self.redis_client_factory = redis_client_factory
+        self.memory = LRUCache(maxsize=maxsize)
+        self.counters: Dict[str, Dict[str, int]] = defaultdict(lambda: {
+            "memory_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "bytes_saved": 0
+        })
+        self.lock = threading.Lock()
+
+    def get(self, content_type: SearchContentType, key: str) -> Optional[str]:
+        cache_key = self._cache_key(content_type, key)
+
+        entry: _CachedEntry = self.memory.get(cache_key)
+        if entry and time.time() < entry.expires_at:
+            self._count(content_type, "memory_hits", entry.source_bytes)
+            return entry.value
+
+        entry = self._redis_get(cache_key)
+        if entry:
+            self.memory.set(cache_key, entry)
+            self._count(content_type, "redis_hits", entry.source_bytes)
+            return entry.value
+
+        self._count(content_type, "misses")
+        return None
+
+    def set(
+        self,
+        content_type: SearchContentType,
+        key: str,
+        value: str,
+        ttl: int,
+        source_bytes: Optional[int] = None
+    ) -> None:
+        """
+        Caches the value for ttl seconds.
+        source_bytes are the bytes downloaded to obtain the value, counted as saved on every hit.
+        """
+        if source_bytes is None:
+            source_bytes = len(value.encode("utf-8"))
+        cache_key = self._cache_key(content_type, key)
+        self.memory.set(
+            cache_key,
+            _CachedEntry(value, source_bytes, time.time() + ttl)
+        )
+        try:
+            self.redis_client_factory().set(
+                cache_key,
+                json.dumps({"value": value, "source_bytes": source_bytes}),
+                ex=ttl
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Could not store {cache_key} in the search cache: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = {}
+            for content_type, counters in self.counters.items():
+                lookups = counters["memory_hits"] + \
+                    counters["redis_hits"] + counters["misses"]
+                hits = counters["memory_hits"] + counters["redis_hits"]
+                stats[content_type] = {
+                    **counters,
+                    "hit_rate": round(hits / lookups, 3) if lookups else 0.0
+                }
+        stats["memory"] = self.memory.stats()
+        return stats
+
+    def _redis_get(self, cache_key: str) -> Optional[_CachedEntry]:
+        try:
+            client = self.redis_client_factory()
+            with client.pipeline(transaction=False) as pipeline:
+                pipeline.get(cache_key)
+                pipeline.ttl(cache_key)
+                serialized, ttl = pipeline.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not read {cache_key} from the search cache: {e}")
+            return None
+
+        if not serialized or ttl is None or ttl <= 0:
+            return None
+        cached = json.loads(serialized)
+        return _CachedEntry(
+            cached["value"],
+            cached["source_bytes"],
+            time.time() + ttl
+        )
+
+    def _count(self, content_type: SearchContentType, counter: str, source_bytes: int = 0) -> None:
+        with self.lock:
+            counters = self.counters[content_type.value]
+            counters[counter] += 1
+            counters["bytes_saved"] += source_bytes
+
+    @staticmethod
+    def _cache_key(content_type: SearchContentType, key: str) -> str:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+        return f"SEARCH_CACHE:{content_type.value}:{digest}"
+
+
+@lru_cache(maxsize=1)
+def get_search_cache() -> SearchCache:
+    """The search cache shared by the search clients of the process"""
+    return SearchCache()
@@ -0,0 +1,146 @@
+"""
+Parser of the Google search result pages (SERP).
+
+The page is parsed once with lxml, and the blocks the client uses (financial data, info box,
+results list) are found together in a single walk over the div elements. Their fields are
+then read with XPath expressions compiled at import, relative to the block they belong to.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+from lxml import etree
+from pydantic import BaseModel
+
+NOT_FOUND = "Not found"
+
+# Fields of the financial data, for the "Converter" and the "asset chart" result types
+_ASSET_NAME = [
+    etree.XPath('.//div[@class="cbXzDb"]//span[2]//text()'),
+    etree.XPath(
+        './/div[@class="oPhL2e"]//span[@data-attrid="Company Name"]//text()')
+]
+_VALUE = [
+    etree.XPath('.//span[@class="pclqee"]//text()'),
+    etree.XPath('.//span[@jsname="vWLAgc"]//text()')
+]
+_CURRENCY = [
+    etree.XPath('.//span[@class="dvZgKd"]//text()'),
+    etree.XPath('.//span[@jsname="T3Us2d"]//text()')
+]
+_VARIATION = [
+    etree.XPath('.//span[@class="iXabQc vgpkr"]'),
+    etree.XPath('.//span[@class="iXabQc ASafz"]'),
+    etree.XPath(
+        './/span[contains(@class, "WlRRw") and contains(@class, "IsqQVc")]')
+]
+_ABSOLUTE_VARIATION = [
+    etree.XPath('.//span[@jsname="SwWl3d"]//text()'),
+    etree.XPath('.//span[@jsname="qRSVye"]//text()')
+]
+_PERCENTAGE_VARIATION = [
+    etree.XPath('.//span[@jsname="rfaVEf"]//text()'),
+    etree.XPath('.//span[@class="IsqQVc fw-price-up"]//text()')
+]
+
+# Link and title of each entry of the results list
+_RESULT_LINK = etree.XPath('(.//a)[1]')
+_RESULT_TITLE = etree.XPath('.//h3[1]//text()')
+
+# data-attrid of the financial data blocks, in order of preference
+_FINANCIAL_DATA_ATTRIDS = ("Converter", "kc:/finance/stock:asset chart")
+_INFO_BOX_CLASS = "I6TXqe"
+_RESULTS_LIST_ID = "rso"
+
+
+class FinancialData(BaseModel):
+    asset_name: str = NOT_FOUND
+    value: str = NOT_FOUND
+    currency: str = NOT_FOUND
+    absolute_variation: str = NOT_FOUND
+    percentage_variation: str = NOT_FOUND
+
+
+class SearchResultPage(BaseModel):
+    financial_data: Optional[FinancialData] = None
+    # HTML of the info box
+    info_box: Optional[str] = None
+    # url and title of the results, in order
+    results: List[Dict] = []
+
+
+def parse_serp(html: str) -> SearchResultPage:
+    if not html or not html.strip():
+        return SearchResultPage()
+    root = etree.fromstring(html, etree.HTMLParser(
+        recover=True, no_network=True))
+    if root is None:
+        return SearchResultPage()
+
+    financial_data_blocks = {}
+    info_box = None
+    results_list = None
+    for div in root.iter("div"):
+        attrid = div.get("data-attrid")
+        if attrid in _FINANCIAL_DATA_ATTRIDS:
+            financial_data_blocks.setdefault(attrid, div)
+        elif info_box is None and div.get("class") == _INFO_BOX_CLASS:
+            info_box = div
+        elif results_list is None and div.get("id") == _RESULTS_LIST_ID:
+            results_list = div
+
+    financial_data_block = next(
+        (financial_data_blocks[attrid]
+         for attrid in _FINANCIAL_DATA_ATTRIDS if attrid in financial_data_blocks),
+        None
+    )
+    return SearchResultPage(
+        financial_data=_parse_financial_data(
+            financial_data_block) if financial_data_block is not None else None,
+        info_box=etree.tostring(info_box, encoding="unicode",
+                                method="html", with_tail=False) if info_box is not None else None,
+        results=_parse_results_list(
+            results_list) if results_list is not None else []
+    )
+
+
+def _parse_financial_data(block) -> FinancialData:
+    variation = _first_match(block, _VARIATION)
+    variation = variation if variation is not None else block
+    return FinancialData(
+        asset_name=_first_text(block, _ASSET_NAME),
+        value=_first_text(block, _VALUE),
+        currency=_first_text(block, _CURRENCY),
+        absolute_variation=_first_text(variation, _ABSOLUTE_VARIATION),
+        percentage_variation=_first_text(variation, _PERCENTAGE_VARIATION)
+    )
+
+
+def _parse_results_list(results_list) -> List[Dict]:
+    results = []
+    for result in results_list:
+        if not isinstance(result.tag, str):
+            # Comments and processing instructions
+            continue
+        links = _RESULT_LINK(result)
+        if not links:
+            continue
+        url = links[0].get("href")
+        if url and url != "#":
+            results.append({
+                "url": url,
+                "title": [str(text) for text in _RESULT_TITLE(links[0])]
+            })
+    return results
+
+
+def _first_match(element, xpaths: Sequence[etree.XPath]):
+    for xpath in xpaths:
+        matches = xpath(element)
+        if matches:
+            return matches[0]
+    return None
+
+
+def _first_text(element, xpaths: Sequence[etree.XPath]) -> str:
+    text = _first_match(element, xpaths)
+    return str(text).strip() if text is not None else NOT_FOUND
@@ -4,5 +4,7 @@ from enum import Enum
 
 class RedisKeys(Enum):
     AGENT_STATE = "AGENT_STATE"
+    ACTIVE_FORM_TOOL = "ACTIVE_FORM_TOOL"
+    CHAT_HISTORY = "CHAT_HISTORY"
     GOOGLE_CREDENTIALS = "GOOGLE_CREDENTIALS"
     GOOGLE_STATE_TOKEN = "GOOGLE_STATE_TOKEN"
@@ -2,8 +2,9 @@ import logging
 
 from fastapi import APIRouter, HTTPException
 
-from converso_chatbot.clients import RedisClientDep
+from converso_chatbot.clients import AsyncRedisClientDep, RedisClientDep
 from converso_chatbot.constants import RedisKeys
+from converso_chatbot.conversational_engine.form_agent import chat_history_key
 
 logger = logging.getLogger(__name__)
 
@@ -19,15 +20,20 @@ def delete_conversations(redis_client: RedisClientDep):
 
 
 @conversations_router.delete("/{chat_id}")
-async def chat(chat_id: str, redis_client: RedisClientDep):
+async def chat(chat_id: str, redis_client: AsyncRedisClientDep):
     """Delete a conversation"""
 
-    if not redis_client.exists(chat_id):
+    history_key = chat_history_key(chat_id)
+    if not await redis_client.exists(chat_id, history_key):
         raise HTTPException(status_code=404, detail="Item not found")
 
-    redis_client.hdel(
-        chat_id,
-        RedisKeys.AGENT_STATE.value
-    )
+    async with redis_client.pipeline() as pipeline:
+        pipeline.hdel(
+            chat_id,
+            RedisKeys.AGENT_STATE.value,
+            RedisKeys.ACTIVE_FORM_TOOL.value
+        )
+        pipeline.delete(history_key)
+        await pipeline.execute()
     logger.info(f"Deleted conversation {chat_id}")
     return {"content": "Conversation deleted"}
@@ -14,6 +14,8 @@ from starlette.exceptions import HTTPException
 
 from converso_chatbot.clients import RabbitMQProducerDep, RedisClientDep
 from converso_chatbot.constants import MessageQueues, MessageType, RedisKeys
+from converso_chatbot.conversational_engine.tools.google.credentials import \
+    invalidate_google_credentials
 
 logger = logging.getLogger(__name__)
 google_login_router = APIRouter(prefix="/google")
@@ -141,6 +143,7 @@ def callback(
         RedisKeys.GOOGLE_CREDENTIALS.value,
         pickle.dumps(credentials)
     )
+    invalidate_google_credentials(chat_id)
 
     # Publish a message to the RabbitMQ queue
     rabbitmq_client.publish(
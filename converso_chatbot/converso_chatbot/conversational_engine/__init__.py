@@ -2,3 +2,4 @@
 from .message_consumer import *
 from .form_agent import *
 from .tools import *
+from .turn_context import TurnContext, get_turn_context, use_turn_context
@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+
+from converso_chatbot.clients.rabbitmq import RabbitMQProducer
+from converso_chatbot.constants.message_type import MessageType
+from converso_chatbot.conversational_engine.form_agent.history_window import (
+    count_message_tokens, count_tokens)
+
+# Seconds between two TEXT_DELTA messages of an answer: the tokens generated in between are sent together
+STREAM_PUBLISH_INTERVAL = float(os.getenv("STREAM_PUBLISH_INTERVAL", 0.2))
+
+
+class AnswerStreamer(BaseCallbackHandler):
+    """
+    Publishes the text of the LLM answers of a turn while it is generated, as TEXT_DELTA messages.
+
+    Every LLM call is a stream, identified by its run id. Only the calls answering the user are
+    published: a call stops being published as soon as it starts generating a tool call, and
+    the text it generated before (rarely, with the OpenAI tools agent) is replaced in the chat
+    by the next stream of the turn. The first tokens of a stream are published immediately,
+    the following ones at most every publish_interval seconds, and the rest when the call ends.
+
+    Streamed responses don't report the token usage, so the prompt and completion tokens are
+    counted here. Their cost is not tracked.
+    """
+
+    def __init__(
+        self,
+        chat_id: str,
+        rabbitmq_producer: RabbitMQProducer,
+        queue: str,
+        publish_interval: float = STREAM_PUBLISH_INTERVAL
+    ) -> None:
+        self.chat_id = chat_id
+        self.rabbitmq_producer = rabbitmq_producer
+        self.queue = queue
+        self.publish_interval = publish_interval
+        # Text not published yet, and time of the last publish, by stream
+        self.pending: Dict[UUID, str] = {}
+        self.published_at: Dict[UUID, float] = {}
+        # Streams published in the turn, in order
+        self.stream_ids: List[str] = []
+        # Calls generating a tool call, not published
+        self.tool_call_runs: Set[UUID] = set()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.lock = threading.Lock()
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[BaseMessage]],
+        *,
+        run_id: UUID,
+        **kwargs: Any
+    ) -> None:
+        prompt_tokens = sum(
+            count_message_tokens(message)
+            for prompt in messages for message in prompt
+        )
+        tools = kwargs.get("invocation_params", {}).get("tools")
+        if tools:
+            prompt_tokens += count_tokens(json.dumps(tools))
+        with self.lock:
+            self.prompt_tokens += prompt_tokens
+
+    def on_llm_new_token(
+        self,
+        token: str,
+        *,
+        chunk: Optional[Any] = None,
+        run_id: UUID,
+        **kwargs: Any
+    ) -> None:
+        message = getattr(chunk, "message", None)
+        if message is not None and message.additional_kwargs.get("tool_calls"):
+            with self.lock:
+                self.tool_call_runs.add(run_id)
+                self.pending.pop(run_id, None)
+            return
+        if not token:
+            return
+
+        with self.lock:
+            if run_id in self.tool_call_runs:
+                return
+            text = self.pending.get(run_id, "") + token
+            published_at = self.published_at.get(run_id)
+            now = time.monotonic()
+            if published_at is not None and now - published_at < self.publish_interval:
+                self.pending[run_id] = text
+                return
+            self.pending[run_id] = ""
+            self.published_at[run_id] = now
+
+        self._publish(run_id, text)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        completion_tokens = 0
+        for generations in getattr(response, "generations", None) or []:
+            for generation in generations:
+                completion_tokens += count_tokens(generation.text)
+                message = getattr(generation, "message", None)
+                tool_calls = message.additional_kwargs.get(
+                    "tool_calls") if message is not None else None
+                if tool_calls:
+                    completion_tokens += count_tokens(json.dumps(tool_calls))
+
+        with self.lock:
+            self.completion_tokens += completion_tokens
+            text = self.pending.pop(run_id, "")
+            self.published_at.pop(run_id, None)
+            self.tool_call_runs.discard(run_id)
+        if text:
+            self._publish(run_id, text)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self.lock:
+            self.pending.pop(run_id, None)
+            self.published_at.pop(run_id, None)
+            self.tool_call_runs.discard(run_id)
+
+    def _publish(self, run_id: UUID, text: str) -> None:
+        stream_id = str(run_id)
+        with self.lock:
+            if stream_id not in self.stream_ids:
+                self.stream_ids.append(stream_id)
+
+        self.rabbitmq_producer.publish(
+            queue=self.queue,
+            message=json.dumps({
+                "chat_id": self.chat_id,
+                "type": MessageType.TEXT_DELTA.value,
+                "stream_id": stream_id,
+                "content": text
+            })
+        )
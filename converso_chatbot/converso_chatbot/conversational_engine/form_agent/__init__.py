@@ -1,2 +1,6 @@
 from .model_factory import *
-from .memory import get_stored_agent_state, store_agent_state
+from .form_agent_executor import ChatFormAgentExecutor
+from .history_window import HistoryMetrics, select_history
+from .memory import (aget_stored_agent_state, astore_agent_state,
+                     chat_history_key, get_stored_agent_state,
+                     store_agent_state)
@@ -0,0 +1,307 @@
+"""
+Record/replay layer for the chat models, to run the agents and the evaluation without network.
+
+With LLM_CASSETTE_MODE=record the requests are sent to the real model and its responses are
+stored in the cassette at LLM_CASSETTE_PATH, by hash of the request. With replay they are
+answered from the cassette after LLM_CASSETTE_LATENCY seconds ("recorded" waits as long as
+the recorded request took), and a request not in the cassette raises CassetteMiss.
+With auto only the requests not in the cassette are recorded.
+
+    LLM_CASSETTE_MODE=record LLM_CASSETTE_PATH=cassettes/turns.jsonl uvicorn converso_chatbot.main:app
+    LLM_CASSETTE_MODE=replay LLM_CASSETTE_PATH=cassettes/turns.jsonl LLM_CASSETTE_LATENCY=recorded \
+        uvicorn converso_chatbot.main:app
+
+The evaluation imports this module from the chatbot too (see evaluation/evaluator_helpers.py).
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (AIMessage, AIMessageChunk, BaseMessage,
+                                     message_to_dict)
+from langchain_core.outputs import (ChatGeneration, ChatGenerationChunk,
+                                    ChatResult)
+from langchain_core.pydantic_v1 import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+# off, record, replay or auto
+LLM_CASSETTE_MODE = os.environ.get("LLM_CASSETTE_MODE", "off").lower()
+LLM_CASSETTE_PATH = os.environ.get(
+    "LLM_CASSETTE_PATH", "cassettes/llm_cassette.jsonl")
+# Seconds before a replayed response, or "recorded"
+LLM_CASSETTE_LATENCY = os.environ.get("LLM_CASSETTE_LATENCY", "0")
+# Seconds between the tokens of a replayed response, when streaming
+LLM_CASSETTE_TOKEN_LATENCY = float(
+    os.environ.get("LLM_CASSETTE_TOKEN_LATENCY", 0))
+
+CASSETTE_MODES = ("off", "record", "replay", "auto")
+
+# Parts of the messages that change at every run, as the current datetime in the
+# system prompts, are not part of the request hash
+VOLATILE_PATTERNS = [
+    re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(\.\d+)?")
+]
+
+# Fields of the messages set by the client for every run, not sent to the model
+VOLATILE_MESSAGE_FIELDS = ("id", "response_metadata")
+
+_TOKEN_PATTERN = re.compile(r"\s*\S+|\s+")
+
+
+class CassetteMiss(LookupError):
+    pass
+
+
+class Cassette:
+    """
+    Responses by request hash, stored in a JSON Lines file: one line with the key and the
+    response for each response recorded, appended to the file. The file is read in memory
+    when the cassette is opened, the last line of a key winning.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.responses: Dict[str, dict] = {}
+        self.file = None
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for number, line in enumerate(f, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # The last line of a recording that crashed while writing it
+                        logger.warning(
+                            f"Skipping the invalid line {number} of {path}")
+                        continue
+                    self.responses[entry["key"]] = entry["response"]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        with self.lock:
+            response = self.responses.get(key)
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return response
+
+    def put(self, key: str, response: dict) -> None:
+        line = json.dumps({"key": key, "response": response}, sort_keys=True) + "\n"
+        with self.lock:
+            self.responses[key] = response
+            if self.file is None:
+                self.file = self._open()
+            self.file.write(line)
+            self.file.flush()
+
+    def stats(self) -> dict:
+        return {
+            "responses": len(self.responses),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    def _open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # A crash while writing leaves a truncated line: the next response starts on a new one
+        truncated = False
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                truncated = f.read(1) != b"\n"
+        file = open(self.path, "a", encoding="utf-8")
+        if truncated:
+            file.write("\n")
+        return file
+
+
+@lru_cache(maxsize=None)
+def get_cassette(path: str) -> Cassette:
+    return Cassette(path)
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        for pattern in VOLATILE_PATTERNS:
+            value = pattern.sub("<volatile>", value)
+        return value
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def _message_to_dict(message: BaseMessage) -> dict:
+    data = message_to_dict(message)["data"]
+    return {key: value for key, value in data.items() if key not in VOLATILE_MESSAGE_FIELDS}
+
+
+def request_hash(
+    params: Dict[str, Any],
+    messages: List[BaseMessage],
+    stop: Optional[List[str]] = None,
+    **kwargs: Any
+) -> str:
+    """Hash of the model parameters, the messages and the tools of a request"""
+    request = _normalize({
+        "params": {key: value for key, value in params.items()
+                   if key not in ("verbose", "streaming", "callbacks")},
+        "messages": [_message_to_dict(message) for message in messages],
+        "stop": stop,
+        "kwargs": kwargs
+    })
+    return hashlib.blake2b(
+        json.dumps(request, sort_keys=True, default=str).encode(),
+        digest_size=16
+    ).hexdigest()
+
+
+class CassetteChatModel(BaseChatModel):
+    """
+    Chat model answering from a cassette, in front of the chat model built by
+    chat_model_factory(**params), which is only built to record the missing responses.
+    """
+
+    params: Dict[str, Any]
+    chat_model_factory: Callable[..., BaseChatModel]
+    cassette_path: str = LLM_CASSETTE_PATH
+    mode: str = "replay"
+    # Seconds before a replayed response, None for the recorded latency
+    latency: Optional[float] = 0.0
+    token_latency: float = LLM_CASSETTE_TOKEN_LATENCY
+    streaming: bool = False
+
+    _chat_model: Optional[BaseChatModel] = PrivateAttr(default=None)
+    _chat_model_lock: threading.Lock = PrivateAttr(
+        default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    @property
+    def cassette(self) -> Cassette:
+        return get_cassette(self.cassette_path)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        key = request_hash(self.params, messages, stop, **kwargs)
+        response = None if self.mode == "record" else self.cassette.get(key)
+        if response is not None:
+            return self._replay(response, run_manager)
+        if self.mode == "replay":
+            raise CassetteMiss(
+                f"No response recorded in {self.cassette_path} for the request {key}")
+        return self._record(key, messages, stop, run_manager, **kwargs)
+
+    def _replay(
+        self,
+        response: dict,
+        run_manager: Optional[CallbackManagerForLLMRun]
+    ) -> ChatResult:
+        latency = response.get(
+            "latency", 0.0) if self.latency is None else self.latency
+        if latency > 0:
+            time.sleep(latency)
+
+        content = response["content"]
+        if self.streaming and run_manager and content:
+            for token in _TOKEN_PATTERN.findall(content):
+                if self.token_latency > 0:
+                    time.sleep(self.token_latency)
+                run_manager.on_llm_new_token(
+                    token,
+                    chunk=ChatGenerationChunk(
+                        message=AIMessageChunk(content=token))
+                )
+
+        message = AIMessage(
+            content=content,
+            additional_kwargs=response.get("additional_kwargs", {})
+        )
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output=response.get("llm_output")
+        )
+
+    def _record(
+        self,
+        key: str,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]],
+        run_manager: Optional[CallbackManagerForLLMRun],
+        **kwargs: Any
+    ) -> ChatResult:
+        start = time.perf_counter()
+        # The tokens streamed by the chat model reach the callbacks of this one
+        result = self._get_chat_model()._generate(
+            messages, stop=stop, run_manager=run_manager, **kwargs)
+        latency = time.perf_counter() - start
+
+        message = result.generations[0].message
+        self.cassette.put(key, {
+            "content": message.content,
+            "additional_kwargs": message.additional_kwargs,
+            "llm_output": result.llm_output,
+            "latency": round(latency, 3)
+        })
+        logger.debug(f"Recorded the response to {key} in {latency:.2f}s")
+        return result
+
+    def _get_chat_model(self) -> BaseChatModel:
+        with self._chat_model_lock:
+            if self._chat_model is None:
+                self._chat_model = self.chat_model_factory(**self.params)
+            return self._chat_model
+
+
+def create_chat_model(
+    chat_model_factory: Callable[..., BaseChatModel],
+    mode: str = None,
+    cassette_path: str = None,
+    latency: str = None,
+    **params: Any
+) -> BaseChatModel:
+    """
+    The chat model built by chat_model_factory(**params) or, unless the cassette mode is off,
+    a CassetteChatModel in front of it. The cassette settings default to the LLM_CASSETTE_*
+    environment variables.
+    """
+    mode = (mode or LLM_CASSETTE_MODE).lower()
+    if mode not in CASSETTE_MODES:
+        raise ValueError(
+            f"Invalid LLM cassette mode {mode}, expected one of {', '.join(CASSETTE_MODES)}")
+    if mode == "off":
+        return chat_model_factory(**params)
+
+    latency = str(latency if latency is not None else LLM_CASSETTE_LATENCY)
+    callbacks = params.pop("callbacks", None)
+    return CassetteChatModel(
+        params=params,
+        chat_model_factory=chat_model_factory,
+        cassette_path=cassette_path or LLM_CASSETTE_PATH,
+        mode=mode,
+        latency=None if latency == "recorded" else float(latency),
+        streaming=params.get("streaming", False),
+        verbose=params.get("verbose", False),
+        callbacks=callbacks
+    )
@@ -0,0 +1,84 @@
+from typing import Any
+
+from langchain.tools import BaseTool
+
+from converso.conversational_engine.form_agent import (FormAgentExecutor,
+                                                       filter_active_tools)
+from converso.conversational_engine.form_agent.form_tool import AgentState
+from converso.conversational_engine.form_agent.form_tool_executor import \
+    FormToolExecutor
+from converso_chatbot.conversational_engine.form_agent.model_factory import \
+    ModelFactory
+from converso_chatbot.conversational_engine.turn_context import \
+    get_turn_context
+from converso_chatbot.tracing import span
+
+
+class TracedFormToolExecutor(FormToolExecutor):
+    """
+    Measures every tool run as a tool span.
+    The tool names are chosen by the LLM: the ones of no tool share the "invalid" target,
+    so that they don't add series to the metrics.
+    """
+
+    def _execute(self, tool_invocation, agent_state: AgentState = None) -> Any:
+        if tool_invocation.tool in self.tool_map:
+            target, attributes = tool_invocation.tool, {}
+        else:
+            target, attributes = "invalid", {
+                "requested_tool": tool_invocation.tool}
+        with span("tool", target, **attributes):
+            return super()._execute(tool_invocation, agent_state)
+
+
+class ChatFormAgentExecutor(FormAgentExecutor):
+    """
+    A FormAgentExecutor whose compiled graph can be shared by all the conversations of the process.
+
+    Tools and tool callbacks are read from the TurnContext of the turn being executed,
+    falling back to the ones given to the constructor when the graph runs outside of a turn.
+    Models are built by the chatbot ModelFactory, which caches LLM clients and agents,
+    and call the answer streamer of the TurnContext.
+    Every node step and tool run is measured as a span.
+    """
+
+    def call_agent(self, state: AgentState):
+        with span("graph_node", "agent"):
+            return super().call_agent(state)
+
+    def call_tool(self, state: AgentState):
+        with span("graph_node", "tool"):
+            return super().call_tool(state)
+
+    def get_tool_executor(self, state: AgentState):
+        return TracedFormToolExecutor(self.get_tools(state))
+
+    def build_model(self, state: AgentState):
+        model = ModelFactory.build_model(
+            state=state,
+            tools=self.get_tools(state)
+        )
+        turn_context = get_turn_context()
+        if turn_context and turn_context.answer_streamer:
+            model = model.with_config(
+                callbacks=[turn_context.answer_streamer])
+        return model
+
+    def get_tools(self, state: AgentState):
+        turn_context = get_turn_context()
+        tools = turn_context.tools if turn_context else self._tools
+        return filter_active_tools(tools[:], state)
+
+    def on_tool_start(self, tool: BaseTool, tool_input: dict):
+        turn_context = get_turn_context()
+        if turn_context and turn_context.tool_callback_handler:
+            turn_context.tool_callback_handler.on_tool_start(tool, tool_input)
+        else:
+            super().on_tool_start(tool, tool_input)
+
+    def on_tool_end(self, tool: BaseTool, tool_output: Any):
+        turn_context = get_turn_context()
+        if turn_context and turn_context.tool_callback_handler:
+            turn_context.tool_callback_handler.on_tool_end(tool, tool_output)
+        else:
+            super().on_tool_end(tool, tool_output)
@@ -0,0 +1,146 @@
+"""
+Selection of the chat history sent to the LLM, within a budget of tokens.
+
+The most recent messages are kept until the budget is reached; the first message that
+doesn't fit is truncated, if enough of the budget is left, and older messages are dropped.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+import tiktoken
+from langchain_core.messages import BaseMessage
+
+from converso_chatbot.conversational_engine.form_agent.model_factory import \
+    LLM_MODEL
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 2000))
+# A message that doesn't fit is truncated only if at least these tokens are left
+MIN_TRUNCATED_MESSAGE_TOKENS = int(
+    os.getenv("MIN_TRUNCATED_MESSAGE_TOKENS", 50))
+# Tokens added by the chat format to every message
+MESSAGE_OVERHEAD_TOKENS = 4
+# Used to estimate the tokens when the tokenizer is not available
+CHARACTERS_PER_TOKEN = 4
+
+TRUNCATION_MARKER = " [...]"
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """
+    The tokenizer of LLM_MODEL. Returns None when it cannot be loaded
+    (tiktoken downloads the encodings the first time they are used).
+    """
+    try:
+        try:
+            return tiktoken.encoding_for_model(LLM_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        logger.warning(
+            "Could not load the tokenizer, tokens will be estimated from the characters", exc_info=True)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARACTERS_PER_TOKEN)
+
+
+def count_message_tokens(message: BaseMessage) -> int:
+    content = message.content
+    if not isinstance(content, str):
+        content = json.dumps(content)
+    return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def truncate_text(text: str, tokens: int) -> str:
+    encoding = get_encoding()
+    if encoding:
+        encoded = encoding.encode(text, disallowed_special=())
+        if len(encoded) <= tokens:
+            return text
+        return encoding.decode(encoded[:tokens]) + TRUNCATION_MARKER
+    if len(text) <= tokens * CHARACTERS_PER_TOKEN:
+        return text
+    return text[:tokens * CHARACTERS_PER_TOKEN] + TRUNCATION_MARKER
+
+
+def select_history(
+    messages: List[BaseMessage],
+    token_counts: List[int],
+    token_budget: int = HISTORY_TOKEN_BUDGET
+) -> Tuple[List[BaseMessage], int]:
+    """
+    Returns the most recent messages that fit in the token budget, and their tokens.
+    token_counts are the tokens of each message, as returned by count_message_tokens.
+    """
+    selected = []
+    used_tokens = 0
+    for message, tokens in zip(reversed(messages), reversed(token_counts)):
+        if used_tokens + tokens <= token_budget:
+            selected.append(message)
+            used_tokens += tokens
+            continue
+
+        available_tokens = token_budget - used_tokens - \
+            MESSAGE_OVERHEAD_TOKENS - count_tokens(TRUNCATION_MARKER)
+        if available_tokens >= MIN_TRUNCATED_MESSAGE_TOKENS and isinstance(message.content, str):
+            truncated = message.copy(update={
+                "content": truncate_text(message.content, available_tokens)
+            })
+            selected.append(truncated)
+            used_tokens += count_message_tokens(truncated)
+        break
+
+    selected.reverse()
+    return selected, used_tokens
+
+
+class HistoryMetrics:
+    """Token budget of the history and tokens of the history, of the prompts and of the completions, per turn"""
+
+    def __init__(self, token_budget: int = HISTORY_TOKEN_BUDGET) -> None:
+        self.token_budget = token_budget
+        self.turns = 0
+        self.last_history_tokens = 0
+        self.total_history_tokens = 0
+        self.last_prompt_tokens = 0
+        self.total_prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.total_completion_tokens = 0
+        self.lock = threading.Lock()
+
+    def record(self, history_tokens: int, prompt_tokens: int, completion_tokens: int = 0) -> None:
+        with self.lock:
+            self.turns += 1
+            self.last_history_tokens = history_tokens
+            self.total_history_tokens += history_tokens
+            self.last_prompt_tokens = prompt_tokens
+            self.total_prompt_tokens += prompt_tokens
+            self.max_prompt_tokens = max(self.max_prompt_tokens, prompt_tokens)
+            self.total_completion_tokens += completion_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            turns = self.turns or 1
+            return {
+                "token_budget": self.token_budget,
+                "turns": self.turns,
+                "last_history_tokens": self.last_history_tokens,
+                "avg_history_tokens": round(self.total_history_tokens / turns, 1),
+                "last_prompt_tokens": self.last_prompt_tokens,
+                "avg_prompt_tokens": round(self.total_prompt_tokens / turns, 1),
+                "max_prompt_tokens": self.max_prompt_tokens,
+                "avg_completion_tokens": round(self.total_completion_tokens / turns, 1)
+            }
@@ -1,23 +1,51 @@
+import json
 import logging
 import os
 import pickle
-from typing import Dict, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import redis
+import redis.asyncio
 from langchain.memory import ConversationBufferWindowMemory
 from langchain.memory.chat_memory import BaseChatMemory
+from langchain.tools import BaseTool
+from langchain_core.messages import BaseMessage, messages_from_dict
 
 from converso_chatbot.constants import RedisKeys
-from converso.conversational_engine.form_agent.form_tool import AgentState, FormTool
+from converso_chatbot.conversational_engine.form_agent.history_window import (
+    HISTORY_TOKEN_BUDGET, count_message_tokens, select_history)
+from converso.conversational_engine.form_agent.form_tool import (AgentState,
+                                                                 FormTool,
+                                                                 FormToolState)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 logger = logging.getLogger(__name__)
 
-HISTORY_LENGTH = os.getenv("HISTORY_LENGTH", 20)
+HISTORY_LENGTH = int(os.getenv("HISTORY_LENGTH", 20))
+
+# Version of the serialized agent state, stored in the payload
+AGENT_STATE_VERSION = 1
+# Payloads bigger than this are compressed, when zstandard is installed
+AGENT_STATE_COMPRESSION_THRESHOLD = int(
+    os.getenv("AGENT_STATE_COMPRESSION_THRESHOLD", 1024))
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_PICKLE_MAGIC = b"\x80"
 
 
 class StoredAgentState:
     memory: Optional[BaseChatMemory]
     active_form_tool: Optional[Union[Dict, FormTool]]
+    # Number of messages of the memory already stored in the chat history list
+    stored_messages_count: int
+    # Tokens of the first messages of the memory, computed once per message
+    token_counts: List[int]
+    # Read with the state to save a round trip to the tools of the turn, never stored by store_agent_state
+    google_credentials: Optional[bytes]
 
     def __init__(
         self,
@@ -37,6 +65,28 @@ class StoredAgentState:
 
         self.memory = memory
         self.active_form_tool = active_form_tool
+        self.stored_messages_count = 0
+        self.token_counts = []
+        self.google_credentials = None
+
+    def message_token_counts(self) -> List[int]:
+        """The tokens of each message of the memory. Only the messages added since the last call are counted."""
+        messages = self.memory.chat_memory.messages
+        for message in messages[len(self.token_counts):]:
+            self.token_counts.append(count_message_tokens(message))
+        return self.token_counts
+
+    def history(
+        self,
+        token_budget: int = HISTORY_TOKEN_BUDGET
+    ) -> Tuple[List[BaseMessage], int]:
+        """The last messages of the memory window that fit in the token budget, and their tokens"""
+        window = len(self.memory.buffer)
+        return select_history(
+            self.memory.chat_memory.messages[-window:] if window else [],
+            self.message_token_counts()[-window:] if window else [],
+            token_budget
+        )
 
     def to_pickle(self):
         if self.active_form_tool:
@@ -53,37 +103,271 @@ class StoredAgentState:
             stored_agent_state.active_form_tool.init_state()
         return stored_agent_state
 
+    def to_bytes(self) -> bytes:
+        """
+        Serializes the last messages of the window and the values of the active form, as versioned JSON.
+        The payload is compressed with zstandard when it is installed and the payload is big enough.
+        """
+        # The window memory keeps every message, but only the last k exchanges are ever read
+        messages = self.memory.chat_memory.messages[-2 * self.memory.k:]
+        payload = {
+            "version": AGENT_STATE_VERSION,
+            "messages": [_message_to_dict(message) for message in messages],
+            "active_form_tool": _form_tool_to_dict(self.active_form_tool)
+        }
+        serialized = json.dumps(
+            payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        if zstandard and len(serialized) > AGENT_STATE_COMPRESSION_THRESHOLD:
+            serialized = zstandard.ZstdCompressor().compress(serialized)
+        return serialized
+
+    @staticmethod
+    def from_bytes(
+        serialized: bytes,
+        tools: List[BaseTool] = []
+    ) -> "StoredAgentState":
+        """
+        Loads a state stored by to_bytes, or by to_pickle for states stored before the versioned format.
+        The active form is restored on the tool with the same name among the given ones (the tools of the turn).
+        """
+        if serialized.startswith(_PICKLE_MAGIC):
+            legacy_agent_state = StoredAgentState.from_pickle(serialized)
+            return StoredAgentState(
+                memory=legacy_agent_state.memory,
+                active_form_tool=_restore_form_tool(
+                    _form_tool_to_dict(legacy_agent_state.active_form_tool),
+                    tools
+                )
+            )
+
+        if serialized.startswith(_ZSTD_MAGIC):
+            if not zstandard:
+                raise ValueError(
+                    "The agent state is compressed, but zstandard is not installed")
+            serialized = zstandard.ZstdDecompressor().decompress(serialized)
+
+        payload = json.loads(serialized)
+        if payload.get("version") != AGENT_STATE_VERSION:
+            raise ValueError(
+                f"Unsupported agent state version: {payload.get('version')}")
+
+        stored_agent_state = StoredAgentState()
+        stored_agent_state.memory.chat_memory.messages = messages_from_dict(
+            payload["messages"])
+        stored_agent_state.active_form_tool = _restore_form_tool(
+            payload["active_form_tool"], tools)
+        return stored_agent_state
+
+
+def _message_to_dict(message: BaseMessage) -> dict:
+    """Like messages_to_dict, without the fields left to their default value"""
+    data = {"content": message.content}
+    if message.additional_kwargs:
+        data["additional_kwargs"] = message.additional_kwargs
+    return {"type": message.type, "data": data}
+
+
+def _dump_message(message: BaseMessage, token_count: int) -> bytes:
+    """Serializes a message of the chat history list with its tokens, compressed like the agent state"""
+    serialized = json.dumps(
+        {**_message_to_dict(message), "token_count": token_count},
+        separators=(",", ":"),
+        ensure_ascii=False
+    ).encode("utf-8")
+    if zstandard and len(serialized) > AGENT_STATE_COMPRESSION_THRESHOLD:
+        serialized = zstandard.ZstdCompressor().compress(serialized)
+    return serialized
+
+
+def _load_messages(serialized_messages: List[bytes]) -> Tuple[List[BaseMessage], List[int]]:
+    """Returns the messages of the chat history list and their stored tokens"""
+    messages = []
+    for serialized in serialized_messages:
+        if serialized.startswith(_ZSTD_MAGIC):
+            if not zstandard:
+                raise ValueError(
+                    "The message is compressed, but zstandard is not installed")
+            serialized = zstandard.ZstdDecompressor().decompress(serialized)
+        messages.append(json.loads(serialized))
+
+    token_counts = [message.get("token_count") for message in messages]
+    messages = messages_from_dict(messages)
+    token_counts = [
+        token_count if token_count is not None else count_message_tokens(message)
+        for message, token_count in zip(messages, token_counts)
+    ]
+    return messages, token_counts
+
+
+def _form_tool_to_dict(form_tool: Optional[FormTool]) -> Optional[dict]:
+    if not form_tool:
+        return None
+
+    form = form_tool.form
+    if isinstance(form, str):
+        form = json.loads(form)
+    elif form is not None:
+        form = form.model_dump(mode="json")
+
+    return {
+        "name": form_tool.name_,
+        "state": form_tool.state.value,
+        "form": form
+    }
+
+
+def _restore_form_tool(
+    form_tool_data: Optional[dict],
+    tools: List[BaseTool]
+) -> Optional[FormTool]:
+    """Puts the form tool of the turn with the stored name in the stored state, with the stored values"""
+    if not form_tool_data:
+        return None
+
+    form_tool = next(
+        (
+            tool for tool in tools
+            if isinstance(tool, FormTool) and tool.name_ == form_tool_data["name"]
+        ),
+        None
+    )
+    if not form_tool:
+        logger.warning(
+            f"Form tool {form_tool_data['name']} is not available, discarding the active form")
+        return None
+
+    if form_tool_data["form"] is not None:
+        form_tool.form = json.dumps(form_tool_data["form"])
+    state_initializer = {
+        FormToolState.INACTIVE.value: form_tool.enter_inactive_state,
+        FormToolState.ACTIVE.value: form_tool.enter_active_state,
+        FormToolState.FILLED.value: form_tool.enter_filled_state
+    }
+    state_initializer[form_tool_data["state"]]()
+    return form_tool
+
+
+def chat_history_key(chat_id: str) -> str:
+    """The redis list with the last messages of the chat"""
+    return f"{chat_id}:{RedisKeys.CHAT_HISTORY.value}"
+
 
 def get_stored_agent_state(
     redis_client: redis.Redis,
-    chat_id: str
+    chat_id: str,
+    tools: List[BaseTool] = []
 ) -> StoredAgentState:
-    stored_agent_state = redis_client.hget(
+    with redis_client.pipeline(transaction=False) as pipeline:
+        _queue_load_commands(pipeline, chat_id)
+        messages, fields = pipeline.execute()
+    return _load_stored_agent_state(messages, *fields, tools)
+
+
+async def aget_stored_agent_state(
+    redis_client: redis.asyncio.Redis,
+    chat_id: str,
+    tools: List[BaseTool] = []
+) -> StoredAgentState:
+    async with redis_client.pipeline(transaction=False) as pipeline:
+        _queue_load_commands(pipeline, chat_id)
+        messages, fields = await pipeline.execute()
+    return _load_stored_agent_state(messages, *fields, tools)
+
+
+def _queue_load_commands(pipeline, chat_id: str):
+    pipeline.lrange(chat_history_key(chat_id), -2 * HISTORY_LENGTH, -1)
+    pipeline.hmget(
         chat_id,
-        RedisKeys.AGENT_STATE.value
+        [
+            RedisKeys.ACTIVE_FORM_TOOL.value,
+            RedisKeys.AGENT_STATE.value,
+            RedisKeys.GOOGLE_CREDENTIALS.value
+        ]
     )
 
-    if stored_agent_state is not None:
-        stored_agent_state: StoredAgentState = StoredAgentState.from_pickle(
-            stored_agent_state)
-        logger.info("Loaded agent state from redis")
-    else:
-        stored_agent_state = StoredAgentState()
+
+def _load_stored_agent_state(
+    messages: List[bytes],
+    active_form_tool: Optional[bytes],
+    legacy_agent_state: Optional[bytes],
+    google_credentials: Optional[bytes],
+    tools: List[BaseTool] = []
+) -> StoredAgentState:
+    if not messages and legacy_agent_state is not None:
+        # Stored before the chat history list: all of its messages are
+        # appended to the list by the next store
+        stored_agent_state = StoredAgentState.from_bytes(
+            legacy_agent_state, tools)
+        stored_agent_state.google_credentials = google_credentials
+        logger.info("Loaded legacy agent state from redis")
+        return stored_agent_state
+
+    stored_agent_state = StoredAgentState()
+    stored_agent_state.google_credentials = google_credentials
+    if messages:
+        stored_agent_state.memory.chat_memory.messages, stored_agent_state.token_counts = _load_messages(
+            messages)
+        stored_agent_state.stored_messages_count = len(messages)
+        logger.info("Loaded chat history from redis")
+    if active_form_tool is not None:
+        stored_agent_state.active_form_tool = _restore_form_tool(
+            json.loads(active_form_tool), tools)
     return stored_agent_state
 
 
 def store_agent_state(
     redis_client: redis.Redis,
     chat_id: str,
-    agent_state: AgentState
+    agent_state: StoredAgentState
 ):
-    stored_agent_state = StoredAgentState(
-        memory=agent_state.memory,
-        active_form_tool=agent_state.active_form_tool
-    )
+    with redis_client.pipeline() as pipeline:
+        _queue_store_commands(pipeline, chat_id, agent_state)
+        pipeline.execute()
+    agent_state.stored_messages_count = len(
+        agent_state.memory.chat_memory.messages)
 
-    redis_client.hset(
-        chat_id,
-        RedisKeys.AGENT_STATE.value,
-        stored_agent_state.to_pickle()
-    )
+
+async def astore_agent_state(
+    redis_client: redis.asyncio.Redis,
+    chat_id: str,
+    agent_state: StoredAgentState
+):
+    async with redis_client.pipeline() as pipeline:
+        _queue_store_commands(pipeline, chat_id, agent_state)
+        await pipeline.execute()
+    agent_state.stored_messages_count = len(
+        agent_state.memory.chat_memory.messages)
+
+
+def _queue_store_commands(
+    pipeline,
+    chat_id: str,
+    agent_state: StoredAgentState
+):
+    """
+    Appends the messages added since the state was loaded to the chat history list and keeps only the memory window.
+    The active form is stored in its own field of the chat hash.
+    """
+    history_key = chat_history_key(chat_id)
+    new_messages = agent_state.memory.chat_memory.messages[
+        agent_state.stored_messages_count:]
+    new_token_counts = agent_state.message_token_counts()[
+        agent_state.stored_messages_count:]
+    if new_messages:
+        pipeline.rpush(history_key, *[
+            _dump_message(message, token_count)
+            for message, token_count in zip(new_messages, new_token_counts)
+        ])
+        pipeline.ltrim(history_key, -2 * HISTORY_LENGTH, -1)
+
+    active_form_tool = _form_tool_to_dict(agent_state.active_form_tool)
+    if active_form_tool:
+        pipeline.hset(
+            chat_id,
+            RedisKeys.ACTIVE_FORM_TOOL.value,
+            json.dumps({"version": AGENT_STATE_VERSION, **active_form_tool})
+        )
+    else:
+        pipeline.hdel(chat_id, RedisKeys.ACTIVE_FORM_TOOL.value)
+    # Migrated to the chat history list
+    pipeline.hdel(chat_id, RedisKeys.AGENT_STATE.value)
@@ -16,11 +16,24 @@ from langchain_core.prompts.prompt import PromptTemplate
 from langchain_openai import ChatOpenAI
 
 from converso.conversational_engine.form_agent.form_tool import AgentState
+from converso_chatbot.helpers import LRUCache
+from converso_chatbot.tracing import get_llm_call_tracer
+
+from .cassette_chat_model import create_chat_model
 
 logger = logging.getLogger(__name__)
 pp = pprint.PrettyPrinter(indent=4)
 
 LLM_MODEL = os.environ.get("LLM_MODEL", "gpt-3.5-turbo-0125")
+# Generate the answers as streams of tokens, so that they are shown while generated. Off by
+# default: streamed responses don't report their token usage, so their cost is not tracked
+STREAM_ANSWERS = os.environ.get("STREAM_ANSWERS", "false").lower() == "true"
+
+# ChatOpenAI clients (and their HTTP connection pools), by model and tool_choice
+LLM_CACHE_SIZE = int(os.environ.get("LLM_CACHE_SIZE", 8))
+# Agents with the tool schemas already serialized, by model, tool_choice,
+# tools and prompt
+AGENT_CACHE_SIZE = int(os.environ.get("AGENT_CACHE_SIZE", 64))
 
 BASE_SYSTEM_MESSAGE_PROMPT = dedent(f"""
     You are a personal assistant trying to help the user. You always answer in English. The current datetime is {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}.
@@ -89,8 +102,38 @@ def ask_for_confirmation_prompt_template(
     ).strip())
 
 
+def _tools_cache_key(tools: List[BaseTool]) -> tuple:
+    """
+    Form tools change name, description and args_schema when their state changes,
+    and a new optional args_schema class is created every time: identify schemas by name.
+    """
+    return tuple(
+        (
+            tool.name,
+            tool.description,
+            tool.args_schema.__module__ if tool.args_schema else None,
+            tool.args_schema.__qualname__ if tool.args_schema else None
+        )
+        for tool in tools
+    )
+
+
+def _prompt_cache_key(prompt: ChatPromptTemplate) -> tuple:
+    """Form prompts are built for every step: identify them by their templates."""
+    key = []
+    for message in prompt.messages:
+        if hasattr(message, "prompt"):
+            key.append((type(message).__name__, message.prompt.template))
+        else:
+            key.append((type(message).__name__, message.variable_name))
+    return tuple(key)
+
+
 class ModelFactory:
 
+    llm_cache = LRUCache(maxsize=LLM_CACHE_SIZE)
+    agent_cache = LRUCache(maxsize=AGENT_CACHE_SIZE)
+
     @staticmethod
     def build_model(
         state: AgentState,
@@ -106,11 +149,21 @@ class ModelFactory:
 
     def build_llm(
         tool_choice: str = None
+    ):
+        return ModelFactory.llm_cache.get_or_create(
+            (LLM_MODEL, tool_choice),
+            lambda: ModelFactory.__create_llm(tool_choice)
+        )
+
+    def __create_llm(
+        tool_choice: str = None
     ):
         params = {
             "model": LLM_MODEL,
             "temperature": 0,
-            "verbose": True
+            "verbose": True,
+            "streaming": STREAM_ANSWERS,
+            "callbacks": [get_llm_call_tracer()]
         }
         if tool_choice:
             params["tool_choice"] = {
@@ -120,7 +173,8 @@ class ModelFactory:
                 }
             }
 
-        return ChatOpenAI(**params)
+        # ChatOpenAI, or its responses recorded in a cassette when LLM_CASSETTE_MODE is set
+        return create_chat_model(ChatOpenAI, **params)
 
     def build_default_model(
         state: AgentState,
@@ -173,8 +227,25 @@ class ModelFactory:
         prompt: ChatPromptTemplate,
         tools: List[BaseTool] = []
     ):
-        return create_openai_tools_agent(
-            ModelFactory.build_llm(state.get("tool_choice")),
-            tools,
-            prompt=prompt
+        tool_choice = state.get("tool_choice")
+        return ModelFactory.agent_cache.get_or_create(
+            (
+                LLM_MODEL,
+                tool_choice,
+                _tools_cache_key(tools),
+                _prompt_cache_key(prompt)
+            ),
+            lambda: create_openai_tools_agent(
+                ModelFactory.build_llm(tool_choice),
+                tools,
+                prompt=prompt
+            )
         )
+
+    @staticmethod
+    def cache_stats() -> dict:
+        """Stats of the LLM and agent caches, served by the /models/stats route"""
+        return {
+            "llm": ModelFactory.llm_cache.stats(),
+            "agent": ModelFactory.agent_cache.stats()
+        }
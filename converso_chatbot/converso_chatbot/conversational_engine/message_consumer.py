@@ -1,54 +1,143 @@
 
+import asyncio
 import json
 import logging
+import os
 import pprint
-from textwrap import dedent
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional
+from uuid import uuid4
 
 from fastapi.responses import JSONResponse
+from langchain.tools import BaseTool
+from langchain_community.callbacks import get_openai_callback
 
-from converso_chatbot.clients import (RabbitMQProducer, get_rabbitmq_producer,
-                              get_redis_client)
+from converso_chatbot.clients import (RabbitMQProducer, get_async_redis_client,
+                                      get_rabbitmq_producer)
 from converso_chatbot.clients.rabbitmq import RabbitMQProducer
 from converso_chatbot.constants import MessageQueues, MessageType
 from converso_chatbot.constants.message_queues import MessageQueues
 from converso_chatbot.constants.message_type import MessageType
 from converso.conversational_engine.form_agent import (FormAgentExecutor,
                                                        FormTool)
-from converso_chatbot.conversational_engine.form_agent import get_stored_agent_state, store_agent_state
+from converso_chatbot.conversational_engine.answer_streamer import \
+    AnswerStreamer
+from converso_chatbot.conversational_engine.form_agent import (
+    ChatFormAgentExecutor, HistoryMetrics, aget_stored_agent_state,
+    astore_agent_state)
+from converso_chatbot.conversational_engine.form_agent.model_factory import \
+    STREAM_ANSWERS
 from converso_chatbot.conversational_engine.tool_callback_handler import \
     ToolCallbackHandler
 from converso_chatbot.conversational_engine.tools import *
+from converso_chatbot.conversational_engine.turn_context import (
+    TurnContext, use_turn_context)
 from converso_chatbot.models.chat_payload import ChatPayload
+from converso_chatbot.tracing import span, use_trace_attributes
 
 pp = pprint.PrettyPrinter(indent=4)
 
 logger = logging.getLogger(__name__)
 
+# Threads running the (synchronous) graph nodes. Bounds the number of LLM
+# turns and tool calls executing at the same time in this process.
+AGENT_EXECUTOR_MAX_WORKERS = int(os.getenv("AGENT_EXECUTOR_MAX_WORKERS", 16))
+agent_executor = ThreadPoolExecutor(
+    max_workers=AGENT_EXECUTOR_MAX_WORKERS,
+    thread_name_prefix="agent"
+)
+
+# Publishes every message of a turn: the TEXT_DELTA and TOOL_START/TOOL_END messages from the
+# callbacks, which run in the agent threads, and then the answer. Publishes are confirmed, so
+# the messages of a turn reach converso_out in the order they are published
 rabbitmq_producer = get_rabbitmq_producer()
-redis_client = get_redis_client()
-
+redis_client = get_async_redis_client()
+history_metrics = HistoryMetrics()
+
+
+async def astream_graph(
+    app: Any,
+    inputs: dict,
+    config: dict
+) -> AsyncIterator[dict]:
+    """
+    Streams the outputs of a compiled graph without blocking the event loop.
+    Uses the graph async API when available, otherwise iterates the synchronous stream in agent_executor.
+    """
+    if hasattr(app, "astream"):
+        async for output in app.astream(inputs, config=config):
+            yield output
+        return
+
+    loop = asyncio.get_running_loop()
+    stream = app.stream(inputs, config=config)
+    context = copy_context()
+    sentinel = object()
+    while True:
+        output = await loop.run_in_executor(
+            agent_executor, context.run, next, stream, sentinel)
+        if output is sentinel:
+            break
+        yield output
+
+
+@lru_cache(maxsize=1)
+def get_agent_executor() -> ChatFormAgentExecutor:
+    """The compiled graph, built once per process. Tools are provided by the TurnContext."""
+    return ChatFormAgentExecutor()
+
+
+@lru_cache(maxsize=1)
+def get_stateless_tools() -> Dict[str, BaseTool]:
+    """Tools that don't depend on the chat, shared by all the turns of the process"""
+    return {
+        "google_search": GoogleSearch(),
+        "python_code_interpreter": PythonCodeInterpreter()
+    }
 
-async def process_message(data: dict) -> None:
 
-    data: ChatPayload = ChatPayload.model_validate(data)
-
-    chat_id = data.chat_id
-    tools = [
-        GoogleSearch(),
+def build_turn_tools(chat_id: str) -> List[BaseTool]:
+    """
+    Returns the tools for a turn of the given chat.
+    Form tools are stateful, so they are built for every turn.
+    """
+    stateless_tools = get_stateless_tools()
+    return [
+        stateless_tools["google_search"],
         GoogleCalendarCreator(chat_id=chat_id),
         GoogleCalendarRetriever(chat_id=chat_id),
         GmailRetriever(chat_id=chat_id),
         GmailSender(chat_id=chat_id),
         OnlinePurchase(),
-        PythonCodeInterpreter()
+        stateless_tools["python_code_interpreter"]
     ]
 
-    stored_agent_state = get_stored_agent_state(redis_client, data.chat_id)
+
+async def process_message(data: dict) -> None:
+
+    data: ChatPayload = ChatPayload.model_validate(data)
+
+    chat_id = data.chat_id
+    turn_id = uuid4().hex
+    with use_trace_attributes(chat_id=chat_id, turn_id=turn_id), span("turn"):
+        await _process_turn(data, turn_id)
+
+
+async def _process_turn(data: ChatPayload, turn_id: str) -> None:
+    chat_id = data.chat_id
+    tools = build_turn_tools(chat_id)
+
+    with span("state_load"):
+        stored_agent_state = await aget_stored_agent_state(
+            redis_client, data.chat_id, tools)
+
+    chat_history, history_tokens = stored_agent_state.history()
 
     inputs = {
         "input": data.content,
-        "chat_history": [*stored_agent_state.memory.buffer],
+        "chat_history": chat_history,
         "intermediate_steps": [],
         "active_form_tool": stored_agent_state.active_form_tool
     }
@@ -60,21 +149,40 @@ async def process_message(data: dict) -> None:
         queue=MessageQueues.converso_OUT.value
     )
 
-    graph = FormAgentExecutor(
-        tools=tools,
-        on_tool_start=tool_callback_handler.on_tool_start,
-        on_tool_end=tool_callback_handler.on_tool_end
-    )
+    answer_streamer = AnswerStreamer(
+        chat_id=chat_id,
+        rabbitmq_producer=rabbitmq_producer,
+        queue=MessageQueues.converso_OUT.value
+    ) if STREAM_ANSWERS else None
+
+    graph = get_agent_executor()
 
-    logger.info(dedent(f"""
-        ---
-        Executing graph with inputs: {inputs}"
-        ---
-    """))
+    # The inputs are only formatted when debug logging is enabled
+    logger.info("Executing graph for chat %s, turn %s", chat_id, turn_id)
+    logger.debug("Graph inputs: %s", inputs)
 
-    for output in graph.app.stream(inputs, config={"recursion_limit": 25}):
-        for key, value in output.items():
-            pass
+    with get_openai_callback() as openai_callback, use_turn_context(TurnContext(
+        chat_id=chat_id,
+        tools=tools,
+        tool_callback_handler=tool_callback_handler,
+        google_credentials=stored_agent_state.google_credentials,
+        answer_streamer=answer_streamer
+    )):
+        async for output in astream_graph(graph.app, inputs, config={"recursion_limit": 25}):
+            for key, value in output.items():
+                pass
+
+    # Streamed responses don't report the token usage (nor the cost, which is not tracked)
+    prompt_tokens = openai_callback.prompt_tokens
+    completion_tokens = openai_callback.completion_tokens
+    if not prompt_tokens and answer_streamer:
+        prompt_tokens = answer_streamer.prompt_tokens
+        completion_tokens = answer_streamer.completion_tokens
+    history_metrics.record(
+        history_tokens=history_tokens,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens
+    )
 
     answer = graph.parse_output(output)
 
@@ -85,20 +193,37 @@ async def process_message(data: dict) -> None:
     )
     stored_agent_state.active_form_tool = value["active_form_tool"]
 
-    store_agent_state(redis_client, data.chat_id, stored_agent_state)
-    publish_answer(rabbitmq_producer, data.chat_id, answer)
+    with span("state_store"):
+        await astore_agent_state(redis_client, data.chat_id, stored_agent_state)
+    await publish_answer(
+        rabbitmq_producer,
+        data.chat_id,
+        answer,
+        stream_ids=answer_streamer.stream_ids if answer_streamer else None
+    )
 
 
-def publish_answer(
+async def publish_answer(
         rabbitmq_client: RabbitMQProducer,
         chat_id: str,
-        answer: str):
-    rabbitmq_client.publish(
-        queue=MessageQueues.converso_OUT.value,
-        message=json.dumps({
-            "type": MessageType.TEXT.value,
-            "chat_id": chat_id,
-            "content": answer
-        })
+        answer: str,
+        stream_ids: Optional[List[str]] = None):
+    """
+    Publishes the final answer of the turn.
+    stream_ids are the TEXT_DELTA streams published during the turn, which the answer completes.
+    """
+    message = json.dumps({
+        "type": MessageType.TEXT.value,
+        "chat_id": chat_id,
+        "content": answer,
+        "stream_ids": stream_ids or []
+    })
+    # Through the producer of the TEXT_DELTA and tool messages, to be delivered after them
+    await asyncio.get_running_loop().run_in_executor(
+        agent_executor,
+        lambda: rabbitmq_client.publish(
+            queue=MessageQueues.converso_OUT.value,
+            message=message
+        )
     )
     logger.info("Published answer to RabbitMQ")
@@ -1,13 +1,12 @@
-import pickle
 import textwrap
 from datetime import datetime
 from typing import Dict, Optional, Type, Union
 
 from pydantic import BaseModel
 
-from converso_chatbot.clients import (CreateCalendarEventPayload, GoogleClient,
-                              get_redis_client)
-from converso_chatbot.constants.redis_keys import RedisKeys
+from converso_chatbot.clients import CreateCalendarEventPayload, GoogleClient
+from converso_chatbot.conversational_engine.tools.google.credentials import \
+    get_google_credentials
 from converso.conversational_engine.form_agent import FormTool, FormToolState
 
 
@@ -27,11 +26,8 @@ class GoogleCalendarCreator(FormTool):
         end: datetime
     ) -> str:
         """Use the tool."""
-        credentials = get_redis_client().hget(
-            self.chat_id,
-            RedisKeys.GOOGLE_CREDENTIALS.value
-        )
-        google_client = GoogleClient(pickle.loads(credentials))
+        credentials = get_google_credentials(self.chat_id)
+        google_client = GoogleClient(credentials)
         payload = CreateCalendarEventPayload(
             summary=summary,
             description=description,
@@ -0,0 +1,111 @@
+"""
+Google credentials of the chats, deserialized once and cached for GOOGLE_CREDENTIALS_CACHE_TTL seconds.
+
+Reusing the same Credentials object also reuses its access token, refreshed at most once per expiry,
+and the API service objects built for it (see converso_chatbot.clients.google.get_service).
+The cache is per process: credentials changed by another replica are seen once the cached entry
+expires, or as soon as a turn prefetches them with the agent state.
+"""
+
+import logging
+import os
+import pickle
+import threading
+import time
+
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+
+from converso_chatbot.clients import get_redis_client
+from converso_chatbot.constants import RedisKeys
+from converso_chatbot.conversational_engine.turn_context import \
+    get_turn_context
+from converso_chatbot.helpers import LRUCache
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CREDENTIALS_CACHE_TTL = int(
+    os.environ.get("GOOGLE_CREDENTIALS_CACHE_TTL", 300))
+GOOGLE_CREDENTIALS_CACHE_SIZE = int(
+    os.environ.get("GOOGLE_CREDENTIALS_CACHE_SIZE", 1024))
+
+
+class _CachedCredentials:
+
+    def __init__(self, serialized: bytes, credentials: Credentials) -> None:
+        self.serialized = serialized
+        self.credentials = credentials
+        self.expires_at = time.monotonic() + GOOGLE_CREDENTIALS_CACHE_TTL
+        # Only one thread refreshes the access token of a chat
+        self.refresh_lock = threading.Lock()
+
+
+credentials_cache = LRUCache(maxsize=GOOGLE_CREDENTIALS_CACHE_SIZE)
+
+
+def get_google_credentials(chat_id: str) -> Credentials:
+    """
+    Returns the Google credentials of the chat, with a valid access token.
+    The serialized credentials are taken from the TurnContext when they were prefetched with the agent state,
+    otherwise from redis. A cached entry is used only if it is not expired and matches the prefetched credentials.
+    """
+    turn_context = get_turn_context()
+    prefetched = None
+    if turn_context and turn_context.chat_id == chat_id:
+        prefetched = turn_context.google_credentials
+
+    cached: _CachedCredentials = credentials_cache.get(chat_id)
+    if not cached or time.monotonic() >= cached.expires_at or \
+            (prefetched and prefetched != cached.serialized):
+        serialized = prefetched or get_redis_client().hget(
+            chat_id,
+            RedisKeys.GOOGLE_CREDENTIALS.value
+        )
+        if not serialized:
+            raise ValueError(
+                "No Google credentials found. User must login first.")
+        cached = _CachedCredentials(serialized, pickle.loads(serialized))
+        credentials_cache.set(chat_id, cached)
+
+    return _refresh_if_expired(chat_id, cached)
+
+
+def invalidate_google_credentials(chat_id: str) -> None:
+    """
+    To be called when the credentials of the chat are changed. Only the cache of this process is
+    cleared: the other replicas keep using their cached credentials until they expire, after
+    GOOGLE_CREDENTIALS_CACHE_TTL seconds, unless the credentials prefetched with the agent state
+    of a turn differ from them.
+    """
+    credentials_cache.pop(chat_id)
+
+
+def _refresh_if_expired(chat_id: str, cached: _CachedCredentials) -> Credentials:
+    """
+    Refreshes the access token once it is expired, and stores the refreshed credentials,
+    so that the other workers don't need to refresh them again.
+    """
+    credentials = cached.credentials
+    if credentials.valid or not credentials.refresh_token:
+        return credentials
+
+    with cached.refresh_lock:
+        if not credentials.valid:
+            try:
+                credentials.refresh(Request())
+            except RefreshError as e:
+                invalidate_google_credentials(chat_id)
+                raise ValueError(
+                    "Google credentials expired or revoked. User must login again.") from e
+
+            serialized = pickle.dumps(credentials)
+            get_redis_client().hset(
+                chat_id,
+                RedisKeys.GOOGLE_CREDENTIALS.value,
+                serialized
+            )
+            cached.serialized = serialized
+            logger.info(f"Refreshed Google credentials of chat {chat_id}")
+
+    return credentials
@@ -1,12 +1,11 @@
-import pickle
 import textwrap
 from typing import Dict, Optional, Type, Union
 
 from pydantic import BaseModel
 
-from converso_chatbot.clients import GoogleClient, SendEmailPayload, get_redis_client
-from converso_chatbot.constants import RedisKeys
-from converso_chatbot.constants.redis_keys import RedisKeys
+from converso_chatbot.clients import GoogleClient, SendEmailPayload
+from converso_chatbot.conversational_engine.tools.google.credentials import \
+    get_google_credentials
 from converso.conversational_engine.form_agent import FormTool, FormToolState
 
 
@@ -26,14 +25,7 @@ class GmailSender(FormTool):
     ) -> str:
         """Use the tool."""
 
-        credentials = get_redis_client().hget(
-            self.chat_id,
-            RedisKeys.GOOGLE_CREDENTIALS.value
-        )
-        if not credentials:
-            raise ValueError(
-                "No Google credentials found. User must login first.")
-        credentials = pickle.loads(credentials)
+        credentials = get_google_credentials(self.chat_id)
 
         google_client = GoogleClient(credentials)
         payload = SendEmailPayload(
@@ -4,6 +4,9 @@ from langchain.tools.base import BaseTool
 from langchain_core.callbacks import CallbackManagerForToolRun
 from pydantic import BaseModel, Field
 
+from converso_chatbot.conversational_engine.tools.python_sandbox import \
+    get_sandbox_pool
+
 
 class PythonInput(BaseModel):
     code: str = Field(
@@ -30,15 +33,8 @@ class PythonCodeInterpreter(BaseTool):
         run_manager: Optional[CallbackManagerForToolRun] = None
     ) -> str:
 
-        local_vars = {}
-        exec(code, {}, local_vars)
-        result_value = local_vars.get('result')
-
-        if not result_value:
-            raise ValueError(
-                "The last operation of the code provided must store the output of the code in a variable called result.")
-
-        return str(result_value)
+        # The code runs in a sandboxed worker process, limited in time and memory
+        return get_sandbox_pool().run(code)
 
     def get_tool_start_message(self, input: dict) -> str:
         payload = PythonInput(**input)
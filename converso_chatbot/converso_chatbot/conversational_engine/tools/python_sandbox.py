@@ -0,0 +1,284 @@
+"""
+Pool of sandboxed worker processes running the code of the PythonCodeInterpreter.
+
+Workers are started ahead of the calls, with the common modules already imported, and
+each runs one call at a time. Every call is limited in CPU time (RLIMIT_CPU), wall-clock
+time and memory (RLIMIT_AS: Linux doesn't enforce RLIMIT_RSS), so that a `while True`
+or a huge allocation only costs a worker, which is replaced.
+
+Workers run without the environment of the chatbot, in the temporary directory. When the
+chatbot runs as root, the workers also run as the unprivileged SANDBOX_UID and SANDBOX_GID,
+without supplementary groups: they cannot read the files of the chatbot nor its
+/proc/<pid>/environ, where its API keys are, nor signal or ptrace it. Otherwise they keep the
+uid of the chatbot, and can do all of that. There are no mount or pid namespaces, nor seccomp
+filters.
+
+The code can write to the pipe of the replies: the pool reads them without blocking, up to
+the deadline of the call, and replaces the workers sending anything else than one reply with
+the id of the request.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import select
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from functools import lru_cache
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+SANDBOX_WORKERS = int(os.environ.get("SANDBOX_WORKERS", 2))
+# Seconds of CPU time (rounded up to the second) and of wall-clock time of a call
+SANDBOX_CPU_TIME = float(os.environ.get("SANDBOX_CPU_TIME", 5))
+SANDBOX_TIMEOUT = float(os.environ.get("SANDBOX_TIMEOUT", 10))
+SANDBOX_MEMORY_LIMIT_MB = int(os.environ.get("SANDBOX_MEMORY_LIMIT_MB", 256))
+# Workers are replaced after these calls, since the code can change the state of the imported modules
+SANDBOX_MAX_CALLS_PER_WORKER = int(
+    os.environ.get("SANDBOX_MAX_CALLS_PER_WORKER", 100))
+SANDBOX_MAX_RESULT_LENGTH = int(
+    os.environ.get("SANDBOX_MAX_RESULT_LENGTH", 10000))
+# User and group of the workers, when the chatbot runs as root (nobody by default)
+SANDBOX_UID = int(os.environ.get("SANDBOX_UID", 65534))
+SANDBOX_GID = int(os.environ.get("SANDBOX_GID", 65534))
+# Interpreter of the workers: by default the one of the chatbot, if the workers can execute it
+SANDBOX_PYTHON = os.environ.get("SANDBOX_PYTHON")
+SANDBOX_PRELOADED_MODULES = os.environ.get(
+    "SANDBOX_PRELOADED_MODULES",
+    "math,cmath,datetime,time,calendar,statistics,random,decimal,fractions,itertools,functools,collections,re,json,string"
+).split(",")
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(
+    __file__), "python_sandbox_worker.py")
+# The workers may not be allowed to read the script, so they get its source
+with open(WORKER_SCRIPT, encoding="utf-8") as _worker_script:
+    WORKER_SOURCE = _worker_script.read()
+
+MISSING_RESULT_MESSAGE = "The last operation of the code provided must store the output of the code in a variable called result."
+
+
+def _drops_privileges() -> bool:
+    return os.geteuid() == 0
+
+
+def _executable_by_others(path: str) -> bool:
+    """Whether a user other than the owner can execute the file, at the end of its path"""
+    path = os.path.realpath(path)
+    parts = [path]
+    while os.path.dirname(parts[-1]) != parts[-1]:
+        parts.append(os.path.dirname(parts[-1]))
+    try:
+        return all(os.stat(part).st_mode & stat.S_IXOTH for part in parts)
+    except OSError:
+        return False
+
+
+def _sandbox_python() -> str:
+    """
+    SANDBOX_PYTHON, or the interpreter of the chatbot. When the workers drop privileges and
+    cannot execute it (e.g. a virtualenv in the home of root), the system python3 is used:
+    the worker only needs the standard library.
+    """
+    if SANDBOX_PYTHON:
+        return SANDBOX_PYTHON
+    if not _drops_privileges() or _executable_by_others(sys.executable):
+        return sys.executable
+    version = f"python{sys.version_info.major}.{sys.version_info.minor}"
+    for name in (version, "python3"):
+        python = shutil.which(name, path="/usr/local/bin:/usr/bin:/bin")
+        if python and _executable_by_others(python):
+            return python
+    raise RuntimeError(
+        f"The sandbox workers cannot execute {sys.executable} as uid {SANDBOX_UID}: set SANDBOX_PYTHON")
+
+
+class _SandboxWorker:
+
+    def __init__(self, python: str, memory_limit_mb: int, preloaded_modules: List[str]) -> None:
+        self.calls = 0
+        # Bytes read from the worker, not yet returned
+        self.buffer = bytearray()
+        privileges = {
+            "user": SANDBOX_UID,
+            "group": SANDBOX_GID,
+            "extra_groups": []
+        } if _drops_privileges() else {}
+        self.process = subprocess.Popen(
+            [python, "-I", "-c", WORKER_SOURCE],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=tempfile.gettempdir(),
+            env={
+                "PATH": os.environ.get("PATH", ""),
+                "LANG": "C.UTF-8",
+                "SANDBOX_PRELOADED_MODULES": ",".join(preloaded_modules),
+                "SANDBOX_MEMORY_LIMIT": str(memory_limit_mb * 1024 * 1024),
+                "SANDBOX_MAX_RESULT_LENGTH": str(SANDBOX_MAX_RESULT_LENGTH)
+            },
+            **privileges
+        )
+        os.set_blocking(self.process.stdout.fileno(), False)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def call(self, code: str, cpu_time: float, timeout: float) -> Optional[dict]:
+        """Returns the reply of the worker, or None if the worker died, timed out or sent something else"""
+        self.calls += 1
+        try:
+            self.process.stdin.write(
+                (json.dumps({"id": self.calls, "code": code, "cpu_time": cpu_time}) + "\n").encode("utf-8"))
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            return None
+
+        line = self._read_line(time.monotonic() + timeout)
+        if line is None:
+            return None
+        try:
+            reply = json.loads(line)
+        except ValueError:
+            return None
+        # Lines written by the code don't answer the request
+        if not isinstance(reply, dict) or reply.get("id") != self.calls:
+            return None
+        return reply
+
+    def _read_line(self, deadline: float) -> Optional[bytes]:
+        """
+        Reads the reply line until the deadline, None if the worker exited or missed it.
+        The code may have written part of a line and gone to sleep, so the pipe is never read
+        with a blocking call.
+        """
+        fd = self.process.stdout.fileno()
+        while b"\n" not in self.buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            readable, _, _ = select.select([fd], [], [], remaining)
+            if not readable:
+                continue
+            try:
+                chunk = os.read(fd, 65536)
+            except BlockingIOError:
+                continue
+            if not chunk:
+                return None
+            self.buffer += chunk
+        line, _, rest = bytes(self.buffer).partition(b"\n")
+        if rest:
+            return None
+        self.buffer.clear()
+        return line
+
+    def close(self) -> None:
+        if self.alive:
+            self.process.kill()
+        self.process.wait()
+        self.process.stdin.close()
+        self.process.stdout.close()
+
+
+class SandboxPool:
+    """
+    Runs code in a pool of _SandboxWorker processes, one call per worker at a time.
+    Calls wait for a free worker when all of them are busy.
+    """
+
+    def __init__(
+        self,
+        workers: int = SANDBOX_WORKERS,
+        cpu_time: float = SANDBOX_CPU_TIME,
+        timeout: float = SANDBOX_TIMEOUT,
+        memory_limit_mb: int = SANDBOX_MEMORY_LIMIT_MB,
+        max_calls_per_worker: int = SANDBOX_MAX_CALLS_PER_WORKER,
+        preloaded_modules: List[str] = SANDBOX_PRELOADED_MODULES
+    ) -> None:
+        self.cpu_time = cpu_time
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_calls_per_worker = max_calls_per_worker
+        self.preloaded_modules = preloaded_modules
+        self.python = _sandbox_python()
+        if not _drops_privileges():
+            logger.warning(
+                "The chatbot does not run as root: the sandbox workers keep its uid, "
+                "and can read its files and environment")
+        self.idle_workers: queue.Queue = queue.Queue()
+        self.replaced_workers = 0
+        self.closed = False
+        self.lock = threading.Lock()
+        for _ in range(workers):
+            self.idle_workers.put(self._start_worker())
+
+    def run(self, code: str) -> str:
+        """
+        Runs the code and returns the value of its `result` variable, as a string.
+        Raises ValueError when the code fails, exceeds the limits or doesn't set `result`.
+        """
+        worker: _SandboxWorker = self.idle_workers.get()
+        start = time.monotonic()
+        reply = None
+        try:
+            reply = worker.call(code, self.cpu_time, self.timeout)
+        finally:
+            self._release(worker, healthy=reply is not None and not reply.get("retire"))
+
+        if reply is None:
+            elapsed = time.monotonic() - start
+            if elapsed >= self.timeout:
+                raise ValueError(
+                    f"The code did not complete within {self.timeout:g} seconds.")
+            raise ValueError(
+                "The code was terminated before returning a result, exceeding the CPU time or memory limits.")
+        if "error" in reply:
+            raise ValueError(f"The code raised an error: {reply['error']}")
+        if reply.get("missing_result"):
+            raise ValueError(MISSING_RESULT_MESSAGE)
+        return reply["result"]
+
+    def close(self) -> None:
+        with self.lock:
+            self.closed = True
+        while True:
+            try:
+                self.idle_workers.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _start_worker(self) -> _SandboxWorker:
+        return _SandboxWorker(self.python, self.memory_limit_mb, self.preloaded_modules)
+
+    def _release(self, worker: _SandboxWorker, healthy: bool) -> None:
+        with self.lock:
+            if self.closed:
+                worker.close()
+                return
+            if healthy and worker.alive and worker.calls < self.max_calls_per_worker:
+                self.idle_workers.put(worker)
+                return
+            self.replaced_workers += 1
+
+        if not healthy:
+            logger.warning("Replacing a sandbox worker that exceeded its limits")
+        worker.close()
+        # The replacement starts importing the preloaded modules right away
+        self.idle_workers.put(self._start_worker())
+
+
+@lru_cache(maxsize=1)
+def get_sandbox_pool() -> SandboxPool:
+    """The sandbox pool of the process, started at the first call"""
+    pool = SandboxPool()
+    atexit.register(pool.close)
+    return pool
@@ -0,0 +1,85 @@
+"""
+Worker process of the PythonCodeInterpreter sandbox (see python_sandbox.py).
+
+Runs as a standalone script, without importing the chatbot: reads one JSON request per line
+from stdin ({"id": ..., "code": ..., "cpu_time": ...}) and writes one JSON reply per line to
+stdout ({"result": ...}, {"missing_result": true} or {"error": ...}, with the id of the request).
+Exits when stdin is closed.
+"""
+
+import importlib
+import io
+import json
+import math
+import os
+import resource
+import signal
+import sys
+
+
+class CpuTimeExceeded(Exception):
+    pass
+
+
+def _on_cpu_time_exceeded(signum, frame):
+    raise CpuTimeExceeded()
+
+
+def _set_cpu_time_limit(seconds: float) -> None:
+    """Limits the CPU time of the next call: the soft limit is cumulative over the life of the process"""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = math.ceil(usage.ru_utime + usage.ru_stime + seconds)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _run(code: str, max_result_length: int) -> dict:
+    local_vars = {}
+    exec(code, {}, local_vars)
+    result_value = local_vars.get('result')
+    if not result_value:
+        return {"missing_result": True}
+    return {"result": str(result_value)[:max_result_length]}
+
+
+def main() -> None:
+    preloaded_modules = [name for name in os.environ.get(
+        "SANDBOX_PRELOADED_MODULES", "").split(",") if name]
+    memory_limit = int(os.environ["SANDBOX_MEMORY_LIMIT"])
+    max_result_length = int(os.environ["SANDBOX_MAX_RESULT_LENGTH"])
+
+    # Requests and replies go through private copies of stdin and stdout:
+    # the code reads nothing from stdin, and what it prints is discarded
+    requests = os.fdopen(os.dup(sys.stdin.fileno()), "r")
+    replies = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(os.open(os.devnull, os.O_RDONLY), sys.stdin.fileno())
+    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+    for name in preloaded_modules:
+        importlib.import_module(name)
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    signal.signal(signal.SIGXCPU, _on_cpu_time_exceeded)
+
+    for line in requests:
+        request = json.loads(line)
+        _set_cpu_time_limit(request["cpu_time"])
+        sys.stdout = io.StringIO()
+        try:
+            reply = _run(request["code"], max_result_length)
+        except CpuTimeExceeded:
+            reply = {"error": "CPU time limit exceeded", "retire": True}
+        except MemoryError:
+            reply = {"error": "Memory limit exceeded", "retire": True}
+        except BaseException as e:
+            reply = {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            sys.stdout = sys.__stdout__
+        reply["id"] = request["id"]
+        replies.write(json.dumps(reply) + "\n")
+        replies.flush()
+
+
+if __name__ == "__main__":
+    main()
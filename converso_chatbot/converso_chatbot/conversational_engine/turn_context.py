@@ -0,0 +1,50 @@
+"""
+Per-turn values (chat id, tools, callbacks) for the graph and the tools shared by the whole process.
+
+The context is stored in a ContextVar: it is copied into the threads that run the graph nodes,
+and concurrent turns don't see each other's values.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, List, Optional
+
+from langchain.tools import BaseTool
+
+
+class TurnContext:
+
+    def __init__(
+        self,
+        chat_id: str,
+        tools: List[BaseTool],
+        tool_callback_handler: Optional[Any] = None,
+        google_credentials: Optional[bytes] = None,
+        answer_streamer: Optional[Any] = None
+    ) -> None:
+        self.chat_id = chat_id
+        self.tools = tools
+        self.tool_callback_handler = tool_callback_handler
+        # Prefetched with the agent state, so that the tools don't read them from redis
+        self.google_credentials = google_credentials
+        # Callback handler of the LLM calls, publishing the answers while they are generated
+        self.answer_streamer = answer_streamer
+
+
+current_turn_context: ContextVar[Optional[TurnContext]] = ContextVar(
+    "current_turn_context", default=None)
+
+
+def get_turn_context() -> Optional[TurnContext]:
+    """Returns the context of the turn being executed, if any"""
+    return current_turn_context.get()
+
+
+@contextmanager
+def use_turn_context(context: TurnContext):
+    """Sets the context of the current turn for the duration of the block"""
+    token = current_turn_context.set(context)
+    try:
+        yield context
+    finally:
+        current_turn_context.reset(token)
@@ -1,8 +1,12 @@
-from collections import defaultdict
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Hashable, Union
 
-from bs4 import BeautifulSoup
 from langgraph.graph.state import StateGraph
-#from readability import Document
+from lxml import etree
 
 
 class StateGraphDrawer:
@@ -171,13 +175,208 @@ class StateGraphDrawer:
         graph.get_node("__end__").attr.update(fillcolor='orange')
 
 
+class LRUCache:
+    """
+    A thread-safe, bounded cache that evicts the least recently used entries
+    and counts hits and misses.
+
+    Usage:
+        cache = LRUCache(maxsize=32)
+        value = cache.get_or_create(key, lambda: build_value())
+    """
+
+    _MISSING = object()
+
+    def __init__(self, maxsize: int = 128):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._entries.get(key, self._MISSING)
+            if value is self._MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Returns the cached value for key, creating it with factory on a miss.
+        factory runs outside of the lock, so concurrent misses may build the value more than once.
+        """
+        value = self.get(key, self._MISSING)
+        if value is self._MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            return self._entries.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+# Bytes of HTML parsed at most: the rest of the page is ignored
+HTML_MAX_SIZE = int(os.environ.get("HTML_MAX_SIZE", 2_000_000))
+# Characters of text extracted at most, about 2000 tokens
+HTML_MAX_TEXT_LENGTH = int(os.environ.get("HTML_MAX_TEXT_LENGTH", 8000))
+HTML_CACHE_SIZE = int(os.environ.get("HTML_CACHE_SIZE", 256))
+# The text of the main/article elements is preferred to the text of the page when it is at
+# least this long, or this share of the page (and not, e.g., the teaser of another article)
+HTML_MIN_MAIN_TEXT_LENGTH = int(os.environ.get("HTML_MIN_MAIN_TEXT_LENGTH", 500))
+HTML_MIN_MAIN_TEXT_SHARE = float(os.environ.get("HTML_MIN_MAIN_TEXT_SHARE", 0.25))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class _TextCollector:
+    """
+    lxml parser target collecting the text of a page in a single pass, without building the tree.
+    Boilerplate elements (scripts, navigation, forms...) are skipped; the text inside main/article
+    elements is collected separately, and preferred when it is long enough.
+    """
+
+    SKIPPED_TAGS = {
+        "script", "style", "noscript", "template", "svg", "canvas", "iframe", "object",
+        "head", "nav", "header", "footer", "aside", "form", "button", "select", "menu"
+    }
+    BLOCK_TAGS = {
+        "address", "article", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption",
+        "h1", "h2", "h3", "h4", "h5", "h6", "hr", "li", "main", "ol", "p", "pre",
+        "section", "table", "td", "th", "tr", "ul"
+    }
+    MAIN_TAGS = {"main", "article"}
+
+    def __init__(self, max_length: int) -> None:
+        self.max_length = max_length
+        self.skipped_depth = 0
+        self.depth = 0
+        # Depths of the open elements that opened a main region
+        self.main_stack = []
+        self.line = []
+        self.lines = []
+        self.main_lines = []
+        self.length = 0
+        self.main_length = 0
+
+    @property
+    def done(self) -> bool:
+        """Enough text was collected: the rest of the page doesn't need to be parsed"""
+        return self.main_length >= self.max_length or self.length >= 4 * self.max_length
+
+    def start(self, tag, attrib):
+        self.depth += 1
+        if tag in self.BLOCK_TAGS:
+            self._flush()
+        if tag in self.SKIPPED_TAGS:
+            self.skipped_depth += 1
+        elif tag in self.MAIN_TAGS or attrib.get("role") == "main":
+            self.main_stack.append(self.depth)
+
+    def end(self, tag):
+        if tag in self.BLOCK_TAGS:
+            self._flush()
+        if tag in self.SKIPPED_TAGS:
+            self.skipped_depth = max(self.skipped_depth - 1, 0)
+        elif self.main_stack and self.main_stack[-1] == self.depth:
+            self.main_stack.pop()
+        self.depth -= 1
+
+    def data(self, data):
+        if not self.skipped_depth:
+            self.line.append(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self) -> str:
+        self._flush()
+        lines = self.main_lines if self.main_length >= HTML_MIN_MAIN_TEXT_LENGTH or \
+            self.main_length >= HTML_MIN_MAIN_TEXT_SHARE * self.length else self.lines
+        text = "\n".join(lines)
+        if len(text) > self.max_length:
+            text = text[:self.max_length].rsplit(" ", 1)[0] + " [...]"
+        return text
+
+    def _flush(self):
+        line = _WHITESPACE.sub(" ", "".join(self.line)).strip()
+        self.line = []
+        if not line:
+            return
+        self.lines.append(line)
+        self.length += len(line) + 1
+        if self.main_stack:
+            self.main_lines.append(line)
+            self.main_length += len(line) + 1
+
+
 class HtmlProcessor:
 
+    # Extracted texts, by hash of the HTML and max_length
+    cache = LRUCache(maxsize=HTML_CACHE_SIZE)
+
+    @staticmethod
+    def clear_html(
+        html: Union[str, bytes],
+        max_length: int = HTML_MAX_TEXT_LENGTH
+    ) -> str:
+        """
+        Returns the text of the main content of the page, one block per line, truncated to max_length characters.
+        Pages are parsed in chunks, and parsing stops once enough text is collected.
+        """
+        if isinstance(html, str):
+            html = html.encode("utf-8", errors="replace")
+        html = html[:HTML_MAX_SIZE]
+
+        key = (hashlib.blake2b(html, digest_size=16).digest(), max_length)
+        return HtmlProcessor.cache.get_or_create(
+            key,
+            lambda: HtmlProcessor._extract_text(html, max_length)
+        )
+
     @staticmethod
-    def clear_html(html):
-        doc = Document(html)
-        main_content = doc.summary()
-        soup = BeautifulSoup(main_content, 'html.parser')
-        for script in soup(['script', 'style']):
-            script.decompose()
-        return soup.get_text(separator='\n', strip=True)
+    def _extract_text(html: bytes, max_length: int, chunk_size: int = 64 * 1024) -> str:
+        collector = _TextCollector(max_length)
+        parser = etree.HTMLParser(
+            target=collector, encoding="utf-8", recover=True, no_network=True)
+        for start in range(0, len(html), chunk_size):
+            parser.feed(html[start:start + chunk_size])
+            if collector.done:
+                break
+        try:
+            return parser.close()
+        except etree.XMLSyntaxError:
+            # Empty or unparsable documents
+            return collector.close()
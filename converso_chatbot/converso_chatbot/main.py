@@ -2,12 +2,22 @@ import asyncio
 import logging
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
 from converso_chatbot.clients.rabbitmq import RabbitMQConsumer
+from converso_chatbot.clients.search_cache import get_search_cache
 from converso_chatbot.constants import MessageQueues
 from converso_chatbot.controllers import (conversations_router, google_actions_router,
                                   google_login_router)
-from converso_chatbot.conversational_engine import process_message
+from converso_chatbot.conversational_engine import (agent_executor,
+                                                     history_metrics,
+                                                     process_message)
+from converso_chatbot.conversational_engine.form_agent.model_factory import \
+    ModelFactory
+from converso_chatbot.conversational_engine.tools.python_sandbox import \
+    get_sandbox_pool
+from converso_chatbot.tracing import (PROMETHEUS_CONTENT_TYPE, render_metrics,
+                                      setup_opentelemetry)
 
 # Add stream and file handlers to logger. Use basic config
 # to avoid adding duplicate handlers when reloading server
@@ -30,7 +40,51 @@ app.include_router(conversations_router)
 app.include_router(google_login_router)
 app.include_router(google_actions_router)
 
-asyncio.get_event_loop().create_task(RabbitMQConsumer(
+rabbitmq_consumer = RabbitMQConsumer(
     queue_name=MessageQueues.converso_IN.value,
     on_message_callback=process_message
-).run_consumer())
+)
+
+# Synchronous graph nodes run in the default executor of the loop: bound it,
+# so that long LLM turns cannot starve the process of threads
+loop = asyncio.get_event_loop()
+loop.set_default_executor(agent_executor)
+loop.create_task(rabbitmq_consumer.run_consumer())
+# Export the spans of the turns to the collector at OTEL_EXPORTER_OTLP_ENDPOINT, if set
+setup_opentelemetry()
+
+
+@app.on_event("startup")
+def start_sandbox_pool():
+    """Starts the PythonCodeInterpreter workers before the first call, once the server starts"""
+    get_sandbox_pool()
+
+
+@app.get("/consumer/stats")
+def consumer_stats():
+    """Queue depth and in-flight conversation turns of this worker"""
+    return {"content": rabbitmq_consumer.stats()}
+
+
+@app.get("/history/stats")
+def history_stats():
+    """Token budget of the chat history and tokens of the history and of the prompts per turn"""
+    return {"content": history_metrics.stats()}
+
+
+@app.get("/models/stats")
+def models_stats():
+    """Hit rate and size of the caches of the LLM clients and of the agents"""
+    return {"content": ModelFactory.cache_stats()}
+
+
+@app.get("/search/stats")
+def search_stats():
+    """Hit rate and bytes saved by the cache of the search result pages and of the crawled websites"""
+    return {"content": get_search_cache().stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Durations of the spans of the conversation turns, in the Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
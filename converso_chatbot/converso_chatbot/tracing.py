@@ -0,0 +1,271 @@
+"""
+Spans of the hot path of the conversation turns: state load, graph nodes, LLM calls, tools,
+state store and publishes.
+
+Every span is observed in the converso_span_duration_seconds histogram, exposed in the
+Prometheus text format by render_metrics (the /metrics route), labelled by span, target
+(node, model, tool or queue) and outcome. The chat_id and turn_id of the turn are not labels,
+as they are unbounded: they are attributes of the OpenTelemetry spans, exported when
+OTEL_EXPORTER_OTLP_ENDPOINT is set and opentelemetry-sdk and opentelemetry-exporter-otlp are
+installed, and of the debug log line of every span. The OpenTelemetry spans started within
+a span block are its children.
+
+    with use_trace_attributes(chat_id=chat_id, turn_id=turn_id):
+        with span("state_load"):
+            ...
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, in seconds
+SPAN_DURATION_BUCKETS = tuple(float(bucket) for bucket in os.environ.get(
+    "SPAN_DURATION_BUCKETS",
+    "0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60"
+).split(","))
+# OTLP collector receiving the spans, e.g. http://localhost:4317
+OTEL_EXPORTER_OTLP_ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT")
+OTEL_SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "converso_chatbot")
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+current_trace_attributes: ContextVar[Dict[str, Any]] = ContextVar(
+    "current_trace_attributes", default={})
+
+_tracer = None
+
+
+class Histogram:
+    """A Prometheus histogram with labels. Thread safe."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str],
+        buckets: Sequence[float] = SPAN_DURATION_BUCKETS
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Count of each bucket (not cumulative), sum and count, by label values
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_values: Tuple[str, ...], value: float) -> None:
+        index = next(
+            (i for i, bucket in enumerate(self.buckets) if value <= bucket), len(self.buckets))
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, label_values: Tuple[str, ...]) -> int:
+        with self.lock:
+            series = self.series.get(label_values)
+            return int(series[-1]) if series else 0
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram"
+        ]
+        with self.lock:
+            series = sorted((labels, values[:])
+                            for labels, values in self.series.items())
+        for label_values, values in series:
+            labels = ",".join(
+                f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, label_values))
+            cumulative = 0
+            for bucket, count in zip((*self.buckets, float("inf")), values):
+                cumulative += count
+                le = "+Inf" if bucket == float("inf") else repr(bucket)
+                lines.append(
+                    f'{self.name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {values[-2]}")
+            lines.append(f"{self.name}_count{{{labels}}} {int(values[-1])}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        with self.lock:
+            self.series.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+SPAN_DURATIONS = Histogram(
+    "converso_span_duration_seconds",
+    "Duration of the spans of the conversation turns",
+    ("span", "target", "outcome")
+)
+
+
+class Span:
+    """A span being measured, ended by end()"""
+
+    __slots__ = ("name", "target", "attributes", "start", "otel_span")
+
+    def __init__(self, name: str, target: str, attributes: Dict[str, Any]) -> None:
+        self.name = name
+        self.target = target
+        self.attributes = attributes
+        self.otel_span = _tracer.start_span(
+            f"converso.{name}",
+            attributes={"target": target, **attributes}
+        ) if _tracer else None
+        self.start = time.perf_counter()
+
+    def end(self, error: Optional[BaseException] = None) -> float:
+        duration = time.perf_counter() - self.start
+        SPAN_DURATIONS.observe(
+            (self.name, self.target, "error" if error else "ok"), duration)
+        if self.otel_span is not None:
+            if error is not None:
+                self.otel_span.record_exception(error)
+                self.otel_span.set_status(otel_trace.Status(
+                    otel_trace.StatusCode.ERROR, str(error)))
+            self.otel_span.end()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Span %s %s took %.1fms %s", self.name, self.target, duration * 1000, self.attributes)
+        return duration
+
+
+def start_span(name: str, target: str = "", **attributes: Any) -> Span:
+    """Starts a span with the attributes of the turn being executed, and the given ones"""
+    return Span(name, target, {**current_trace_attributes.get(), **attributes})
+
+
+@contextmanager
+def span(name: str, target: str = "", **attributes: Any) -> Iterator[Span]:
+    """
+    Measures the block as a span, with outcome error when it raises.
+    The spans started in the block, also by the threads it runs, are its children.
+    """
+    started_span = start_span(name, target, **attributes)
+    try:
+        with _use_otel_span(started_span):
+            yield started_span
+    except BaseException as e:
+        started_span.end(e)
+        raise
+    started_span.end()
+
+
+def _use_otel_span(started_span: Span):
+    """Makes the OpenTelemetry span of started_span the parent of the spans started in the block"""
+    if started_span.otel_span is None:
+        return nullcontext()
+    # Ended, with its error, by Span.end
+    return otel_trace.use_span(
+        started_span.otel_span,
+        end_on_exit=False,
+        record_exception=False,
+        set_status_on_exception=False
+    )
+
+
+@contextmanager
+def use_trace_attributes(**attributes: Any):
+    """Adds the attributes (e.g. chat_id and turn_id) to the spans started in the block"""
+    token = current_trace_attributes.set(
+        {**current_trace_attributes.get(), **attributes})
+    try:
+        yield
+    finally:
+        current_trace_attributes.reset(token)
+
+
+class LLMCallTracer(BaseCallbackHandler):
+    """Callback handler measuring every call of the LLMs it is given to as an llm_call span"""
+
+    def __init__(self) -> None:
+        self.spans: Dict[UUID, Span] = {}
+        self.lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(serialized, run_id, kwargs)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(serialized, run_id, kwargs)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def _start(self, serialized: Dict[str, Any], run_id: UUID, kwargs: Dict[str, Any]) -> None:
+        invocation_params = kwargs.get("invocation_params") or {}
+        model = invocation_params.get("model") or invocation_params.get(
+            "model_name") or (serialized or {}).get("name", "")
+        with self.lock:
+            self.spans[run_id] = start_span("llm_call", str(model))
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None) -> None:
+        with self.lock:
+            started_span = self.spans.pop(run_id, None)
+        if started_span is not None:
+            started_span.end(error)
+
+
+_llm_call_tracer = LLMCallTracer()
+
+
+def get_llm_call_tracer() -> LLMCallTracer:
+    """The LLMCallTracer shared by the LLMs of the process"""
+    return _llm_call_tracer
+
+
+def render_metrics() -> str:
+    """The metrics in the Prometheus text format"""
+    return SPAN_DURATIONS.render()
+
+
+def setup_opentelemetry() -> bool:
+    """
+    Exports the spans to the OTLP collector at OTEL_EXPORTER_OTLP_ENDPOINT, if set.
+    Returns whether the spans are exported.
+    """
+    global _tracer
+    if not OTEL_EXPORTER_OTLP_ENDPOINT:
+        return False
+    try:
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import \
+            OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logger.warning(
+            "OTEL_EXPORTER_OTLP_ENDPOINT is set, but opentelemetry-sdk and "
+            "opentelemetry-exporter-otlp are not installed: the spans are not exported")
+        return False
+
+    tracer_provider = TracerProvider(
+        resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+    tracer_provider.add_span_processor(BatchSpanProcessor(
+        OTLPSpanExporter(endpoint=OTEL_EXPORTER_OTLP_ENDPOINT)))
+    otel_trace.set_tracer_provider(tracer_provider)
+    _tracer = otel_trace.get_tracer("converso_chatbot")
+    return True
@@ -0,0 +1,36 @@
+"""
+Saves the Google search result pages of the given queries in fixtures/serp/real, with the
+headers of the GoogleSearchClient, so that parse_serp is tested against real markup
+(see test_serp_parser.test_saved_result_pages).
+
+    PYTHONPATH=. python tests/unit/clients/fixtures/serp/save_serp_fixture.py "bitcoin price" pizza
+"""
+
+import argparse
+import pathlib
+import re
+
+from converso_chatbot.clients.google_search import GoogleSearchClient
+
+REAL_FIXTURES = pathlib.Path(__file__).parent / "real"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("queries", nargs="+")
+    args = parser.parse_args()
+
+    client = GoogleSearchClient()
+    REAL_FIXTURES.mkdir(exist_ok=True)
+    for query in args.queries:
+        response = client.make_request(
+            "https://www.google.com/search", params={"q": query})
+        if not response:
+            raise SystemExit(f"Cannot get the result page of {query}")
+        path = REAL_FIXTURES / f"{re.sub(r'[^a-z0-9]+', '_', query.lower())}.html"
+        path.write_text(response.text)
+        print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
+import gc
+import threading
+import weakref
 from datetime import datetime
 from unittest.mock import MagicMock, patch
 
@@ -5,7 +8,64 @@ from google.oauth2.credentials import Credentials
 
 from converso_chatbot.clients.google import (CreateCalendarEventPayload,
                                      GetCalendarEventsPayload,
-                                     GetEmailsPayload, GoogleClient)
+                                     GetEmailsPayload, GoogleClient,
+                                     get_resource, get_service)
+from converso_chatbot.helpers import LRUCache
+
+
+def test_services_and_collections_are_reused_per_credentials():
+    credentials = Credentials(token="token")
+    other_credentials = Credentials(token="token")
+
+    service = get_service('gmail', 'v1', credentials)
+    messages = get_resource('gmail', 'v1', credentials, 'users.messages')
+
+    assert get_service('gmail', 'v1', credentials) is service
+    assert get_resource('gmail', 'v1', credentials, 'users.messages') is messages
+    assert get_service('calendar', 'v3', credentials) is not service
+    assert get_service('gmail', 'v1', other_credentials) is not service
+
+
+def test_requests_share_an_http_per_thread():
+    credentials = Credentials(token="token")
+    messages = get_resource('gmail', 'v1', credentials, 'users.messages')
+
+    http = messages.get(userId="me", id="1").http
+    other_thread_http = []
+    thread = threading.Thread(target=lambda: other_thread_http.append(
+        messages.get(userId="me", id="1").http))
+    thread.start()
+    thread.join()
+
+    assert messages.get(userId="me", id="2").http is http
+    assert http.credentials is credentials
+    assert other_thread_http[0] is not http
+    assert get_resource('gmail', 'v1', Credentials(token="token"), 'users.messages') \
+        .get(userId="me", id="1").http is not http
+
+
+def test_services_are_evicted():
+    with patch('converso_chatbot.clients.google._resources', LRUCache(maxsize=2)) as resources:
+        credentials = Credentials(token="token", refresh_token="chat-1")
+        service = weakref.ref(get_service('gmail', 'v1', credentials))
+
+        # The credentials of the chat deserialized again replace the previous ones
+        reloaded_credentials = Credentials(token="token", refresh_token="chat-1")
+        reloaded_service = get_service('gmail', 'v1', reloaded_credentials)
+        del credentials
+        gc.collect()
+        assert service() is None
+        assert len(resources) == 1
+
+        # The least recently used credentials are evicted
+        reloaded_service = weakref.ref(reloaded_service)
+        for chat in range(2, 4):
+            get_service('gmail', 'v1', Credentials(
+                token="token", refresh_token=f"chat-{chat}"))
+        del reloaded_credentials
+        gc.collect()
+        assert reloaded_service() is None
+        assert len(resources) == 2
 
 
 def test_create_calendar_event():
@@ -25,7 +85,7 @@ def test_create_calendar_event():
     events_mock.insert.return_value.execute.return_value = {"id": "12345"}
     service_mock.events.return_value = events_mock
 
-    with patch('converso_chatbot.clients.google.build', return_value=service_mock):
+    with patch('converso_chatbot.clients.google.get_service', return_value=service_mock):
         client.create_calendar_event(payload)
 
     # Verify that the event was created
@@ -62,7 +122,7 @@ def test_get_calendar_events():
     }
     service_mock.events.return_value = events_mock
 
-    with patch('converso_chatbot.clients.google.build', return_value=service_mock):
+    with patch('converso_chatbot.clients.google.get_service', return_value=service_mock):
         events = client.get_calendar_events(payload)
 
     # Verify that the correct events were retrieved
@@ -118,7 +178,7 @@ def test_get_calendar_events_html():
     }
     service_mock.events.return_value = events_mock
 
-    with patch('converso_chatbot.clients.google.build', return_value=service_mock):
+    with patch('converso_chatbot.clients.google.get_service', return_value=service_mock):
         events = client.get_calendar_events_html(payload)
 
     # Verify that the correct events were retrieved
@@ -133,6 +193,32 @@ def test_get_calendar_events_html():
     assert events == '1. 2022-01-01T00:00:00+00:00 - <a href="www.test.com">Event 1</a>\n2. 2022-01-01T00:00:00+00:00 - <a href="www.test.com">Event 2</a>\n'
 
 
+class _BatchMock:
+    """Executes the requests of a Gmail batch one by one"""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self.requests:
+            self.callback(request_id, request.execute(), None)
+
+
+def _mock_batch(service_mock):
+    batches = []
+
+    def new_batch_http_request(callback):
+        batches.append(_BatchMock(callback))
+        return batches[-1]
+
+    service_mock.new_batch_http_request.side_effect = new_batch_http_request
+    return batches
+
+
 def test_get_emails():
     credentials = MagicMock(spec=Credentials)
     client = GoogleClient(credentials)
@@ -140,6 +226,7 @@ def test_get_emails():
     payload = GetEmailsPayload(number_of_emails=3)
 
     service_mock = MagicMock()
+    batches = _mock_batch(service_mock)
     service_mock.users.return_value.messages.return_value.list.return_value.execute.return_value = {
         'messages': [
             {'id': '12345'},
@@ -157,8 +244,8 @@ def test_get_emails():
         'snippet': 'This is a test email'
     }
 
-    with patch('converso_chatbot.clients.google.build', return_value=service_mock):
-        emails = client.get_emails(payload)
+    with patch('converso_chatbot.clients.google.get_service', return_value=service_mock):
+        emails = client.get_emails(payload, full_content=False)
 
     service_mock.users.assert_called()
     service_mock.users.return_value.messages.assert_called()
@@ -167,6 +254,16 @@ def test_get_emails():
         maxResults=3,
     )
 
+    # One batch request for all the messages, without the content
+    assert len(batches) == 1
+    assert len(batches[0].requests) == 2
+    service_mock.users.return_value.messages.return_value.get.assert_called_with(
+        userId='me',
+        id='67890',
+        format='metadata',
+        metadataHeaders=['From', 'Date', 'Subject']
+    )
+
     assert len(emails) == 2
     assert emails[0]['sender'] == 'sender@example.com'
     assert emails[0]['time'] == '2022-01-01'
@@ -174,13 +271,40 @@ def test_get_emails():
     assert emails[0]['content'] == 'This is a test email'
 
 
-def test_get_emails():
+class _BatchMock:
+    """Executes the requests of a Gmail batch one by one"""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self.requests:
+            self.callback(request_id, request.execute(), None)
+
+
+def _mock_batch(service_mock):
+    batches = []
+
+    def new_batch_http_request(callback):
+        batches.append(_BatchMock(callback))
+        return batches[-1]
+
+    service_mock.new_batch_http_request.side_effect = new_batch_http_request
+    return batches
+
+
+def test_get_emails_html():
     credentials = MagicMock(spec=Credentials)
     client = GoogleClient(credentials)
 
     payload = GetEmailsPayload(number_of_emails=3)
 
     service_mock = MagicMock()
+    batches = _mock_batch(service_mock)
     service_mock.users.return_value.messages.return_value.list.return_value.execute.return_value = {
         'messages': [
             {'id': '12345'},
@@ -202,7 +326,7 @@ def test_get_emails():
         'snippet': 'This is a test email'
     }
 
-    with patch('converso_chatbot.clients.google.build', return_value=service_mock):
+    with patch('converso_chatbot.clients.google.get_service', return_value=service_mock):
         emails = client.get_emails_html(payload)
 
     service_mock.users.assert_called()
@@ -213,3 +337,30 @@ def test_get_emails():
     )
 
     assert emails == "\n1. Subject: Test Email\nSender: sender@example.com\nTime: 2022-01-01\nContent: This is a test email\n\n\n\n\n2. Subject: Test Email\nSender: sender@example.com\nTime: 2022-01-01\nContent: This is a test email\n\n\n\n"
+
+
+def test_iter_emails_yields_emails_in_order_across_batches():
+    credentials = MagicMock(spec=Credentials)
+    client = GoogleClient(credentials)
+
+    service_mock = MagicMock()
+    batches = _mock_batch(service_mock)
+    messages_mock = service_mock.users.return_value.messages.return_value
+    messages_mock.list.return_value.execute.return_value = {
+        'messages': [{'id': str(index)} for index in range(5)]
+    }
+    messages_mock.get.side_effect = lambda userId, id, **kwargs: MagicMock(
+        execute=MagicMock(return_value={
+            'payload': {'headers': [{'name': 'Subject', 'value': f'Email {id}'}]},
+            'snippet': ''
+        })
+    )
+
+    with patch('converso_chatbot.clients.google.GMAIL_BATCH_SIZE', 2), \
+            patch('converso_chatbot.clients.google.get_service', return_value=service_mock):
+        emails = list(client.iter_emails(
+            GetEmailsPayload(number_of_emails=5), full_content=False))
+
+    assert [email['subject'] for email in emails] == [
+        f'Email {index}' for index in range(5)]
+    assert [len(batch.requests) for batch in batches] == [2, 2, 1]
@@ -1,3 +1,6 @@
+import socket
+import threading
+import time
 from unittest.mock import patch
 
 import pytest
@@ -6,6 +9,19 @@ from converso_chatbot.clients.google_search import (GoogleSearchClient,
                                             GoogleSearchClientPayload)
 
 
+def _google_is_reachable() -> bool:
+    try:
+        socket.create_connection(("www.google.com", 443), timeout=3).close()
+        return True
+    except OSError:
+        return False
+
+
+requires_google = pytest.mark.skipif(
+    not _google_is_reachable(), reason="Searches Google, which is not reachable")
+
+
+@requires_google
 def test_search_financial_data():
     for query in ["bitcoin price", "tesla stock price"]:
         client = GoogleSearchClient()
@@ -15,6 +31,7 @@ def test_search_financial_data():
         assert result.startswith("\n\nFinancial data")
 
 
+@requires_google
 def test_search_info_box():
     for query in ["pizza"]:
         client = GoogleSearchClient()
@@ -48,6 +65,55 @@ def test_search_with_invalid_payload():
             client.search(payload)
 
 
+def test_crawl_returns_the_first_pages_loaded_in_the_order_of_the_results():
+    client = GoogleSearchClient()
+    delays = {"slow": 2, "failing": 0, "a": 0.05, "b": 0.1, "c": 0.01}
+
+    def get_main_content_from_url(url):
+        time.sleep(delays[url])
+        return None if url == "failing" else f"content of {url}"
+
+    with patch.object(client, "get_main_content_from_url", side_effect=get_main_content_from_url):
+        start = time.monotonic()
+        texts = client.crawl(["slow", "failing", "a", "b", "c"], num_results=2)
+
+    assert texts == ["content of a", "content of c"]
+    assert time.monotonic() - start < 1
+
+
+def test_crawl_stops_at_the_deadline():
+    client = GoogleSearchClient()
+
+    def get_main_content_from_url(url):
+        time.sleep(0.01 if url == "fast" else 2)
+        return f"content of {url}"
+
+    with patch.object(client, "get_main_content_from_url", side_effect=get_main_content_from_url):
+        start = time.monotonic()
+        texts = client.crawl(["slow", "fast"], num_results=2, deadline=0.2)
+
+    assert texts == ["content of fast"]
+    assert time.monotonic() - start < 1
+
+
+def test_crawl_returns_partial_results_when_a_page_never_finishes():
+    client = GoogleSearchClient()
+    never_finishes = threading.Event()
+
+    def get_main_content_from_url(url):
+        if url == "hanging":
+            never_finishes.wait()
+        return f"content of {url}"
+
+    try:
+        with patch.object(client, "get_main_content_from_url", side_effect=get_main_content_from_url):
+            texts = client.crawl(["hanging", "a", "b"], num_results=3, deadline=0.2)
+    finally:
+        never_finishes.set()
+
+    assert texts == ["content of a", "content of b"]
+
+
 def create_mock_response():
     class MockResponse:
         def __init__(self):
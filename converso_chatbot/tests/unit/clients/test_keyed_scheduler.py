@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from converso_chatbot.clients.rabbitmq.keyed_scheduler import KeyedScheduler
+
+
+def test_same_key_runs_in_order():
+    executed = []
+
+    async def job(value, delay):
+        await asyncio.sleep(delay)
+        executed.append(value)
+
+    async def main():
+        scheduler = KeyedScheduler(max_concurrency=4)
+        await asyncio.gather(
+            scheduler.submit("chat", job, 1, 0.03),
+            scheduler.submit("chat", job, 2, 0.01),
+            scheduler.submit("chat", job, 3, 0),
+        )
+
+    asyncio.run(main())
+    assert executed == [1, 2, 3]
+
+
+def test_different_keys_run_concurrently_up_to_limit():
+    running = 0
+    max_running = 0
+
+    async def job():
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    async def main():
+        scheduler = KeyedScheduler(max_concurrency=3)
+        await asyncio.gather(
+            *[scheduler.submit(f"chat-{i}", job) for i in range(10)])
+
+    asyncio.run(main())
+    assert max_running == 3
+
+
+def test_failed_job_does_not_block_the_key():
+    executed = []
+
+    async def failing_job():
+        raise ValueError("error")
+
+    async def job():
+        executed.append("ok")
+
+    async def main():
+        scheduler = KeyedScheduler(max_concurrency=1)
+        failing = scheduler.submit("chat", failing_job)
+        succeeding = scheduler.submit("chat", job)
+        with pytest.raises(ValueError):
+            await failing
+        await succeeding
+        # Let the done callbacks run
+        await asyncio.sleep(0)
+        return scheduler.stats()
+
+    stats = asyncio.run(main())
+    assert executed == ["ok"]
+    assert stats["in_flight"] == 0
+    assert stats["queued"] == 0
+    assert stats["active_keys"] == 0
+
+
+def test_stats():
+    async def main():
+        scheduler = KeyedScheduler(max_concurrency=1)
+        event = asyncio.Event()
+        jobs = [
+            scheduler.submit("a", event.wait),
+            scheduler.submit("a", event.wait),
+            scheduler.submit("b", event.wait)
+        ]
+        await asyncio.sleep(0)
+        stats = scheduler.stats()
+        event.set()
+        await asyncio.gather(*jobs)
+        return stats
+
+    stats = asyncio.run(main())
+    assert stats["in_flight"] == 1
+    assert stats["queued"] == 2
+    assert stats["queued_by_key"] == {"a": 1, "b": 1}
+
+
+def test_invalid_max_concurrency():
+    with pytest.raises(ValueError):
+        KeyedScheduler(max_concurrency=0)
@@ -0,0 +1,87 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import pika
+
+from converso_chatbot.clients.rabbitmq import RabbitMQProducer
+
+
+def test_publish_reuses_connection_and_declarations():
+    producer = RabbitMQProducer("localhost", 5672, "user", "password")
+
+    with patch("pika.BlockingConnection") as connection_mock:
+        channel_mock = connection_mock.return_value.channel.return_value
+        for i in range(5):
+            producer.publish(queue="converso_out", message=f"message {i}")
+
+    connection_mock.assert_called_once()
+    channel_mock.queue_declare.assert_called_once_with(
+        queue="converso_out", durable=True)
+    assert channel_mock.basic_publish.call_count == 5
+    channel_mock.basic_publish.assert_called_with(
+        exchange='', routing_key="converso_out", body="message 4")
+
+
+def test_publish_reconnects_when_connection_is_lost():
+    producer = RabbitMQProducer("localhost", 5672, "user", "password")
+
+    broken_channel = MagicMock()
+    broken_channel.basic_publish.side_effect = pika.exceptions.StreamLostError()
+    working_channel = MagicMock()
+
+    with patch("pika.BlockingConnection") as connection_mock:
+        connection_mock.return_value.channel.side_effect = [
+            broken_channel, working_channel]
+        producer.publish(queue="converso_out", message="message")
+
+    assert connection_mock.call_count == 2
+    working_channel.basic_publish.assert_called_once_with(
+        exchange='', routing_key="converso_out", body="message")
+
+
+def test_connection_closed_while_idle_is_reopened_before_publishing():
+    producer = RabbitMQProducer("localhost", 5672, "user", "password")
+
+    with patch("pika.BlockingConnection") as connection_mock:
+        idle_connection, new_connection = MagicMock(), MagicMock()
+        connection_mock.side_effect = [idle_connection, new_connection]
+        producer.publish(queue="converso_out", message="first")
+        idle_connection.process_data_events.side_effect = pika.exceptions.StreamLostError()
+        producer.publish(queue="converso_out", message="second")
+
+    idle_connection.channel.return_value.basic_publish.assert_called_once_with(
+        exchange='', routing_key="converso_out", body="first")
+    new_connection.channel.return_value.basic_publish.assert_called_once_with(
+        exchange='', routing_key="converso_out", body="second")
+    assert connection_mock.call_args.args[0].heartbeat == producer.heartbeat > 0
+
+
+def test_publishes_are_confirmed():
+    producer = RabbitMQProducer("localhost", 5672, "user", "password")
+
+    with patch("pika.BlockingConnection") as connection_mock:
+        channel_mock = connection_mock.return_value.channel.return_value
+        channel_mock.basic_publish.side_effect = [
+            pika.exceptions.NackError([]), None]
+        producer.publish(queue="converso_out", message="message")
+
+    channel_mock.confirm_delivery.assert_called()
+    # The message not taken by the broker is published again on a new connection
+    assert connection_mock.call_count == 2
+    assert channel_mock.basic_publish.call_count == 2
+
+
+def test_connection_idle_for_longer_than_the_heartbeat_is_reopened():
+    producer = RabbitMQProducer(
+        "localhost", 5672, "user", "password", pool_size=1, heartbeat=60)
+
+    with patch("pika.BlockingConnection") as connection_mock:
+        idle_connection, new_connection = MagicMock(), MagicMock()
+        connection_mock.side_effect = [idle_connection, new_connection]
+        producer.publish(queue="converso_out", message="first")
+        with patch("time.monotonic", return_value=time.monotonic() + 61):
+            producer.publish(queue="converso_out", message="second")
+
+    idle_connection.close.assert_called_once()
+    new_connection.channel.return_value.basic_publish.assert_called_once_with(
+        exchange='', routing_key="converso_out", body="second")
@@ -0,0 +1,11 @@
+from converso_chatbot.clients import (get_async_redis_client,
+                                      get_async_redis_connection_pool,
+                                      get_redis_client,
+                                      get_redis_connection_pool)
+
+
+def test_clients_share_the_process_connection_pool():
+    assert get_redis_client().connection_pool is get_redis_connection_pool()
+    assert get_redis_client().connection_pool is get_redis_client().connection_pool
+    assert get_async_redis_client().connection_pool is \
+        get_async_redis_connection_pool()
@@ -0,0 +1,80 @@
+from unittest.mock import MagicMock, patch
+
+import redis
+
+from conversational_engine.mocks import MockRedis
+from converso_chatbot.clients.google_search import (GoogleSearchClient,
+                                                    GoogleSearchClientPayload)
+from converso_chatbot.clients.search_cache import (SearchCache,
+                                                   SearchContentType,
+                                                   normalize_query,
+                                                   normalize_url)
+
+
+def test_normalize_query():
+    assert normalize_query("  Bitcoin\tPRICE  ") == normalize_query("bitcoin price")
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://Example.com/news?b=2&utm_source=x&a=1#comments") == \
+        normalize_url("https://example.com/news?a=1&b=2")
+    assert normalize_url("https://example.com") == "https://example.com/"
+
+
+def test_entries_are_shared_through_redis():
+    mock_redis = MockRedis()
+    first_worker = SearchCache(lambda: mock_redis)
+    second_worker = SearchCache(lambda: mock_redis)
+
+    first_worker.set(SearchContentType.PAGE, "url",
+                     "text", ttl=60, source_bytes=1000)
+
+    assert first_worker.get(SearchContentType.PAGE, "url") == "text"
+    assert second_worker.get(SearchContentType.PAGE, "url") == "text"
+    assert second_worker.get(SearchContentType.PAGE, "url") == "text"
+    assert second_worker.get(SearchContentType.PAGE, "other url") is None
+    assert second_worker.stats()["page"] == {
+        "memory_hits": 1,
+        "redis_hits": 1,
+        "misses": 1,
+        "bytes_saved": 2000,
+        "hit_rate": 0.667
+    }
+
+
+def test_expired_entries_are_misses():
+    mock_redis = MockRedis()
+    cache = SearchCache(lambda: mock_redis)
+
+    cache.set(SearchContentType.SERP, "query", "html", ttl=0)
+
+    assert cache.get(SearchContentType.SERP, "query") is None
+
+
+def test_redis_errors_are_misses():
+    failing_redis = MagicMock()
+    failing_redis.set.side_effect = redis.ConnectionError()
+    failing_redis.pipeline.side_effect = redis.ConnectionError()
+    cache = SearchCache(lambda: failing_redis)
+
+    cache.set(SearchContentType.SERP, "query", "html", ttl=60)
+
+    assert cache.get(SearchContentType.SERP, "query") == "html"
+    assert SearchCache(lambda: failing_redis).get(
+        SearchContentType.SERP, "query") is None
+
+
+def test_search_result_pages_are_cached_by_normalized_query():
+    mock_redis = MockRedis()
+    client = GoogleSearchClient()
+    client.cache = SearchCache(lambda: mock_redis)
+    response = MagicMock(
+        text="<div class='I6TXqe'>Pizza is a dish</div>", content=b"x" * 100)
+
+    with patch.object(client, "make_request", return_value=response) as make_request:
+        client.search(GoogleSearchClientPayload(query="Pizza"))
+        result = client.search(GoogleSearchClientPayload(query=" pizza "))
+
+    make_request.assert_called_once()
+    assert "Pizza is a dish" in result
+    assert client.cache.stats()["serp"]["bytes_saved"] == 100
@@ -0,0 +1,85 @@
+import pathlib
+
+import pytest
+
+from converso_chatbot.clients.serp_parser import (NOT_FOUND, FinancialData,
+                                                  parse_serp)
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures" / "serp"
+# Pages saved from Google by fixtures/serp/save_serp_fixture.py
+REAL_FIXTURES = sorted((FIXTURES / "real").glob("*.html"))
+
+
+def _load(name: str) -> str:
+    return (FIXTURES / f"{name}.html").read_text()
+
+
+def test_converter_financial_data():
+    serp = parse_serp(_load("bitcoin_price"))
+
+    assert serp.financial_data == FinancialData(
+        asset_name="Bitcoin equals",
+        value="63,481.20",
+        currency="United States Dollar",
+        absolute_variation="+1,204.55",
+        percentage_variation="(1.93%)"
+    )
+    assert serp.info_box is None
+
+
+def test_asset_chart_financial_data():
+    serp = parse_serp(_load("tesla_stock_price"))
+
+    assert serp.financial_data == FinancialData(
+        asset_name="Tesla Inc",
+        value="177.48",
+        currency="USD",
+        absolute_variation="+5.63",
+        percentage_variation="(3.28%)"
+    )
+
+
+def test_info_box_and_results_list():
+    serp = parse_serp(_load("pizza"))
+
+    assert serp.financial_data is None
+    assert "Pizza is a dish of Italian origin" in serp.info_box
+    assert len(serp.results) == 10
+    assert serp.results[0] == {
+        "url": "https://en.wikipedia.org/wiki/Pizza",
+        "title": ["Pizza - Wikipedia"]
+    }
+    assert all(result["url"] != "#" for result in serp.results)
+
+
+def test_page_without_results():
+    serp = parse_serp(_load("no_results"))
+
+    assert serp.financial_data is None
+    assert serp.info_box is None
+    assert serp.results == []
+
+
+def test_missing_fields_are_not_found():
+    serp = parse_serp(
+        '<div data-attrid="Converter"><span class="pclqee"> 1.08 </span></div>')
+
+    assert serp.financial_data.value == "1.08"
+    assert serp.financial_data.asset_name == NOT_FOUND
+
+
+def test_empty_page():
+    assert parse_serp("") == parse_serp("   ")
+    assert parse_serp("Mock search result").results == []
+
+
+@pytest.mark.skipif(not REAL_FIXTURES, reason="No result page saved from Google")
+@pytest.mark.parametrize("path", REAL_FIXTURES, ids=lambda path: path.stem)
+def test_saved_result_pages(path):
+    serp = parse_serp(path.read_text())
+
+    assert serp.results
+    assert all(result["url"].startswith("http") and result["title"]
+               for result in serp.results)
+    if serp.financial_data:
+        assert serp.financial_data.value != NOT_FOUND
@@ -1,3 +1,4 @@
+import time
 from typing import Any, Type
 
 from pydantic import BaseModel
@@ -42,3 +43,85 @@ class MockFormToolWithFields(FormTool):
 
     def _run_when_complete(self) -> Any:
         pass
+
+
+class MockRedis:
+    """
+    In-memory redis client supporting the string, hash and list commands used by the chatbot.
+    Commands are executed immediately, also when queued on a pipeline.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expires_at = {}
+        self.executed_pipelines = 0
+
+    def pipeline(self, transaction: bool = True):
+        return _MockPipeline(self)
+
+    def get(self, name):
+        if name in self.expires_at and time.time() >= self.expires_at[name]:
+            self.data.pop(name, None)
+            self.expires_at.pop(name)
+        return self.data.get(name)
+
+    def set(self, name, value, ex=None):
+        self.data[name] = _to_bytes(value)
+        if ex is not None:
+            self.expires_at[name] = time.time() + ex
+
+    def ttl(self, name):
+        if self.get(name) is None:
+            return -2
+        if name not in self.expires_at:
+            return -1
+        return int(self.expires_at[name] - time.time())
+
+    def hset(self, name, key, value):
+        self.data.setdefault(name, {})[key] = _to_bytes(value)
+
+    def hdel(self, name, *keys):
+        for key in keys:
+            self.data.get(name, {}).pop(key, None)
+
+    def hmget(self, name, keys):
+        return [self.data.get(name, {}).get(key) for key in keys]
+
+    def rpush(self, name, *values):
+        self.data.setdefault(name, []).extend(map(_to_bytes, values))
+
+    def ltrim(self, name, start, end):
+        self.data[name] = self.lrange(name, start, end)
+
+    def lrange(self, name, start, end):
+        values = self.data.get(name, [])
+        start = max(len(values) + start, 0) if start < 0 else start
+        end = len(values) + end if end < 0 else end
+        return values[start:end + 1]
+
+
+class _MockPipeline:
+
+    def __init__(self, redis: MockRedis):
+        self.redis = redis
+        self.results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def __getattr__(self, command):
+        def queue(*args, **kwargs):
+            self.results.append(getattr(self.redis, command)(*args, **kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        self.redis.executed_pipelines += 1
+        return self.results
+
+
+def _to_bytes(value):
+    return value.encode("utf-8") if isinstance(value, str) else value
@@ -0,0 +1,85 @@
+import json
+from unittest.mock import MagicMock
+from uuid import uuid4
+
+from langchain_core.language_models.fake_chat_models import \
+    GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGenerationChunk
+
+from converso_chatbot.conversational_engine.answer_streamer import \
+    AnswerStreamer
+
+
+def _published(rabbitmq_producer):
+    return [
+        json.loads(call.kwargs["message"])
+        for call in rabbitmq_producer.publish.call_args_list
+    ]
+
+
+def test_answer_is_published_while_generated():
+    rabbitmq_producer = MagicMock()
+    answer_streamer = AnswerStreamer(
+        chat_id="1", rabbitmq_producer=rabbitmq_producer, queue="out", publish_interval=0)
+    llm = GenericFakeChatModel(
+        messages=iter([AIMessage(content="Hello world, how are you?")]))
+
+    chunks = list(llm.stream([HumanMessage(content="Hi")], config={
+        "callbacks": [answer_streamer]}))
+
+    published = _published(rabbitmq_producer)
+    assert len(published) == len(chunks) > 1
+    assert "".join(message["content"]
+                   for message in published) == "Hello world, how are you?"
+    assert {message["type"] for message in published} == {"TEXT_DELTA"}
+    assert answer_streamer.stream_ids == [published[0]["stream_id"]]
+    assert answer_streamer.prompt_tokens > 0
+    assert answer_streamer.completion_tokens > 0
+
+
+def test_tokens_are_coalesced_between_publishes():
+    rabbitmq_producer = MagicMock()
+    answer_streamer = AnswerStreamer(
+        chat_id="1", rabbitmq_producer=rabbitmq_producer, queue="out", publish_interval=60)
+    run_id = uuid4()
+
+    for token in ["Hel", "lo", " wor", "ld", ""]:
+        answer_streamer.on_llm_new_token(token, run_id=run_id)
+    answer_streamer.on_llm_end(None, run_id=run_id)
+
+    assert [message["content"] for message in _published(rabbitmq_producer)] == [
+        "Hel", "lo world"]
+
+
+def test_tool_calls_publish_nothing():
+    rabbitmq_producer = MagicMock()
+    answer_streamer = AnswerStreamer(
+        chat_id="1", rabbitmq_producer=rabbitmq_producer, queue="out")
+    run_id = uuid4()
+
+    answer_streamer.on_llm_new_token("", run_id=run_id)
+    answer_streamer.on_llm_end(None, run_id=run_id)
+
+    rabbitmq_producer.publish.assert_not_called()
+    assert answer_streamer.stream_ids == []
+
+
+def test_text_of_tool_calls_is_not_published():
+    rabbitmq_producer = MagicMock()
+    answer_streamer = AnswerStreamer(
+        chat_id="1", rabbitmq_producer=rabbitmq_producer, queue="out", publish_interval=60)
+    run_id = uuid4()
+    tool_call_chunk = ChatGenerationChunk(message=AIMessageChunk(
+        content="", additional_kwargs={"tool_calls": [{"index": 0, "function": {"name": "GoogleSearch"}}]}))
+
+    answer_streamer.on_llm_new_token("Let me", run_id=run_id)
+    answer_streamer.on_llm_new_token(" search", run_id=run_id)
+    answer_streamer.on_llm_new_token(
+        "", chunk=tool_call_chunk, run_id=run_id)
+    answer_streamer.on_llm_new_token(" more", run_id=run_id)
+    answer_streamer.on_llm_end(None, run_id=run_id)
+
+    # Only the text published before the tool call started
+    assert [message["content"] for message in _published(rabbitmq_producer)] == [
+        "Let me"]
@@ -0,0 +1,191 @@
+import json
+import time
+
+import pytest
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.fake_chat_models import \
+    FakeMessagesListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from converso_chatbot.conversational_engine.form_agent.cassette_chat_model import (
+    Cassette, CassetteChatModel, CassetteMiss, create_chat_model, get_cassette,
+    request_hash)
+
+TOOL_CALL = {
+    "tool_calls": [{
+        "id": "call_1",
+        "type": "function",
+        "function": {"name": "MockBaseTool", "arguments": "{}"}
+    }]
+}
+
+
+class TokenCollector(BaseCallbackHandler):
+
+    def __init__(self):
+        self.tokens = []
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.tokens.append(token)
+
+
+@pytest.fixture
+def cassette_path(tmp_path):
+    get_cassette.cache_clear()
+    yield str(tmp_path / "cassette.jsonl")
+    get_cassette.cache_clear()
+
+
+def _chat_model_factory(responses):
+    built = []
+
+    def chat_model_factory(**params):
+        built.append(params)
+        return FakeMessagesListChatModel(responses=responses)
+
+    chat_model_factory.built = built
+    return chat_model_factory
+
+
+def _messages(content="Hi"):
+    return [SystemMessage(content="You are an assistant"), HumanMessage(content=content)]
+
+
+def _write_cassette(path, responses):
+    with open(path, "w") as f:
+        for key, response in responses.items():
+            f.write(json.dumps({"key": key, "response": response}) + "\n")
+
+
+def test_off_builds_the_chat_model():
+    chat_model_factory = _chat_model_factory([AIMessage(content="Hello")])
+
+    llm = create_chat_model(chat_model_factory, mode="off", model="gpt")
+
+    assert isinstance(llm, FakeMessagesListChatModel)
+    assert chat_model_factory.built == [{"model": "gpt"}]
+
+
+def test_recorded_responses_are_replayed_without_the_chat_model(cassette_path):
+    recorder = create_chat_model(
+        _chat_model_factory([AIMessage(content="Hello"), AIMessage(content="", additional_kwargs=TOOL_CALL)]),
+        mode="record", cassette_path=cassette_path, model="gpt")
+    recorder.invoke(_messages("Hi"))
+    recorder.invoke(_messages("Call the tool"))
+    get_cassette.cache_clear()
+
+    chat_model_factory = _chat_model_factory([])
+    player = create_chat_model(
+        chat_model_factory, mode="replay", cassette_path=cassette_path, model="gpt")
+
+    assert player.invoke(_messages("Hi")).content == "Hello"
+    assert player.invoke(_messages("Call the tool")
+                         ).additional_kwargs == TOOL_CALL
+    assert chat_model_factory.built == []
+    assert get_cassette(cassette_path).stats() == {
+        "responses": 2, "hits": 2, "misses": 0}
+
+
+def test_recorded_responses_are_appended(cassette_path):
+    cassette = Cassette(cassette_path)
+    cassette.put("a", {"content": "First"})
+    cassette.put("b", {"content": "Second"})
+    cassette.put("a", {"content": "Again"})
+
+    with open(cassette_path) as f:
+        assert [json.loads(line)["key"] for line in f] == ["a", "b", "a"]
+    assert Cassette(cassette_path).responses == {
+        "a": {"content": "Again"}, "b": {"content": "Second"}}
+
+
+def test_truncated_last_response_is_skipped(cassette_path):
+    with open(cassette_path, "w") as f:
+        f.write('{"key": "a", "response": {"content": "First"}}\n{"key": "b", "resp')
+
+    cassette = Cassette(cassette_path)
+    cassette.put("c", {"content": "Third"})
+
+    assert Cassette(cassette_path).responses == {
+        "a": {"content": "First"}, "c": {"content": "Third"}}
+
+
+def test_replay_raises_on_requests_not_recorded(cassette_path):
+    player = create_chat_model(
+        _chat_model_factory([]), mode="replay", cassette_path=cassette_path, model="gpt")
+
+    with pytest.raises(CassetteMiss):
+        player.invoke(_messages())
+
+
+def test_auto_records_only_the_missing_responses(cassette_path):
+    chat_model_factory = _chat_model_factory(
+        [AIMessage(content="First"), AIMessage(content="Second")])
+    llm = create_chat_model(
+        chat_model_factory, mode="auto", cassette_path=cassette_path, model="gpt")
+
+    assert llm.invoke(_messages()).content == "First"
+    assert llm.invoke(_messages()).content == "First"
+    assert llm.invoke(_messages("Other")).content == "Second"
+    assert len(chat_model_factory.built) == 1
+
+
+def test_requests_differ_by_model_and_tools_but_not_by_datetime():
+    messages = [SystemMessage(
+        content="The current datetime is 2024-03-01 10:00:00.")]
+    same_messages = [SystemMessage(
+        content="The current datetime is 2025-07-12 18:30:59.")]
+
+    key = request_hash({"model": "gpt"}, messages)
+
+    assert request_hash({"model": "gpt"}, same_messages) == key
+    assert request_hash({"model": "gpt", "streaming": True}, messages) == key
+    assert request_hash({"model": "gpt-4"}, messages) != key
+    assert request_hash({"model": "gpt"}, messages, tools=[{"name": "Tool"}]) != key
+
+
+def test_requests_differ_by_messages_but_not_by_message_ids():
+    messages = [HumanMessage(content="Hi"), AIMessage(
+        content="Hello", id="run-1", response_metadata={"finish_reason": "stop"})]
+
+    key = request_hash({"model": "gpt"}, messages)
+
+    assert request_hash(
+        {"model": "gpt"}, [HumanMessage(content="Hi"), AIMessage(content="Hello", id="run-2")]) == key
+    assert request_hash(
+        {"model": "gpt"}, [HumanMessage(content="Hi"), AIMessage(content="Hi")]) != key
+
+
+def test_replay_injects_latency_and_streams_tokens(cassette_path):
+    _write_cassette(cassette_path, {request_hash({"model": "gpt"}, _messages()): {
+        "content": "Hello world, how are you?", "latency": 0.05}})
+    token_collector = TokenCollector()
+    llm = create_chat_model(
+        _chat_model_factory([]), mode="replay", cassette_path=cassette_path,
+        latency="recorded", model="gpt", streaming=True, callbacks=[token_collector])
+
+    start = time.perf_counter()
+    response = llm.invoke(_messages())
+
+    assert time.perf_counter() - start >= 0.05
+    assert response.content == "Hello world, how are you?"
+    assert len(token_collector.tokens) == 5
+    assert "".join(token_collector.tokens) == response.content
+
+
+def test_fixed_latency_overrides_the_recorded_one(cassette_path):
+    _write_cassette(cassette_path, {request_hash({"model": "gpt"}, _messages()): {
+        "content": "Hello", "latency": 10}})
+    llm = create_chat_model(
+        _chat_model_factory([]), mode="replay", cassette_path=cassette_path,
+        latency="0", model="gpt")
+
+    start = time.perf_counter()
+    llm.invoke(_messages())
+
+    assert isinstance(llm, CassetteChatModel)
+    assert time.perf_counter() - start < 1
+
+
+def test_invalid_mode():
+    with pytest.raises(ValueError):
+        create_chat_model(_chat_model_factory([]), mode="rewind")
@@ -0,0 +1,88 @@
+from unittest.mock import MagicMock, patch
+
+from langchain.agents.output_parsers.openai_tools import OpenAIToolAgentAction
+
+from converso_chatbot.conversational_engine.form_agent import \
+    ChatFormAgentExecutor
+from converso_chatbot.conversational_engine.form_agent import \
+    form_agent_executor
+from converso_chatbot.conversational_engine.turn_context import (
+    TurnContext, get_turn_context, use_turn_context)
+from converso_chatbot.tracing import SPAN_DURATIONS
+
+from .mocks import MockBaseTool
+
+
+def test_tools_are_read_from_turn_context():
+    default_tool = MockBaseTool()
+    turn_tool = MockBaseTool(name="TurnTool")
+    executor = ChatFormAgentExecutor(tools=[default_tool])
+    state = {"active_form_tool": None}
+
+    assert executor.get_tools(state) == [default_tool]
+
+    with use_turn_context(TurnContext(chat_id="1", tools=[turn_tool])):
+        assert executor.get_tools(state) == [turn_tool]
+        assert executor.get_tool_by_name("TurnTool", state) is turn_tool
+
+    assert get_turn_context() is None
+
+
+def test_tool_callbacks_are_read_from_turn_context():
+    on_tool_start = MagicMock()
+    tool_callback_handler = MagicMock()
+    tool = MockBaseTool()
+    executor = ChatFormAgentExecutor(on_tool_start=on_tool_start)
+
+    with use_turn_context(TurnContext(
+        chat_id="1",
+        tools=[tool],
+        tool_callback_handler=tool_callback_handler
+    )):
+        executor.on_tool_start(tool=tool, tool_input={})
+        executor.on_tool_end(tool=tool, tool_output="output")
+
+    tool_callback_handler.on_tool_start.assert_called_once_with(tool, {})
+    tool_callback_handler.on_tool_end.assert_called_once_with(tool, "output")
+    on_tool_start.assert_not_called()
+
+
+def test_models_call_the_answer_streamer_of_the_turn():
+    answer_streamer = MagicMock()
+    executor = ChatFormAgentExecutor(tools=[MockBaseTool()])
+    state = {"active_form_tool": None}
+
+    with patch.object(form_agent_executor.ModelFactory, "build_model") as build_model:
+        assert executor.build_model(state) is build_model.return_value
+
+        with use_turn_context(TurnContext(chat_id="1", tools=[], answer_streamer=answer_streamer)):
+            executor.build_model(state)
+
+    build_model.return_value.with_config.assert_called_once_with(
+        callbacks=[answer_streamer])
+
+
+def test_tool_runs_and_node_steps_are_traced():
+    SPAN_DURATIONS.clear()
+    tool = MockBaseTool()
+    executor = ChatFormAgentExecutor(tools=[tool])
+    action = OpenAIToolAgentAction(
+        tool="MockBaseTool", tool_input={}, log="", message_log=[], tool_call_id="call_1")
+
+    executor.call_tool({"agent_outcome": [action], "active_form_tool": None})
+
+    # MockBaseTool returns None, which the tool executor rejects: the node handles the error
+    assert SPAN_DURATIONS.count(("tool", "MockBaseTool", "error")) == 1
+    assert SPAN_DURATIONS.count(("graph_node", "tool", "ok")) == 1
+
+
+def test_tools_not_found_are_traced_as_invalid():
+    SPAN_DURATIONS.clear()
+    executor = ChatFormAgentExecutor(tools=[MockBaseTool()])
+    action = OpenAIToolAgentAction(
+        tool="Made up tool 42", tool_input={}, log="", message_log=[], tool_call_id="call_1")
+
+    executor.call_tool({"agent_outcome": [action], "active_form_tool": None})
+
+    assert SPAN_DURATIONS.count(("tool", "invalid", "ok")) == 1
+    assert not [labels for labels in SPAN_DURATIONS.series if labels[1] == "Made up tool 42"]
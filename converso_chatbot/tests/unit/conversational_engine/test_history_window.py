@@ -0,0 +1,81 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from converso_chatbot.conversational_engine.form_agent import history_window
+from converso_chatbot.conversational_engine.form_agent.history_window import (
+    MESSAGE_OVERHEAD_TOKENS, HistoryMetrics, count_message_tokens,
+    select_history)
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # One token every 4 characters, without loading the tokenizer
+    monkeypatch.setattr(history_window, "get_encoding", lambda: None)
+
+
+def _messages_and_token_counts(*contents):
+    messages = [
+        HumanMessage(content=content) if index % 2 == 0 else AIMessage(content=content)
+        for index, content in enumerate(contents)
+    ]
+    return messages, [count_message_tokens(message) for message in messages]
+
+
+def test_all_messages_fit_in_the_budget():
+    messages, token_counts = _messages_and_token_counts("a" * 40, "b" * 40)
+
+    selected, tokens = select_history(messages, token_counts, token_budget=100)
+
+    assert selected == messages
+    assert tokens == 2 * (10 + MESSAGE_OVERHEAD_TOKENS)
+
+
+def test_older_messages_are_dropped():
+    messages, token_counts = _messages_and_token_counts(
+        "a" * 40, "b" * 40, "c" * 40)
+
+    selected, tokens = select_history(messages, token_counts, token_budget=30)
+
+    assert selected == messages[1:]
+    assert tokens == 28
+
+
+def test_message_that_does_not_fit_is_truncated(monkeypatch):
+    monkeypatch.setattr(history_window, "MIN_TRUNCATED_MESSAGE_TOKENS", 10)
+    messages, token_counts = _messages_and_token_counts("a" * 4000, "b" * 40)
+
+    selected, tokens = select_history(messages, token_counts, token_budget=100)
+
+    assert len(selected) == 2
+    assert isinstance(selected[0], HumanMessage)
+    assert selected[0].content.endswith(history_window.TRUNCATION_MARKER)
+    assert selected[1] == messages[1]
+    assert tokens <= 100
+    # The stored message is not changed
+    assert messages[0].content == "a" * 4000
+
+
+def test_message_is_not_truncated_below_the_minimum(monkeypatch):
+    monkeypatch.setattr(history_window, "MIN_TRUNCATED_MESSAGE_TOKENS", 50)
+    messages, token_counts = _messages_and_token_counts("a" * 4000, "b" * 40)
+
+    selected, _ = select_history(messages, token_counts, token_budget=60)
+
+    assert selected == messages[1:]
+
+
+def test_history_metrics():
+    metrics = HistoryMetrics(token_budget=100)
+    metrics.record(history_tokens=10, prompt_tokens=200, completion_tokens=20)
+    metrics.record(history_tokens=30, prompt_tokens=400, completion_tokens=40)
+
+    assert metrics.stats() == {
+        "token_budget": 100,
+        "turns": 2,
+        "last_history_tokens": 30,
+        "avg_history_tokens": 20.0,
+        "last_prompt_tokens": 400,
+        "avg_prompt_tokens": 300.0,
+        "max_prompt_tokens": 400,
+        "avg_completion_tokens": 30.0
+    }
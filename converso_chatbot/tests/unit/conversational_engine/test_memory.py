@@ -0,0 +1,196 @@
+from unittest.mock import MagicMock
+
+import pytest
+from converso.conversational_engine.form_agent.form_tool import FormToolState
+
+from converso_chatbot.constants import RedisKeys
+from converso_chatbot.conversational_engine.form_agent import (
+    chat_history_key, get_stored_agent_state, memory, store_agent_state)
+from converso_chatbot.conversational_engine.form_agent.memory import \
+    StoredAgentState
+
+from .mocks import MockBaseTool, MockFormToolWithFields, MockRedis
+
+
+def _stored_agent_state_with_history(exchanges: int) -> StoredAgentState:
+    stored_agent_state = StoredAgentState()
+    for exchange in range(exchanges):
+        stored_agent_state.memory.save_context(
+            inputs={"messages": f"question {exchange}"},
+            outputs={"output": f"answer {exchange}"}
+        )
+    return stored_agent_state
+
+
+def test_messages_round_trip():
+    stored_agent_state = _stored_agent_state_with_history(3)
+
+    loaded = StoredAgentState.from_bytes(stored_agent_state.to_bytes())
+
+    assert loaded.memory.buffer == stored_agent_state.memory.buffer
+    assert loaded.active_form_tool is None
+
+
+def test_only_the_memory_window_is_stored():
+    stored_agent_state = _stored_agent_state_with_history(
+        memory.HISTORY_LENGTH + 5)
+
+    loaded = StoredAgentState.from_bytes(stored_agent_state.to_bytes())
+
+    assert len(loaded.memory.chat_memory.messages) == 2 * memory.HISTORY_LENGTH
+    assert loaded.memory.buffer == stored_agent_state.memory.buffer
+
+
+@pytest.mark.parametrize("enter_state, expected_state", [
+    ("enter_active_state", FormToolState.ACTIVE),
+    ("enter_filled_state", FormToolState.FILLED),
+])
+def test_active_form_tool_is_restored_on_the_turn_tool(enter_state, expected_state):
+    form_tool = MockFormToolWithFields()
+    form_tool.enter_active_state()
+    form_tool.update(age=30)
+    getattr(form_tool, enter_state)()
+    stored_agent_state = StoredAgentState(active_form_tool=form_tool)
+
+    turn_form_tool = MockFormToolWithFields()
+    loaded = StoredAgentState.from_bytes(
+        stored_agent_state.to_bytes(),
+        tools=[MockBaseTool(), turn_form_tool]
+    )
+
+    assert loaded.active_form_tool is turn_form_tool
+    assert turn_form_tool.state == expected_state
+    assert turn_form_tool.name == form_tool.name
+    assert turn_form_tool.form.age == 30
+
+
+def test_active_form_tool_is_discarded_when_not_available():
+    form_tool = MockFormToolWithFields()
+    form_tool.enter_active_state()
+    stored_agent_state = StoredAgentState(active_form_tool=form_tool)
+
+    loaded = StoredAgentState.from_bytes(
+        stored_agent_state.to_bytes(), tools=[MockBaseTool()])
+
+    assert loaded.active_form_tool is None
+
+
+def test_legacy_pickle_is_migrated():
+    form_tool = MockFormToolWithFields()
+    form_tool.enter_active_state()
+    form_tool.update(age=30)
+    stored_agent_state = _stored_agent_state_with_history(2)
+    stored_agent_state.active_form_tool = form_tool
+    pickled = stored_agent_state.to_pickle()
+
+    turn_form_tool = MockFormToolWithFields()
+    loaded = StoredAgentState.from_bytes(pickled, tools=[turn_form_tool])
+
+    assert loaded.memory.buffer == stored_agent_state.memory.buffer
+    assert loaded.active_form_tool is turn_form_tool
+    assert turn_form_tool.state == FormToolState.ACTIVE
+    assert turn_form_tool.form.age == 30
+
+
+def test_big_payloads_are_compressed():
+    pytest.importorskip("zstandard")
+    stored_agent_state = _stored_agent_state_with_history(10)
+
+    serialized = stored_agent_state.to_bytes()
+
+    assert serialized.startswith(memory._ZSTD_MAGIC)
+    assert StoredAgentState.from_bytes(
+        serialized).memory.buffer == stored_agent_state.memory.buffer
+
+
+def test_unsupported_version():
+    with pytest.raises(ValueError):
+        StoredAgentState.from_bytes(b'{"version":0,"messages":[]}')
+
+
+def test_store_appends_only_new_messages():
+    redis_client = MockRedis()
+    stored_agent_state = get_stored_agent_state(redis_client, "1")
+    stored_agent_state.memory.save_context(
+        inputs={"messages": "question 0"}, outputs={"output": "answer 0"})
+    store_agent_state(redis_client, "1", stored_agent_state)
+
+    stored_agent_state = get_stored_agent_state(redis_client, "1")
+    stored_agent_state.memory.save_context(
+        inputs={"messages": "question 1"}, outputs={"output": "answer 1"})
+    redis_client.rpush = MagicMock(wraps=redis_client.rpush)
+    store_agent_state(redis_client, "1", stored_agent_state)
+
+    assert len(redis_client.rpush.call_args.args[1:]) == 2
+    # One round trip to load and one to store
+    assert redis_client.executed_pipelines == 4
+    assert [message.content for message in get_stored_agent_state(
+        redis_client, "1").memory.buffer] == ["question 0", "answer 0", "question 1", "answer 1"]
+
+
+def test_history_list_is_capped_to_the_memory_window():
+    redis_client = MockRedis()
+    stored_agent_state = _stored_agent_state_with_history(
+        memory.HISTORY_LENGTH + 5)
+
+    store_agent_state(redis_client, "1", stored_agent_state)
+
+    assert len(redis_client.data[chat_history_key("1")]) == \
+        2 * memory.HISTORY_LENGTH
+
+
+def test_active_form_tool_is_stored_in_its_own_field():
+    redis_client = MockRedis()
+    form_tool = MockFormToolWithFields()
+    form_tool.enter_active_state()
+    form_tool.update(age=30)
+    store_agent_state(
+        redis_client, "1", StoredAgentState(active_form_tool=form_tool))
+
+    turn_form_tool = MockFormToolWithFields()
+    loaded = get_stored_agent_state(redis_client, "1", tools=[turn_form_tool])
+    assert loaded.active_form_tool is turn_form_tool
+    assert turn_form_tool.form.age == 30
+
+    loaded.active_form_tool = None
+    store_agent_state(redis_client, "1", loaded)
+    assert RedisKeys.ACTIVE_FORM_TOOL.value not in redis_client.data["1"]
+
+
+def test_legacy_agent_state_is_migrated_to_the_history_list():
+    redis_client = MockRedis()
+    legacy_agent_state = _stored_agent_state_with_history(2)
+    redis_client.hset(
+        "1", RedisKeys.AGENT_STATE.value, legacy_agent_state.to_pickle())
+
+    stored_agent_state = get_stored_agent_state(redis_client, "1")
+    store_agent_state(redis_client, "1", stored_agent_state)
+
+    assert RedisKeys.AGENT_STATE.value not in redis_client.data["1"]
+    assert get_stored_agent_state(redis_client, "1").memory.buffer == \
+        legacy_agent_state.memory.buffer
+
+
+def test_token_counts_are_stored_with_the_messages(monkeypatch):
+    redis_client = MockRedis()
+    stored_agent_state = _stored_agent_state_with_history(2)
+    store_agent_state(redis_client, "1", stored_agent_state)
+
+    count_message_tokens = MagicMock(side_effect=AssertionError)
+    monkeypatch.setattr(memory, "count_message_tokens", count_message_tokens)
+    loaded = get_stored_agent_state(redis_client, "1")
+    chat_history, tokens = loaded.history()
+
+    assert chat_history == stored_agent_state.memory.buffer
+    assert loaded.token_counts == stored_agent_state.token_counts
+    assert tokens == sum(stored_agent_state.token_counts)
+
+
+def test_google_credentials_are_loaded_with_the_state():
+    redis_client = MockRedis()
+    redis_client.hset("1", RedisKeys.GOOGLE_CREDENTIALS.value, b"credentials")
+
+    loaded = get_stored_agent_state(redis_client, "1")
+
+    assert loaded.google_credentials == b"credentials"
+    assert redis_client.executed_pipelines == 1
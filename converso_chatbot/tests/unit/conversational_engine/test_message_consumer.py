@@ -0,0 +1,80 @@
+import asyncio
+import operator
+import time
+from typing import Annotated, TypedDict
+
+from langgraph.graph import END, StateGraph
+
+from converso_chatbot.conversational_engine.message_consumer import \
+    astream_graph
+
+
+class _CounterState(TypedDict):
+    counter: Annotated[int, operator.setitem]
+
+
+def _slow_increment(state: _CounterState):
+    time.sleep(0.05)
+    return {"counter": state["counter"] + 1}
+
+
+def _build_app():
+    graph = StateGraph(_CounterState)
+    graph.add_node("first", _slow_increment)
+    graph.add_node("second", _slow_increment)
+    graph.add_edge("first", "second")
+    graph.add_edge("second", END)
+    graph.set_entry_point("first")
+    return graph.compile()
+
+
+class _SyncOnlyApp:
+    """A graph that exposes only the synchronous streaming API"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def stream(self, inputs, config):
+        return self.app.stream(inputs, config=config)
+
+
+def _collect_outputs_and_ticks(app):
+    async def main():
+        ticks = 0
+        done = asyncio.Event()
+
+        async def ticker():
+            nonlocal ticks
+            while not done.is_set():
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        ticker_task = asyncio.create_task(ticker())
+        outputs = [
+            output async for output in astream_graph(
+                app, {"counter": 0}, config={"recursion_limit": 25})
+        ]
+        done.set()
+        await ticker_task
+        return outputs, ticks
+
+    return asyncio.run(main())
+
+
+def test_astream_graph_does_not_block_event_loop():
+    outputs, ticks = _collect_outputs_and_ticks(_build_app())
+
+    assert outputs[-1] == {END: {"counter": 2}}
+    # The loop kept running while the nodes were sleeping
+    assert ticks > 5
+
+
+def test_astream_graph_falls_back_to_sync_stream():
+    outputs, ticks = _collect_outputs_and_ticks(_SyncOnlyApp(_build_app()))
+
+    assert outputs == [
+        {"first": {"counter": 1}},
+        {"second": {"counter": 2}},
+        {END: {"counter": 2}}
+    ]
+    assert ticks > 5
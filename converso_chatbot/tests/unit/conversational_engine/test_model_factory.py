@@ -0,0 +1,58 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import \
+    FakeMessagesListChatModel
+
+from converso_chatbot.conversational_engine.form_agent import model_factory
+from converso_chatbot.conversational_engine.form_agent.model_factory import \
+    ModelFactory
+
+from .mocks import MockBaseTool, MockFormToolWithFields
+
+
+@pytest.fixture(autouse=True)
+def fake_chat_openai(monkeypatch):
+    monkeypatch.setattr(
+        model_factory,
+        "ChatOpenAI",
+        lambda **kwargs: FakeMessagesListChatModel(responses=[])
+    )
+    ModelFactory.llm_cache.clear()
+    ModelFactory.agent_cache.clear()
+
+
+def test_build_llm_reuses_clients():
+    llm = ModelFactory.build_llm()
+
+    assert ModelFactory.build_llm() is llm
+    assert ModelFactory.build_llm("MockBaseTool") is not llm
+    assert ModelFactory.cache_stats()["llm"]["hits"] == 1
+    assert ModelFactory.cache_stats()["llm"]["misses"] == 2
+
+
+def test_build_model_reuses_agents_for_same_tools_and_prompt():
+    state = {"active_form_tool": None}
+    tools = [MockBaseTool(), MockFormToolWithFields()]
+
+    model = ModelFactory.build_model(state, tools)
+
+    assert ModelFactory.build_model(state, tools) is model
+    # Equivalent tools of another turn share the agent
+    assert ModelFactory.build_model(
+        state, [MockBaseTool(), MockFormToolWithFields()]) is model
+    assert ModelFactory.build_model(state, tools[:1]) is not model
+    assert ModelFactory.build_model(
+        {**state, "error": "error"}, tools) is not model
+    assert ModelFactory.cache_stats()["agent"]["hits"] == 2
+    # The LLM client is shared by the three agents
+    assert ModelFactory.cache_stats()["llm"]["misses"] == 1
+
+
+def test_build_model_distinguishes_form_tool_states():
+    state = {"active_form_tool": None}
+    inactive_form_tool = MockFormToolWithFields()
+    active_form_tool = MockFormToolWithFields()
+    active_form_tool.enter_active_state()
+
+    model = ModelFactory.build_model(state, [inactive_form_tool])
+
+    assert ModelFactory.build_model(state, [active_form_tool]) is not model
@@ -0,0 +1,96 @@
+import pickle
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+from converso_chatbot.conversational_engine.tools.google import credentials
+from converso_chatbot.conversational_engine.tools.google.credentials import (
+    get_google_credentials, invalidate_google_credentials)
+from converso_chatbot.conversational_engine.turn_context import (
+    TurnContext, use_turn_context)
+
+
+@pytest.fixture(autouse=True)
+def redis_client():
+    credentials.credentials_cache.clear()
+    with patch.object(credentials, "get_redis_client") as get_redis_client:
+        yield get_redis_client.return_value
+
+
+def _serialized_credentials(token: str = "token", **kwargs) -> bytes:
+    return pickle.dumps(Credentials(token=token, **kwargs))
+
+
+def test_credentials_prefetched_in_the_turn_context(redis_client):
+    turn_context = TurnContext(
+        chat_id="1",
+        tools=[],
+        google_credentials=_serialized_credentials()
+    )
+    with use_turn_context(turn_context):
+        assert get_google_credentials("1").token == "token"
+
+    redis_client.hget.assert_not_called()
+
+
+def test_credentials_read_from_redis_outside_of_the_turn(redis_client):
+    redis_client.hget.return_value = _serialized_credentials()
+    with use_turn_context(TurnContext(chat_id="2", tools=[])):
+        assert get_google_credentials("1").token == "token"
+
+
+def test_missing_credentials(redis_client):
+    redis_client.hget.return_value = None
+    with pytest.raises(ValueError):
+        get_google_credentials("1")
+
+
+def test_credentials_are_cached(redis_client):
+    redis_client.hget.return_value = _serialized_credentials()
+
+    first = get_google_credentials("1")
+
+    assert get_google_credentials("1") is first
+    redis_client.hget.assert_called_once()
+
+    invalidate_google_credentials("1")
+    assert get_google_credentials("1") is not first
+
+
+def test_cached_credentials_expire(redis_client):
+    redis_client.hget.return_value = _serialized_credentials()
+    first = get_google_credentials("1")
+
+    credentials.credentials_cache.get("1").expires_at = 0
+
+    assert get_google_credentials("1") is not first
+
+
+def test_cached_credentials_are_replaced_by_new_prefetched_ones():
+    with use_turn_context(TurnContext(
+        chat_id="1", tools=[], google_credentials=_serialized_credentials("old"))):
+        assert get_google_credentials("1").token == "old"
+
+    with use_turn_context(TurnContext(
+        chat_id="1", tools=[], google_credentials=_serialized_credentials("new"))):
+        assert get_google_credentials("1").token == "new"
+
+
+def test_expired_access_token_is_refreshed_and_stored(redis_client):
+    redis_client.hget.return_value = _serialized_credentials(
+        refresh_token="refresh_token",
+        expiry=datetime.utcnow() - timedelta(hours=1)
+    )
+
+    def refresh(self, request):
+        self.token = "refreshed"
+        self.expiry = datetime.utcnow() + timedelta(hours=1)
+
+    with patch.object(Credentials, "refresh", refresh):
+        assert get_google_credentials("1").token == "refreshed"
+        assert get_google_credentials("1").token == "refreshed"
+
+    redis_client.hset.assert_called_once()
+    assert pickle.loads(redis_client.hset.call_args.args[2]).token == "refreshed"
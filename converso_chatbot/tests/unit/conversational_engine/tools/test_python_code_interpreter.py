@@ -0,0 +1,116 @@
+import os
+from unittest.mock import patch
+
+import pytest
+
+from converso_chatbot.conversational_engine.tools import python_code_interpreter
+from converso_chatbot.conversational_engine.tools.python_code_interpreter import \
+    PythonCodeInterpreter
+from converso_chatbot.conversational_engine.tools.python_sandbox import \
+    SandboxPool
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = SandboxPool(workers=1, cpu_time=1, timeout=3,
+                       memory_limit_mb=256, preloaded_modules=["math"])
+    yield pool
+    pool.close()
+
+
+def test_result(pool):
+    with patch.object(python_code_interpreter, "get_sandbox_pool", return_value=pool):
+        assert PythonCodeInterpreter().run(
+            {"code": "import math\nresult = math.sqrt(25)"}) == "5.0"
+
+
+def test_missing_result(pool):
+    with pytest.raises(ValueError, match="variable called result"):
+        pool.run("a = 1")
+
+
+def test_errors_are_reported(pool):
+    with pytest.raises(ValueError, match="ZeroDivisionError"):
+        pool.run("result = 1 / 0")
+
+
+def test_printed_output_is_discarded(pool):
+    assert pool.run("print('hello')\nresult = 'ok'") == "ok"
+
+
+def test_cpu_time_limit(pool):
+    with pytest.raises(ValueError, match="CPU time"):
+        pool.run("while True: pass")
+
+    assert pool.run("result = 'ok'") == "ok"
+    assert pool.replaced_workers >= 1
+
+
+def test_memory_limit(pool):
+    with pytest.raises(ValueError, match="Memory limit"):
+        pool.run("x = bytearray(1024 * 1024 * 1024)")
+
+    assert pool.run("result = 'ok'") == "ok"
+
+
+def test_timeout(pool):
+    with pytest.raises(ValueError, match="did not complete"):
+        pool.run("import time\ntime.sleep(10)")
+
+    assert pool.run("result = 'ok'") == "ok"
+
+
+def test_exited_worker_is_replaced(pool):
+    with pytest.raises(ValueError, match="terminated"):
+        pool.run("import os\nos._exit(1)")
+
+    assert pool.run("result = 'ok'") == "ok"
+
+
+def test_partial_reply_written_by_the_code_times_out(pool):
+    # The reply pipe is the fd 1 duplicated by the worker: the first fd above the standard ones
+    code = "import os, time\nfor fd in range(3, 16):\n    try:\n        os.write(fd, b'{')\n    except OSError:\n        pass\ntime.sleep(10)"
+    with pytest.raises(ValueError, match="did not complete"):
+        pool.run(code)
+
+    assert pool.run("result = 'ok'") == "ok"
+
+
+def test_lines_written_by_the_code_retire_the_worker(pool):
+    replaced_workers = pool.replaced_workers
+    code = "import os\nfor fd in range(3, 16):\n    try:\n        os.write(fd, b'{\"result\": \"forged\"}\\n')\n    except OSError:\n        pass\nresult = 'ok'"
+    with pytest.raises(ValueError):
+        pool.run(code)
+
+    assert pool.run("result = 'ok'") == "ok"
+    assert pool.replaced_workers == replaced_workers + 1
+
+
+def test_environment_is_not_inherited(pool):
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "secret"}):
+        pool = SandboxPool(workers=1)
+    try:
+        assert "OPENAI_API_KEY" not in pool.run(
+            "import os\nresult = str(dict(os.environ))")
+    finally:
+        pool.close()
+
+
+@pytest.mark.skipif(os.geteuid() != 0, reason="Privileges are dropped by root only")
+def test_chatbot_environment_is_not_readable(pool):
+    with patch.dict(os.environ, {"SECRET_KEY_TEST": "hunter2"}):
+        pool = SandboxPool(workers=1)
+    try:
+        with pytest.raises(ValueError, match="PermissionError"):
+            pool.run(
+                "import os\nresult = open(f'/proc/{os.getppid()}/environ').read()")
+    finally:
+        pool.close()
+
+
+@pytest.mark.skipif(os.geteuid() != 0, reason="Privileges are dropped by root only")
+def test_workers_drop_privileges(pool):
+    assert pool.run("import os\nresult = (os.getuid(), os.getgid(), os.getgroups())") == \
+        "(65534, 65534, [])"
+    with pytest.raises(ValueError, match="PermissionError"):
+        pool.run("import os\nos.kill(os.getppid(), 0)")
@@ -0,0 +1,109 @@
+import pytest
+
+from converso_chatbot.helpers import HtmlProcessor, LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_lru_cache_get_or_create_counts_hits_and_misses():
+    cache = LRUCache(maxsize=2)
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return "value"
+
+    assert cache.get_or_create("key", factory) == "value"
+    assert cache.get_or_create("key", factory) == "value"
+
+    assert len(calls) == 1
+    assert cache.stats() == {
+        "size": 1,
+        "maxsize": 2,
+        "hits": 1,
+        "misses": 1,
+        "hit_rate": 0.5
+    }
+
+
+def test_lru_cache_invalid_maxsize():
+    with pytest.raises(ValueError):
+        LRUCache(maxsize=0)
+
+
+def test_clear_html_skips_boilerplate():
+    html = """
+    <html><head><title>Title</title><style>p { color: red; }</style></head>
+    <body>
+        <nav><a href="/">Home</a></nav>
+        <script>var tracking = 1;</script>
+        <p>First <b>paragraph</b></p><div>Second&nbsp;line<br>Third line</div>
+        <footer>Copyright</footer>
+    </body></html>
+    """
+    assert HtmlProcessor.clear_html(html) == "First paragraph\nSecond line\nThird line"
+
+
+def test_clear_html_prefers_main_content():
+    html = """
+    <body>
+        <div class="sidebar">Related posts</div>
+        <article><h1>Headline</h1><p>Article body</p></article>
+    </body>
+    """
+    assert HtmlProcessor.clear_html(html) == "Headline\nArticle body"
+
+
+def test_clear_html_main_region_ends_with_its_element():
+    html = """
+    <body>
+        <div role="main"><p>Main body</p><div>Nested block</div></div>
+        <div class="links">Unrelated links</div>
+    </body>
+    """
+    assert HtmlProcessor.clear_html(html) == "Main body\nNested block"
+
+
+def test_clear_html_ignores_short_main_content():
+    paragraphs = "".join(f"<p>Paragraph {i} of the page</p>" for i in range(50))
+    html = f"""
+    <body>
+        {paragraphs}
+        <article><a href="/other">Teaser of another article</a></article>
+    </body>
+    """
+    text = HtmlProcessor.clear_html(html)
+
+    assert text.startswith("Paragraph 0 of the page")
+    assert text.endswith("Teaser of another article")
+
+
+def test_clear_html_truncates_to_max_length():
+    html = "<p>" + "word " * 10_000 + "</p>"
+
+    text = HtmlProcessor.clear_html(html, max_length=100)
+
+    assert len(text) <= 100 + len(" [...]")
+    assert text.endswith("word [...]")
+
+
+def test_clear_html_is_memoized():
+    HtmlProcessor.cache.clear()
+    html = "<p>Memoized</p>"
+
+    assert HtmlProcessor.clear_html(html) == "Memoized"
+    assert HtmlProcessor.clear_html(html) == "Memoized"
+
+    assert HtmlProcessor.cache.stats()["hits"] == 1
@@ -0,0 +1,141 @@
+import logging
+import threading
+from contextvars import copy_context
+
+import pytest
+from langchain_core.language_models.fake_chat_models import \
+    FakeMessagesListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from converso_chatbot import tracing
+from converso_chatbot.tracing import (SPAN_DURATIONS, Histogram,
+                                      LLMCallTracer, render_metrics, span,
+                                      start_span, use_trace_attributes)
+
+
+@pytest.fixture(autouse=True)
+def clear_span_durations():
+    SPAN_DURATIONS.clear()
+    yield
+    SPAN_DURATIONS.clear()
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("duration_seconds", "Duration",
+                          ("span",), buckets=(0.1, 1))
+
+    histogram.observe(("load",), 0.05)
+    histogram.observe(("load",), 0.5)
+    histogram.observe(("load",), 5)
+
+    assert histogram.render().splitlines() == [
+        "# HELP duration_seconds Duration",
+        "# TYPE duration_seconds histogram",
+        'duration_seconds_bucket{span="load",le="0.1"} 1',
+        'duration_seconds_bucket{span="load",le="1"} 2',
+        'duration_seconds_bucket{span="load",le="+Inf"} 3',
+        'duration_seconds_sum{span="load"} 5.55',
+        'duration_seconds_count{span="load"} 3'
+    ]
+
+
+def test_histogram_escapes_label_values():
+    histogram = Histogram("duration_seconds", "Duration", ("target",))
+
+    histogram.observe(('say "hi"\n',), 0.1)
+
+    assert 'target="say \\"hi\\"\\n"' in histogram.render()
+
+
+def test_spans_are_observed_by_outcome():
+    with span("state_load"):
+        pass
+    with pytest.raises(ValueError):
+        with span("tool", "GoogleSearch"):
+            raise ValueError("failed")
+
+    assert SPAN_DURATIONS.count(("state_load", "", "ok")) == 1
+    assert SPAN_DURATIONS.count(("tool", "GoogleSearch", "error")) == 1
+    assert 'converso_span_duration_seconds_count{span="tool",target="GoogleSearch",outcome="error"} 1' \
+        in render_metrics()
+
+
+def test_spans_have_the_attributes_of_the_turn():
+    with use_trace_attributes(chat_id="1", turn_id="a"):
+        started_span = start_span("publish", "converso_out", size=3)
+    started_span.end()
+
+    assert started_span.attributes == {
+        "chat_id": "1", "turn_id": "a", "size": 3}
+    assert start_span("publish").attributes == {}
+
+
+def test_turn_attributes_are_only_formatted_when_debugging(caplog):
+    with caplog.at_level(logging.INFO, logger="converso_chatbot.tracing"):
+        with use_trace_attributes(chat_id="1"), span("turn"):
+            pass
+    assert caplog.records == []
+
+    with caplog.at_level(logging.DEBUG, logger="converso_chatbot.tracing"):
+        with use_trace_attributes(chat_id="1"), span("turn"):
+            pass
+    assert "'chat_id': '1'" in caplog.records[0].getMessage()
+
+
+def test_llm_calls_are_observed():
+    llm = FakeMessagesListChatModel(
+        responses=[AIMessage(content="Hello")], callbacks=[LLMCallTracer()])
+
+    llm.invoke([HumanMessage(content="Hi")])
+
+    llm_calls = [
+        labels for labels in SPAN_DURATIONS.series if labels[0] == "llm_call"]
+    assert len(llm_calls) == 1
+    assert llm_calls[0][2] == "ok"
+    assert SPAN_DURATIONS.count(llm_calls[0]) == 1
+
+
+class RecordingTracer:
+    """OpenTelemetry tracer recording the name of the parent of every span started"""
+
+    def __init__(self, otel_trace):
+        self.otel_trace = otel_trace
+        self.parents = {}
+        self.next_id = 1
+
+    def start_span(self, name, context=None, attributes=None, **kwargs):
+        parent = self.otel_trace.get_current_span(context)
+        self.parents[name] = getattr(parent, "name", None)
+        otel_span = self.otel_trace.NonRecordingSpan(self.otel_trace.SpanContext(
+            trace_id=1, span_id=self.next_id, is_remote=False))
+        otel_span.name = name
+        self.next_id += 1
+        return otel_span
+
+
+@pytest.fixture
+def recording_tracer(monkeypatch):
+    otel_trace = pytest.importorskip("opentelemetry.trace")
+    recording_tracer = RecordingTracer(otel_trace)
+    monkeypatch.setattr(tracing, "_tracer", recording_tracer)
+    return recording_tracer
+
+
+def test_opentelemetry_spans_are_children_of_the_enclosing_span(recording_tracer):
+    with span("turn"):
+        with span("graph_node", "agent"):
+            # The LLM calls run in the threads of the executor, with the context of the node
+            thread = threading.Thread(target=copy_context().run, args=(
+                lambda: start_span("llm_call").end(),))
+            thread.start()
+            thread.join()
+        start_span("publish").end()
+    start_span("state_load").end()
+
+    assert recording_tracer.parents == {
+        "converso.turn": None,
+        "converso.graph_node": "converso.turn",
+        "converso.llm_call": "converso.graph_node",
+        "converso.publish": "converso.turn",
+        "converso.state_load": None
+    }
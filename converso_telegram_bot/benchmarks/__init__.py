@@ -0,0 +1,8 @@
+"""
+Benchmarks for the Telegram bot hot paths.
+
+They run against local stand-ins of Telegram and of the other services, so they
+don't need a network connection. Run them from the converso_telegram_bot folder, e.g.:
+
+    python -m benchmarks.bench_delivery_scheduler
+"""
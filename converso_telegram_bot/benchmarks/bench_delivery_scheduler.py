@@ -0,0 +1,223 @@
+"""
+Load test of the delivery of the Converso messages to Telegram, against a fake Bot that
+enforces the Telegram flood limits (RetryAfter beyond about 30 messages per second overall
+and one per second in a chat, with a small burst).
+
+A burst of turns is processed by the previous inline processor, which awaits every Telegram
+call while consuming the queue, and by the ConversoProcessor with the DeliveryScheduler.
+For each, it reports how long the queue consumer was busy, when the last message was
+delivered, the Telegram calls and the messages rejected or lost, and in how many chats
+the user ends up seeing the complete answer.
+
+    python -m benchmarks.bench_delivery_scheduler --chats 30 --deltas 8
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import math
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
+
+from converso_telegram_bot.constants import Emojis, MessageType
+from converso_telegram_bot.consumer import ConversoProcessor
+from converso_telegram_bot.delivery_scheduler import (DeliveryScheduler,
+                                                      TokenBucket)
+
+TOOLS = ["Searching on Google", "Reading the calendar"]
+# Limits enforced by the fake Bot: messages per second, and burst, overall and in a chat
+GLOBAL_RATE, GLOBAL_BURST = 30, 30
+CHAT_RATE, CHAT_BURST = 1, 3
+
+
+class FakeBot:
+    """Telegram stand-in: answers after latency seconds, raising RetryAfter beyond the limits"""
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self.chat_buckets = defaultdict(
+            lambda: TokenBucket(CHAT_RATE, CHAT_BURST))
+        self.message_ids = itertools.count(1)
+        # Text of the messages shown in each chat, by message id
+        self.messages: Dict[str, Dict[int, str]] = defaultdict(dict)
+        self.calls = 0
+        self.rejected = 0
+        self.last_delivery_at = 0.0
+
+    async def send_message(self, chat_id: str, text: str, parse_mode: Optional[str] = None):
+        await self._call(chat_id)
+        message_id = next(self.message_ids)
+        self.messages[chat_id][message_id] = text
+        return SimpleNamespace(message_id=message_id)
+
+    async def edit_message_text(
+        self,
+        chat_id: str,
+        message_id: int,
+        text: str,
+        parse_mode: Optional[str] = None
+    ):
+        await self._call(chat_id)
+        if self.messages[chat_id].get(message_id) == text:
+            raise BadRequest("Message is not modified")
+        self.messages[chat_id][message_id] = text
+
+    async def _call(self, chat_id: str) -> None:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        delay = max(self.chat_buckets[chat_id].delay(),
+                    self.global_bucket.delay())
+        if delay > 0:
+            self.rejected += 1
+            raise RetryAfter(math.ceil(delay))
+        self.chat_buckets[chat_id].take()
+        self.global_bucket.take()
+        self.last_delivery_at = time.perf_counter()
+
+
+class AsyncRedisStandIn:
+    """The redis hash commands used by the ConversoProcessor"""
+
+    def __init__(self) -> None:
+        self.hashes = defaultdict(dict)
+
+    async def hset(self, name, key, value):
+        self.hashes[name][key] = value
+
+    async def hget(self, name, key):
+        return self.hashes[name].get(key)
+
+    async def hdel(self, name, key):
+        self.hashes[name].pop(key, None)
+
+
+class InlineProcessor:
+    """
+    The previous processor: every Telegram call is awaited while consuming the queue, and
+    the edits of a streamed answer are skipped within a second of the previous one.
+    """
+
+    def __init__(self, bot: FakeBot) -> None:
+        self.bot = bot
+        self.tool_start_messages = {}
+        self.streamed_answers = {}
+
+    async def on_message_callback(self, message: dict) -> None:
+        chat_id = message["chat_id"]
+        if message["type"] == MessageType.TOOL_START.value:
+            sent_message = await self.bot.send_message(
+                chat_id, f"{Emojis.LOADING.value} {message['content']}", ParseMode.HTML)
+            self.tool_start_messages[chat_id] = (
+                message["content"], sent_message.message_id)
+        elif message["type"] == MessageType.TOOL_END.value:
+            content, message_id = self.tool_start_messages.pop(chat_id)
+            await self.bot.edit_message_text(
+                chat_id, message_id, f"{Emojis.DONE.value} {content}", ParseMode.HTML)
+        elif message["type"] == MessageType.TEXT_DELTA.value:
+            streamed_answer = self.streamed_answers.setdefault(
+                chat_id, {"text": "", "message_id": None, "sent_at": 0.0})
+            streamed_answer["text"] += message["content"]
+            if streamed_answer["message_id"] is None:
+                streamed_answer["sent_at"] = time.monotonic()
+                sent_message = await self.bot.send_message(chat_id, streamed_answer["text"])
+                streamed_answer["message_id"] = sent_message.message_id
+            elif time.monotonic() - streamed_answer["sent_at"] >= 1.0:
+                streamed_answer["sent_at"] = time.monotonic()
+                await self.bot.edit_message_text(
+                    chat_id, streamed_answer["message_id"], streamed_answer["text"])
+        else:
+            streamed_answer = self.streamed_answers.pop(chat_id, None)
+            if streamed_answer and streamed_answer["message_id"] is not None:
+                await self.bot.edit_message_text(
+                    chat_id, streamed_answer["message_id"], message["content"], ParseMode.HTML)
+            else:
+                await self.bot.send_message(chat_id, message["content"], ParseMode.HTML)
+
+
+def build_turns(chats: int, deltas: int) -> List[dict]:
+    """The messages of a turn in every chat, interleaved as the chatbot workers publish them"""
+    turns = []
+    for chat in range(chats):
+        chat_id = str(chat)
+        messages = []
+        for tool in TOOLS:
+            messages.append({"chat_id": chat_id, "type": MessageType.TOOL_START.value,
+                             "content": tool})
+            messages.append({"chat_id": chat_id, "type": MessageType.TOOL_END.value})
+        for delta in range(deltas):
+            messages.append({"chat_id": chat_id, "type": MessageType.TEXT_DELTA.value,
+                             "stream_id": f"stream-{chat_id}", "content": f"part {delta} "})
+        messages.append({"chat_id": chat_id, "type": MessageType.TEXT.value,
+                         "stream_ids": [f"stream-{chat_id}"], "content": answer(chat_id, deltas)})
+        turns.append(messages)
+    return [message for step in itertools.zip_longest(*turns) for message in step if message]
+
+
+def answer(chat_id: str, deltas: int) -> str:
+    return "".join(f"part {delta} " for delta in range(deltas)) + f"(chat {chat_id})"
+
+
+async def run(name: str, chats: int, deltas: int, latency: float) -> dict:
+    bot = FakeBot(latency)
+    scheduler = None
+    if name == "inline":
+        processor = InlineProcessor(bot)
+    else:
+        scheduler = DeliveryScheduler(bot)
+        processor = ConversoProcessor(bot, delivery_scheduler=scheduler)
+        processor.redis_client = AsyncRedisStandIn()
+
+    # The RabbitMQ consumer processes the messages one at a time, and drops the ones that fail
+    lost = 0
+    start = time.perf_counter()
+    for message in build_turns(chats, deltas):
+        try:
+            await processor.on_message_callback(message)
+        except Exception:
+            lost += 1
+    consumed_at = time.perf_counter()
+    if scheduler:
+        await scheduler.join()
+        lost += scheduler.counters["failed"]
+
+    expected = {f"{Emojis.DONE.value} {tool}" for tool in TOOLS}
+    complete_chats = sum(
+        set(bot.messages[str(chat)].values()) == expected | {
+            answer(str(chat), deltas)}
+        for chat in range(chats)
+    )
+    return {
+        "processor": name,
+        "messages": chats * (2 * len(TOOLS) + deltas + 1),
+        "consumer_busy_s": round(consumed_at - start, 2),
+        "last_delivery_s": round(max(bot.last_delivery_at - start, 0), 2),
+        "telegram_calls": bot.calls,
+        "rejected_429": bot.rejected,
+        "lost": lost,
+        "complete_chats": f"{complete_chats}/{chats}"
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chats", type=int, default=30)
+    parser.add_argument("--deltas", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.01,
+                        help="Seconds of each Telegram call")
+    args = parser.parse_args()
+
+    # The rejected calls are reported in the results
+    logging.disable(logging.ERROR)
+    for name in ("inline", "scheduler"):
+        print(asyncio.run(run(name, args.chats, args.deltas, args.latency)))
+
+
+if __name__ == "__main__":
+    main()
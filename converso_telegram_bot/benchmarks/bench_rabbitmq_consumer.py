@@ -0,0 +1,185 @@
+"""
+Compares the delivery throughput of the RabbitMQConsumer, processing the chats concurrently
+and acking in batches, with the previous consumer holding a lock around every message,
+against a local stand-in of the queue.
+
+Every message takes --latency seconds to be processed (the Telegram and redis calls).
+In the second run, the messages of a slow chat take --slow-latency. A few messages are
+not valid JSON and are dead-lettered.
+
+    python -m benchmarks.bench_rabbitmq_consumer --messages 2000 --chats 50
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+from converso_telegram_bot.clients.rabbitmq import RabbitMQConsumer
+
+SLOW_CHAT_ID = "slow"
+# One message in POISON_EVERY is not valid JSON
+POISON_EVERY = 500
+
+
+class LockedConsumer:
+    """The previous consumer: one message at a time, each acked on its own"""
+
+    def __init__(self, on_message_callback, queue_name: str):
+        self.on_message_callback = on_message_callback
+        self.queue_name = queue_name
+        self.lock = asyncio.Lock()
+
+    async def on_message(self, message):
+        async with message.process():
+            async with self.lock:
+                body = json.loads(message.body.decode())
+                await self.on_message_callback(body)
+
+
+class _IncomingMessageStandIn:
+
+    def __init__(self, queue: "QueueStandIn", body: bytes, delivery_tag: int):
+        self.queue = queue
+        self.body = body
+        self.delivery_tag = delivery_tag
+
+    async def ack(self, multiple: bool = False):
+        self.queue.settle(self.delivery_tag, multiple)
+
+    async def reject(self, requeue: bool = False):
+        self.queue.settle(self.delivery_tag, multiple=False)
+
+    @asynccontextmanager
+    async def process(self):
+        try:
+            yield
+        except Exception:
+            await self.reject()
+        else:
+            await self.ack()
+
+
+class _ExchangeStandIn:
+
+    def __init__(self):
+        self.published: Dict[str, List] = {}
+
+    async def publish(self, message, routing_key: str):
+        self.published.setdefault(routing_key, []).append(message)
+
+
+class QueueStandIn:
+    """
+    Delivers the messages to the consumer callback, each in its own task as aio_pika does,
+    while fewer than prefetch_count of them are not acked. Counts the ack frames.
+    """
+
+    def __init__(self, bodies: List[bytes], prefetch_count: int):
+        self.bodies = bodies
+        self.prefetch_count = prefetch_count
+        self.not_acked: Dict[int, bool] = {}
+        self.settled = 0
+        self.ack_frames = 0
+        self.window = asyncio.Semaphore(prefetch_count)
+        self.done = asyncio.Event()
+        self.default_exchange = _ExchangeStandIn()
+
+    async def consume(self, callback):
+        for delivery_tag, body in enumerate(self.bodies, start=1):
+            await self.window.acquire()
+            self.not_acked[delivery_tag] = True
+            asyncio.create_task(callback(
+                _IncomingMessageStandIn(self, body, delivery_tag)))
+        await self.done.wait()
+
+    def settle(self, delivery_tag: int, multiple: bool):
+        self.ack_frames += 1
+        tags = [tag for tag in self.not_acked if tag <= delivery_tag] \
+            if multiple else [delivery_tag]
+        for tag in tags:
+            del self.not_acked[tag]
+            self.window.release()
+        self.settled += len(tags)
+        if self.settled == len(self.bodies):
+            self.done.set()
+
+
+def build_messages(messages: int, chats: int) -> List[bytes]:
+    bodies = []
+    for i in range(messages):
+        if i % POISON_EVERY == POISON_EVERY - 1:
+            bodies.append(b"{not json")
+            continue
+        chat_id = SLOW_CHAT_ID if i % chats == 0 else str(i % chats)
+        bodies.append(json.dumps(
+            {"chat_id": chat_id, "type": "TEXT", "content": f"message {i}"}).encode())
+    return bodies
+
+
+async def run(name: str, messages: int, chats: int, prefetch_count: int,
+              latency: float, slow_latency: float) -> dict:
+    bodies = build_messages(messages, chats)
+    queue = QueueStandIn(bodies, prefetch_count)
+    fast_messages = sum(SLOW_CHAT_ID.encode() not in body and body.startswith(b"{\"")
+                        for body in bodies)
+    fast_processed = 0
+    fast_done_at = None
+    start = time.perf_counter()
+
+    async def on_message_callback(body: dict):
+        nonlocal fast_processed, fast_done_at
+        slow = body["chat_id"] == SLOW_CHAT_ID
+        await asyncio.sleep(slow_latency if slow else latency)
+        if not slow:
+            fast_processed += 1
+            if fast_processed == fast_messages:
+                fast_done_at = time.perf_counter() - start
+
+    if name == "locked":
+        consumer = LockedConsumer(on_message_callback, "converso_out")
+    else:
+        consumer = RabbitMQConsumer(
+            on_message_callback, "converso_out",
+            prefetch_count=prefetch_count,
+            dead_letter_queue="converso_out.dead_letter"
+        )
+        consumer.channel = queue
+
+    await queue.consume(consumer.on_message)
+    elapsed = time.perf_counter() - start
+    dead_lettered = queue.default_exchange.published.get(
+        "converso_out.dead_letter", [])
+    return {
+        "consumer": name,
+        "slow_chat_latency": slow_latency,
+        "messages/s": round(messages / elapsed),
+        "other_chats_done_s": round(fast_done_at, 2),
+        "total_s": round(elapsed, 2),
+        "ack_frames": queue.ack_frames,
+        "dead_lettered": len(dead_lettered)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--prefetch", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--slow-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # The poison messages are reported in the results
+    logging.disable(logging.ERROR)
+    for slow_latency in (args.latency, args.slow_latency):
+        for name in ("locked", "batched"):
+            print(asyncio.run(run(name, args.messages, args.chats, args.prefetch,
+                                  args.latency, slow_latency)))
+
+
+if __name__ == "__main__":
+    main()
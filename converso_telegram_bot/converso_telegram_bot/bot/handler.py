@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 
@@ -9,8 +10,7 @@ from converso_telegram_bot.clients import (
     ConversoChatbotClient, get_rabbitmq_producer)
 from converso_telegram_bot.constants import MessageQueues, MessageType
 
-from openai import OpenAI
-import asyncio
+from .voice_transcriber import VoiceTranscriber
 
 
 class Handler:
@@ -25,7 +25,7 @@ class Handler:
         self.bot = bot
         self.converso_client = ConversoChatbotClient()
         self.rabbitmq_producer = get_rabbitmq_producer()
-        self.openai_client = OpenAI()
+        self.voice_transcriber = VoiceTranscriber(bot=bot)
 
     async def reset_conversation_handler(
         self,
@@ -55,23 +55,12 @@ class Handler:
         update: Update,
         _: ContextTypes.DEFAULT_TYPE
     ) -> None:
-        """Handles voice messages."""
+        """Handles voice messages: the transcript is shown to the user and sent to the Converso."""
         logging.info(f"Voice message received: {update}")
 
-        audio_file_id = update.message.voice.file_id
-        audio_telegram_file = await self.bot.get_file(audio_file_id)
-
-        # TODO: Use download_to_memory
-        await audio_telegram_file.download_to_drive("audio.ogg")
-
-        # Call OpenAI whisper API
-        text = self.openai_client.audio.transcriptions.create(
-            model="whisper-1",
-            file=open("audio.ogg", "rb"),
-            language="it"
-        ).text
+        text = await self.voice_transcriber.transcribe(update.message.voice)
 
-        asyncio.gather(
+        await asyncio.gather(
             self._text_handler(text, str(update.message.chat_id)),
             update.message.reply_html(
                 text=f"<i>{text}</i>",
@@ -0,0 +1,109 @@
+import asyncio
+import io
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from openai import AsyncOpenAI
+from telegram import Bot, Voice
+
+TRANSCRIPTION_MODEL = os.environ.get("TRANSCRIPTION_MODEL", "whisper-1")
+TRANSCRIPTION_LANGUAGE = os.environ.get("TRANSCRIPTION_LANGUAGE", "it")
+# Voice messages transcribed at the same time, the others wait
+TRANSCRIPTION_MAX_CONCURRENCY = int(
+    os.environ.get("TRANSCRIPTION_MAX_CONCURRENCY", 4))
+# Transcripts kept, by Telegram file_unique_id
+TRANSCRIPTION_CACHE_SIZE = int(os.environ.get("TRANSCRIPTION_CACHE_SIZE", 512))
+
+
+class VoiceTranscriber:
+    """
+    Transcribes the Telegram voice messages with the OpenAI API, without writing them on disk.
+
+    Transcripts are cached by the file_unique_id of the voice message, which is the same
+    when a message is forwarded or sent again: the same voice message is transcribed once,
+    also when it arrives again while it's being transcribed.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        max_concurrency: int = TRANSCRIPTION_MAX_CONCURRENCY,
+        cache_size: int = TRANSCRIPTION_CACHE_SIZE,
+        openai_client: Optional[AsyncOpenAI] = None
+    ) -> None:
+        self.bot = bot
+        self.openai_client = openai_client or AsyncOpenAI()
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.cache_size = cache_size
+        # Transcripts, or the tasks computing them, by file_unique_id
+        self.transcripts: OrderedDict[str, asyncio.Future] = OrderedDict()
+        self.counters: Dict[str, float] = {
+            "transcriptions": 0,
+            "cache_hits": 0,
+            "failures": 0,
+            "queue_seconds": 0.0,
+            "download_seconds": 0.0,
+            "transcription_seconds": 0.0
+        }
+
+    async def transcribe(self, voice: Voice) -> str:
+        transcript = self.transcripts.get(voice.file_unique_id)
+        if transcript is not None:
+            self.transcripts.move_to_end(voice.file_unique_id)
+            self.counters["cache_hits"] += 1
+            logging.info(
+                f"Voice message of {voice.duration}s transcript taken from the cache")
+            return await asyncio.shield(transcript)
+
+        transcript = asyncio.ensure_future(self._transcribe(voice))
+        self.transcripts[voice.file_unique_id] = transcript
+        if len(self.transcripts) > self.cache_size:
+            self.transcripts.popitem(last=False)
+        try:
+            return await asyncio.shield(transcript)
+        except Exception:
+            # Transcribed again the next time
+            if self.transcripts.get(voice.file_unique_id) is transcript:
+                del self.transcripts[voice.file_unique_id]
+            raise
+
+    def stats(self) -> Dict[str, float]:
+        return {**self.counters, "cached": len(self.transcripts)}
+
+    async def _transcribe(self, voice: Voice) -> str:
+        start = time.perf_counter()
+        try:
+            async with self.semaphore:
+                started_at = time.perf_counter()
+
+                audio = io.BytesIO()
+                telegram_file = await self.bot.get_file(voice.file_id)
+                await telegram_file.download_to_memory(audio)
+                downloaded_at = time.perf_counter()
+
+                transcription = await self.openai_client.audio.transcriptions.create(
+                    model=TRANSCRIPTION_MODEL,
+                    file=("audio.ogg", audio.getvalue()),
+                    language=TRANSCRIPTION_LANGUAGE
+                )
+                transcribed_at = time.perf_counter()
+        except Exception as e:
+            self.counters["failures"] += 1
+            logging.error(
+                f"Voice message of {voice.duration}s not transcribed after "
+                f"{time.perf_counter() - start:.2f}s: {e}")
+            raise
+
+        self.counters["transcriptions"] += 1
+        self.counters["queue_seconds"] += started_at - start
+        self.counters["download_seconds"] += downloaded_at - started_at
+        self.counters["transcription_seconds"] += transcribed_at - downloaded_at
+        logging.info(
+            f"Voice message of {voice.duration}s transcribed in {transcribed_at - start:.2f}s "
+            f"(waiting {started_at - start:.2f}s, download {downloaded_at - started_at:.2f}s, "
+            f"transcription {transcribed_at - downloaded_at:.2f}s)"
+        )
+        return transcription.text
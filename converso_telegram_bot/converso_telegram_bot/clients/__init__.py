@@ -1,3 +1,3 @@
 from .converso_chatbot import ConversoChatbotClient
-from .redis import get_redis_client
+from .redis import get_async_redis_client, get_redis_client
 from .rabbitmq import get_rabbitmq_consumer, get_rabbitmq_producer
@@ -9,3 +9,29 @@ RABBITMQ_USER = 'user'
 # automatically populates some env variables from the services)
 if isinstance(RABBITMQ_PORT, str) and ':' in RABBITMQ_PORT:
     RABBITMQ_PORT = int(RABBITMQ_PORT.split(':')[-1])
+
+# Maximum number of channels kept open by each producer.
+RABBITMQ_PRODUCER_POOL_SIZE = int(
+    os.environ.get('RABBITMQ_PRODUCER_POOL_SIZE', 4))
+
+# Seconds between the heartbeats of the producer connections. A pooled connection idle for
+# longer is opened again, since it may have been dropped without its socket noticing.
+RABBITMQ_HEARTBEAT = int(os.environ.get('RABBITMQ_HEARTBEAT', 60))
+
+# Number of unacknowledged messages the broker delivers to each consumer.
+# Acts as backpressure: when all of them are being processed, RabbitMQ stops
+# delivering until some are acked.
+RABBITMQ_PREFETCH_COUNT = int(os.environ.get('RABBITMQ_PREFETCH_COUNT', 50))
+
+# Maximum number of chats whose messages are processed concurrently by each consumer.
+# Messages belonging to the same chat are always processed in order.
+RABBITMQ_MAX_CONCURRENCY = int(os.environ.get('RABBITMQ_MAX_CONCURRENCY', 16))
+
+# Processed messages are acked together, when this many are ready or after the interval (seconds)
+RABBITMQ_ACK_BATCH_SIZE = int(os.environ.get('RABBITMQ_ACK_BATCH_SIZE', 20))
+RABBITMQ_ACK_INTERVAL = float(os.environ.get('RABBITMQ_ACK_INTERVAL', 0.1))
+
+# Suffix of the queue receiving the messages that could not be processed.
+# Empty to drop them instead
+RABBITMQ_DEAD_LETTER_SUFFIX = os.environ.get(
+    'RABBITMQ_DEAD_LETTER_SUFFIX', '.dead_letter')
@@ -1,36 +1,200 @@
 import asyncio
+import inspect
 import json
 import logging
-from typing import Coroutine
+from collections import deque
+from typing import Coroutine, Deque, Optional
 
 import aio_pika
 
-from .constants import (RABBITMQ_HOST, RABBITMQ_PASSWORD, RABBITMQ_PORT,
-                        RABBITMQ_USER)
+from .constants import (RABBITMQ_ACK_BATCH_SIZE, RABBITMQ_ACK_INTERVAL,
+                        RABBITMQ_DEAD_LETTER_SUFFIX, RABBITMQ_HOST,
+                        RABBITMQ_MAX_CONCURRENCY, RABBITMQ_PASSWORD,
+                        RABBITMQ_PORT, RABBITMQ_PREFETCH_COUNT, RABBITMQ_USER)
+from .keyed_scheduler import KeyedScheduler
 
 logger = logging.getLogger(__name__)
 
 
+class _PendingAck:
+
+    def __init__(self, message, generation: int) -> None:
+        self.message = message
+        # Channel the message was delivered on: its delivery_tag is only valid there
+        self.generation = generation
+        self.processed = False
+
+
+class _AckBatcher:
+    """
+    Acks the processed messages in batches, with multiple=True.
+    A batch acks every message received until its last one, so it only includes
+    the messages processed without gaps from the oldest one not acked yet.
+
+    When a slow message holds back the batches and max_blocked messages processed after it
+    are waiting, they are acked one by one: the broker stops delivering when prefetch_count
+    messages are not acked.
+    """
+
+    def __init__(self, batch_size: int, interval: float, max_blocked: int) -> None:
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_blocked = max_blocked
+        # Messages not acked yet, in delivery order, and how many of them are processed
+        self.pending: Deque[_PendingAck] = deque()
+        self.processed_count = 0
+        # Last message of the next batch, and size of the batch
+        self.ready: Optional[_PendingAck] = None
+        self.ready_count = 0
+        self.flush_task: Optional[asyncio.Task] = None
+        self.acks = 0
+        self.generation = 0
+
+    def received(self, message) -> _PendingAck:
+        if self.pending and message.delivery_tag <= self.pending[-1].message.delivery_tag:
+            # The channel was opened again: the messages not acked are delivered again
+            self.pending.clear()
+            self.processed_count = 0
+            self.ready = None
+            self.ready_count = 0
+            self.generation += 1
+        pending_ack = _PendingAck(message, self.generation)
+        self.pending.append(pending_ack)
+        return pending_ack
+
+    async def processed(self, pending_ack: _PendingAck) -> None:
+        if pending_ack.generation != self.generation:
+            # Received before the channel was opened again: it is delivered again
+            return
+        pending_ack.processed = True
+        self.processed_count += 1
+        while self.pending and self.pending[0].processed:
+            self.ready = self.pending.popleft()
+            self.ready_count += 1
+            self.processed_count -= 1
+
+        if self.ready_count >= self.batch_size:
+            await self.flush()
+        elif self.processed_count >= self.max_blocked:
+            await self.flush()
+            await self._ack_processed_one_by_one()
+        elif self.ready and not self.flush_task:
+            self.flush_task = asyncio.create_task(self._flush_later())
+
+    async def flush(self) -> None:
+        ready, self.ready = self.ready, None
+        self.ready_count = 0
+        if ready is None:
+            return
+        self.acks += 1
+        try:
+            await ready.message.ack(multiple=True)
+        except Exception as e:
+            # The messages are delivered again when the channel is opened again
+            logger.warning(f"Could not ack the processed messages: {e}")
+
+    async def _ack_processed_one_by_one(self) -> None:
+        processed = [
+            pending_ack for pending_ack in self.pending if pending_ack.processed]
+        self.pending = deque(
+            pending_ack for pending_ack in self.pending if not pending_ack.processed)
+        self.processed_count = 0
+        for pending_ack in processed:
+            self.acks += 1
+            try:
+                await pending_ack.message.ack()
+            except Exception as e:
+                logger.warning(f"Could not ack a processed message: {e}")
+
+    async def _flush_later(self) -> None:
+        try:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+        finally:
+            self.flush_task = None
+
+
 class RabbitMQConsumer:
+    """
+    Consumes messages from a queue and processes them with on_message_callback.
+
+    Messages with the same value of `key` (by default the chat_id) are processed in order,
+    while messages of different chats are processed concurrently, up to max_concurrency.
+    prefetch_count bounds the number of unacknowledged messages held by the consumer.
+    Processed messages are acked in batches of ack_batch_size, or after ack_interval seconds.
+    When on_message_callback returns an awaitable (e.g. the Delivery of a Telegram message),
+    the message is acked once it completes, without holding back the next messages of the key.
+
+    Messages that can't be processed are published to dead_letter_queue, if given, and acked.
+    """
+
     def __init__(
         self,
         on_message_callback: Coroutine[dict, None, None],
-        queue_name: str
+        queue_name: str,
+        key: str = "chat_id",
+        max_concurrency: int = RABBITMQ_MAX_CONCURRENCY,
+        prefetch_count: int = RABBITMQ_PREFETCH_COUNT,
+        ack_batch_size: int = RABBITMQ_ACK_BATCH_SIZE,
+        ack_interval: float = RABBITMQ_ACK_INTERVAL,
+        dead_letter_queue: Optional[str] = None
     ):
         self.queue_name = queue_name
         self.on_message_callback = on_message_callback
+        self.key = key
+        self.prefetch_count = prefetch_count
+        self.dead_letter_queue = dead_letter_queue
         self.connection = None
-        self.lock = asyncio.Lock()
+        self.channel = None
+        self.scheduler = KeyedScheduler(max_concurrency=max_concurrency)
+        # Batches are sent well before prefetch_count messages are waiting to be acked
+        ack_batch_size = max(1, min(ack_batch_size, prefetch_count // 2))
+        self.ack_batcher = _AckBatcher(
+            batch_size=ack_batch_size,
+            interval=ack_interval,
+            max_blocked=ack_batch_size
+        )
+        self.dead_lettered = 0
 
     async def on_message(self, message):
-        async with message.process():
-            async with self.lock:
-                body = json.loads(message.body.decode())
-                logging.debug(f" [x] Received {body}")
-                await self.on_message_callback(body)
-                # Your processing logic here
-                # For example, you can call an async function:
-                # await process_message(body)
+        pending_ack = self.ack_batcher.received(message)
+        try:
+            # Nothing before submit suspends, so jobs are enqueued in
+            # delivery order
+            body = json.loads(message.body.decode())
+            logging.debug(f" [x] Received {body}")
+            completion = await self.scheduler.submit(
+                body.get(self.key),
+                self.on_message_callback,
+                body
+            )
+            if inspect.isawaitable(completion):
+                await completion
+        except Exception as e:
+            logger.exception(f"Could not process a message of {self.queue_name}: {e}")
+            await self.dead_letter(message, e)
+        await self.ack_batcher.processed(pending_ack)
+
+    async def dead_letter(self, message, error: Exception) -> None:
+        """Publishes the message to the dead letter queue, with the error that made it fail"""
+        if not self.dead_letter_queue:
+            return
+        try:
+            await self.channel.default_exchange.publish(
+                aio_pika.Message(
+                    body=message.body,
+                    headers={
+                        "x-original-queue": self.queue_name,
+                        "x-error": f"{type(error).__name__}: {error}"
+                    },
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                ),
+                routing_key=self.dead_letter_queue
+            )
+            self.dead_lettered += 1
+        except Exception as e:
+            logger.error(
+                f"Could not publish a message to {self.dead_letter_queue}, dropping it: {e}")
 
     async def setup_consumer(self):
         self.connection = await aio_pika.connect_robust(
@@ -41,13 +205,27 @@ class RabbitMQConsumer:
             reconnect_interval=15,
             fail_fast=0
         )
-        channel = await self.connection.channel()
-        queue = await channel.declare_queue(self.queue_name, durable=True)
+        self.channel = await self.connection.channel()
+        await self.channel.set_qos(prefetch_count=self.prefetch_count)
+        if self.dead_letter_queue:
+            await self.channel.declare_queue(self.dead_letter_queue, durable=True)
+        queue = await self.channel.declare_queue(self.queue_name, durable=True)
         await queue.consume(self.on_message)
 
     async def run_consumer(self):
         await self.setup_consumer()
 
+    def stats(self) -> dict:
+        """Queue depth and in-flight counts of this worker."""
+        return {
+            "queue": self.queue_name,
+            "prefetch_count": self.prefetch_count,
+            "not_acked": len(self.ack_batcher.pending),
+            "acks": self.ack_batcher.acks,
+            "dead_lettered": self.dead_lettered,
+            **self.scheduler.stats()
+        }
+
 
 def get_rabbitmq_consumer(
     on_message_callback: Coroutine[dict, None, None],
@@ -55,5 +233,6 @@ def get_rabbitmq_consumer(
 ):
     return RabbitMQConsumer(
         on_message_callback=on_message_callback,
-        queue_name=queue_name
+        queue_name=queue_name,
+        dead_letter_queue=f"{queue_name}{RABBITMQ_DEAD_LETTER_SUFFIX}" if RABBITMQ_DEAD_LETTER_SUFFIX else None
     )
@@ -1,54 +1,193 @@
 import logging
-from typing import Annotated
+import queue as queue_lib
+import threading
+import time
+from typing import Annotated, Optional, Set
 
 import pika
 
-from .constants import RABBITMQ_HOST, RABBITMQ_PASSWORD, RABBITMQ_PORT, RABBITMQ_USER
+from .constants import (RABBITMQ_HEARTBEAT, RABBITMQ_HOST, RABBITMQ_PASSWORD,
+                        RABBITMQ_PORT, RABBITMQ_PRODUCER_POOL_SIZE,
+                        RABBITMQ_USER)
 
 logger = logging.getLogger(__name__)
 
+# Errors after which a pooled connection is discarded and opened again
+RECOVERABLE_ERRORS = (
+    pika.exceptions.AMQPConnectionError,
+    pika.exceptions.AMQPChannelError,
+    pika.exceptions.StreamLostError,
+    # The broker could not take the message: it is published again on a new connection
+    pika.exceptions.NackError,
+    ConnectionError
+)
+
+
+class _PooledChannel:
+    """
+    A channel together with the connection it belongs to.
+    pika connections are not thread-safe, so every pooled channel owns its connection
+    and is used by one thread at a time.
+
+    pika only sends and checks the heartbeats while it processes the events of a connection,
+    which an idle pooled connection doesn't do: a connection idle for longer than the heartbeat
+    may have been closed by the broker, or dropped by a NAT or load balancer without its socket
+    noticing, so it is opened again. Publishes are confirmed by the broker, so that a publish on
+    a dead connection raises instead of being lost.
+    """
+
+    def __init__(self, connection_params_factory, heartbeat: int):
+        self.connection_params_factory = connection_params_factory
+        self.heartbeat = heartbeat
+        self.connection = None
+        self.channel = None
+        self.used_at = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self.channel is not None and self.channel.is_open \
+            and self.connection.is_open
+
+    def open(self):
+        self.connection = pika.BlockingConnection(
+            self.connection_params_factory())
+        self.channel = self.connection.channel()
+        self.channel.confirm_delivery()
+        self.used_at = time.monotonic()
+
+    def check(self):
+        """
+        Processes the frames received while the connection was idle in the pool,
+        so that a connection closed by the broker is reopened before publishing on it
+        """
+        if not self.is_open:
+            return
+        if self.heartbeat and time.monotonic() - self.used_at > self.heartbeat:
+            logger.info(
+                "Pooled RabbitMQ connection was idle for longer than the heartbeat, reopening it")
+            self.close()
+            return
+        try:
+            self.connection.process_data_events(time_limit=0)
+        except RECOVERABLE_ERRORS:
+            logger.info("Pooled RabbitMQ connection was closed, reopening it")
+            self.close()
+
+    def close(self):
+        try:
+            if self.connection is not None and self.connection.is_open:
+                self.connection.close()
+        except Exception:
+            logger.debug("Error closing RabbitMQ connection", exc_info=True)
+        finally:
+            self.connection = None
+            self.channel = None
+
 
 class RabbitMQProducer:
+    """
+    Long-lived, thread-safe RabbitMQ publisher.
+
+    Keeps a pool of at most pool_size channels that are opened lazily and reused across publishes.
+    Queue declarations are cached, and broken connections are reopened transparently.
+    """
 
-    def __init__(self, host, port, user, password):
+    def __init__(
+        self,
+        host,
+        port,
+        user,
+        password,
+        pool_size: int = RABBITMQ_PRODUCER_POOL_SIZE,
+        heartbeat: int = RABBITMQ_HEARTBEAT
+    ):
         self.host = host
         self.port = port
         self.user = user
         self.password = password
+        self.pool_size = pool_size
+        self.heartbeat = heartbeat
 
-        self.connection = None
-        self.channel = None
+        # Connections are opened lazily, on the first publish
+        self._pool = queue_lib.LifoQueue(maxsize=pool_size)
+        for _ in range(pool_size):
+            self._pool.put(_PooledChannel(self._connection_params, heartbeat))
+        self._declared_queues: Set[str] = set()
+        self._declared_queues_lock = threading.Lock()
 
-    def connect(self):
-        connection_params = pika.ConnectionParameters(
+    def _connection_params(self) -> pika.ConnectionParameters:
+        return pika.ConnectionParameters(
             host=self.host,
             port=self.port,
-            credentials=pika.PlainCredentials(self.user, self.password)
+            credentials=pika.PlainCredentials(self.user, self.password),
+            heartbeat=self.heartbeat
         )
-        self.connection = pika.BlockingConnection(connection_params)
-        self.channel = self.connection.channel()
 
     def publish(
         self,
         queue: str,
         message: str
     ):
-        # TODO: we are connecting at every message, there must be a better
-        # way...
-        self.connect()
-        self.channel.queue_declare(queue=queue, durable=True)
-        self.channel.basic_publish(
+        pooled_channel = self._pool.get()
+        try:
+            try:
+                self._publish(pooled_channel, queue, message)
+            except RECOVERABLE_ERRORS:
+                logger.warning(
+                    "RabbitMQ connection lost, reconnecting", exc_info=True)
+                pooled_channel.close()
+                self._publish(pooled_channel, queue, message)
+        except BaseException:
+            pooled_channel.close()
+            raise
+        finally:
+            self._pool.put(pooled_channel)
+
+    def _publish(
+        self,
+        pooled_channel: _PooledChannel,
+        queue: str,
+        message: str
+    ):
+        pooled_channel.check()
+        if not pooled_channel.is_open:
+            pooled_channel.open()
+        self._declare_queue(pooled_channel.channel, queue)
+        pooled_channel.channel.basic_publish(
             exchange='', routing_key=queue, body=message)
+        pooled_channel.used_at = time.monotonic()
+
+    def _declare_queue(self, channel, queue: str):
+        # Queues are durable, so declaring them once per process is enough
+        if queue in self._declared_queues:
+            return
+        channel.queue_declare(queue=queue, durable=True)
+        with self._declared_queues_lock:
+            self._declared_queues.add(queue)
+
+    def close(self):
+        for _ in range(self.pool_size):
+            pooled_channel = self._pool.get()
+            pooled_channel.close()
+            self._pool.put(pooled_channel)
+
+
+_rabbitmq_producer: Optional[RabbitMQProducer] = None
+_rabbitmq_producer_lock = threading.Lock()
 
 
 def get_rabbitmq_producer():
-    client = RabbitMQProducer(
-        host=RABBITMQ_HOST,
-        port=RABBITMQ_PORT,
-        user=RABBITMQ_USER,
-        password=RABBITMQ_PASSWORD
-    )
-    return client
+    """Returns the process-wide RabbitMQProducer"""
+    global _rabbitmq_producer
+    with _rabbitmq_producer_lock:
+        if _rabbitmq_producer is None:
+            _rabbitmq_producer = RabbitMQProducer(
+                host=RABBITMQ_HOST,
+                port=RABBITMQ_PORT,
+                user=RABBITMQ_USER,
+                password=RABBITMQ_PASSWORD
+            )
+    return _rabbitmq_producer
 
 
 RabbitMQProducerDep = None
@@ -2,6 +2,7 @@ import os
 from typing import Annotated
 
 import redis
+import redis.asyncio
 
 REDIS_HOST = os.environ.get('REDIS_HOST')
 REDIS_PASSWORD = os.environ.get('REDIS_PASSWORD')
@@ -14,6 +15,13 @@ def get_redis_client():
     )
 
 
+def get_async_redis_client():
+    return redis.asyncio.Redis(
+        host=REDIS_HOST,
+        password=REDIS_PASSWORD
+    )
+
+
 RedisClientDep = None
 try:
     from fastapi import Depends
@@ -3,5 +3,7 @@ from enum import Enum
 
 class MessageType(Enum):
     TEXT = "TEXT"
+    # Part of an answer, sent while it is generated
+    TEXT_DELTA = "TEXT_DELTA"
     TOOL_START = "TOOL_START"
     TOOL_END = "TOOL_END"
@@ -1,24 +1,62 @@
+import asyncio
 import json
 import logging
+from collections import deque
+from typing import Dict, Optional, Set
 
+import redis
 from telegram import Bot
 from telegram.constants import ParseMode
 
-from converso_telegram_bot.clients import get_redis_client
+from converso_telegram_bot.clients import get_async_redis_client
 from converso_telegram_bot.constants import Emojis, MessageType
+from converso_telegram_bot.delivery_scheduler import (Delivery,
+                                                      DeliveryScheduler)
+
+# Completed streams remembered, to ignore their deltas arriving after the final answer
+MAX_FINISHED_STREAMS = 1000
+
+
+class _StreamedAnswer:
+    """A partial answer, shown in a Telegram message edited while its deltas arrive"""
+
+    def __init__(self, stream_id: str) -> None:
+        self.stream_id = stream_id
+        self.text = ""
+        self.message: Optional[Delivery] = None
+
+
+class _ToolStartMessage:
+    """The message of a running tool, edited when the tool ends"""
+
+    def __init__(self, content: str, message: Delivery) -> None:
+        self.content = content
+        self.message = message
 
 
 class ConversoProcessor:
     """
     Class that processes messages generated by the Converso and sends them to the Telegram user.
+    Messages are queued in the DeliveryScheduler, which sends them within the Telegram limits.
+    Processing a message doesn't wait for it to be delivered, so that the following edits of
+    the chat can be merged: it returns the Delivery, which the consumer awaits before acking.
     """
 
     def __init__(
         self,
-        bot: Bot
+        bot: Bot,
+        delivery_scheduler: Optional[DeliveryScheduler] = None
     ) -> None:
         self.bot = bot
-        self.redis_client = get_redis_client()
+        self.delivery_scheduler = delivery_scheduler or DeliveryScheduler(bot)
+        self.redis_client = get_async_redis_client()
+        # Messages of the running tools, by chat
+        self.tool_start_messages: Dict[str, _ToolStartMessage] = {}
+        # Answers being streamed, by chat
+        self.streamed_answers: Dict[str, _StreamedAnswer] = {}
+        self.finished_streams = deque(maxlen=MAX_FINISHED_STREAMS)
+        # Referenced until done, since the event loop keeps only weak references to the tasks
+        self.background_tasks: Set[asyncio.Task] = set()
 
     def _sanitize_text_for_telegram(
         self,
@@ -30,8 +68,11 @@ class ConversoProcessor:
     async def on_message_callback(
         self,
         message: str
-    ) -> None:
-        """Callback to be called when a message is received from the RabbitMQ queue."""
+    ) -> Optional[Delivery]:
+        """
+        Callback to be called when a message is received from the RabbitMQ queue.
+        Returns the Delivery of the Telegram message queued, if any.
+        """
 
         if "type" not in message:
             logging.error(f"Received message without type: {message}")
@@ -40,81 +81,160 @@ class ConversoProcessor:
         message_processors = {
             MessageType.TOOL_START.value: self.__process_tool_start_message,
             MessageType.TOOL_END.value: self.__process_tool_end_message,
-            MessageType.TEXT.value: self.__process_text_message
+            MessageType.TEXT.value: self.__process_text_message,
+            MessageType.TEXT_DELTA.value: self.__process_text_delta_message
         }
 
         if message["type"] not in message_processors:
             logging.error(f"Received message with unknown type: {message}")
             return
 
-        await message_processors[message["type"]](message)
+        return await message_processors[message["type"]](message)
 
     async def __process_tool_start_message(
         self,
         message: str
-    ) -> None:
-        """Processes a tool start message."""
+    ) -> Delivery:
+        """
+        Processes a tool start message.
+        The message is stored in redis once delivered, to be edited when the tool ends.
+        """
 
+        chat_id = message["chat_id"]
         text = self._sanitize_text_for_telegram(
             f"""{Emojis.LOADING.value} {message["content"]}""")
 
         # TODO: text is too long
-        sent_message = await self.bot.send_message(
-            chat_id=message["chat_id"],
-            text=text,
-            parse_mode=ParseMode.HTML
+        await self.delivery_scheduler.wait_until_not_full()
+        tool_start_message = _ToolStartMessage(
+            message["content"],
+            self.delivery_scheduler.send_message(
+                chat_id, text, parse_mode=ParseMode.HTML)
         )
+        self.tool_start_messages[chat_id] = tool_start_message
+        task = asyncio.create_task(
+            self.__store_tool_start_message(chat_id, tool_start_message))
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return tool_start_message.message
+
+    async def __store_tool_start_message(
+        self,
+        chat_id: str,
+        tool_start_message: _ToolStartMessage
+    ) -> None:
+        message_id = await tool_start_message.message
+        # The tool may have ended in the meantime
+        if message_id is None or self.tool_start_messages.get(chat_id) is not tool_start_message:
+            return
 
-        self.redis_client.hset(
-            f"telegram.{message['chat_id']}",
-            "last_tool_start_message",
-            json.dumps({
-                "content": message["content"],
-                "message_id": sent_message.message_id
-            })
-        )
+        try:
+            await self.redis_client.hset(
+                f"telegram.{chat_id}",
+                "last_tool_start_message",
+                json.dumps({
+                    "content": tool_start_message.content,
+                    "message_id": message_id
+                })
+            )
+        except redis.RedisError as e:
+            logging.exception(f"Could not store the tool start message: {e}")
 
     async def __process_tool_end_message(
         self,
         message: str
-    ) -> None:
-        """Processes a tool end message."""
-
-        last_tool_start_message = self.redis_client.hget(
-            f"telegram.{message['chat_id']}",
-            "last_tool_start_message"
-        )
-
-        if not last_tool_start_message:
-            logging.error(
-                f"Received tool end message without tool start message: {message}")
-            return
-
-        last_tool_start_message = json.loads(last_tool_start_message)
+    ) -> Optional[Delivery]:
+        """
+        Processes a tool end message.
+        If the tool start message is still queued, it is sent directly with the final text.
+        """
+
+        chat_id = message["chat_id"]
+        tool_start_message = self.tool_start_messages.pop(chat_id, None)
+        if tool_start_message:
+            content = tool_start_message.content
+            target = tool_start_message.message
+        else:
+            # Started before a restart of the bot
+            last_tool_start_message = await self.redis_client.hget(
+                f"telegram.{chat_id}",
+                "last_tool_start_message"
+            )
+            if not last_tool_start_message:
+                logging.error(
+                    f"Received tool end message without tool start message: {message}")
+                return
+            last_tool_start_message = json.loads(last_tool_start_message)
+            content = last_tool_start_message["content"]
+            target = last_tool_start_message["message_id"]
 
         text = self._sanitize_text_for_telegram(
-            f"""{Emojis.DONE.value} {last_tool_start_message["content"]}""")
-        await self.bot.edit_message_text(
-            chat_id=message["chat_id"],
-            message_id=last_tool_start_message["message_id"],
-            text=text,
-            parse_mode=ParseMode.HTML
-        )
+            f"""{Emojis.DONE.value} {content}""")
+        await self.delivery_scheduler.wait_until_not_full()
+        delivery = self.delivery_scheduler.edit_message_text(
+            chat_id, target, text, parse_mode=ParseMode.HTML)
 
-        self.redis_client.hdel(
-            f"telegram.{message['chat_id']}",
+        await self.redis_client.hdel(
+            f"telegram.{chat_id}",
             "last_tool_start_message"
         )
+        return delivery
 
     async def __process_text_message(
         self,
         message: str
-    ) -> None:
-        """Processes a text message."""
+    ) -> Delivery:
+        """
+        Processes a text message.
+        If the answer was streamed, the streamed message is edited with the final text.
+        """
+
+        chat_id = message["chat_id"]
+        self.finished_streams.extend(message.get("stream_ids", []))
+        streamed_answer = self.streamed_answers.pop(chat_id, None)
 
         text = self._sanitize_text_for_telegram(message["content"])
-        await self.bot.send_message(
-            chat_id=message["chat_id"],
-            text=text,
-            parse_mode=ParseMode.HTML
-        )
+        await self.delivery_scheduler.wait_until_not_full()
+        if streamed_answer:
+            return self.delivery_scheduler.edit_message_text(
+                chat_id, streamed_answer.message, text, parse_mode=ParseMode.HTML)
+
+        return self.delivery_scheduler.send_message(
+            chat_id, text, parse_mode=ParseMode.HTML)
+
+    async def __process_text_delta_message(
+        self,
+        message: str
+    ) -> Optional[Delivery]:
+        """
+        Processes a part of an answer being generated.
+        The first part is sent as a new message, which is then edited with the following ones:
+        the edits waiting to be sent are merged by the DeliveryScheduler.
+        Parts are sent as plain text, since the HTML of a partial answer may be incomplete.
+        """
+
+        chat_id = message["chat_id"]
+        stream_id = message["stream_id"]
+        if stream_id in self.finished_streams:
+            return
+
+        await self.delivery_scheduler.wait_until_not_full()
+        streamed_answer = self.streamed_answers.get(chat_id)
+        if not streamed_answer:
+            streamed_answer = _StreamedAnswer(stream_id)
+            self.streamed_answers[chat_id] = streamed_answer
+        elif streamed_answer.stream_id != stream_id:
+            # A later LLM call of the same turn: its answer replaces the previous one
+            self.finished_streams.append(streamed_answer.stream_id)
+            streamed_answer.stream_id = stream_id
+            streamed_answer.text = ""
+        streamed_answer.text += message["content"]
+
+        text = self._sanitize_text_for_telegram(streamed_answer.text)
+        if streamed_answer.message is None:
+            streamed_answer.message = self.delivery_scheduler.send_message(
+                chat_id, text)
+            return streamed_answer.message
+
+        return self.delivery_scheduler.edit_message_text(
+            chat_id, streamed_answer.message, text)
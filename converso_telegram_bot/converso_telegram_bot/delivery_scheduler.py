@@ -0,0 +1,310 @@
+"""
+Scheduler of the messages sent to Telegram.
+
+Telegram limits the messages of a bot to about 30 per second overall and about one per
+second in a chat, answering with a RetryAfter error (429) beyond them. Messages and edits
+are queued by chat and sent in order by a task of the chat, when both the token bucket of
+the chat and the global one have a token. An edit queued right after another edit of the
+same message, or after the message itself while it's still waiting, replaces its text:
+only the latest text is sent.
+
+At most max_queued deliveries wait in the queues: callers await wait_until_not_full()
+before queuing a message, so that a burst slows down the consumer instead of growing the
+queues without bound.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional, Union
+
+from telegram import Bot
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+
+logger = logging.getLogger(__name__)
+
+# Messages per second, and burst, sent by the bot and in each chat. The global rate stays
+# below the Telegram limit, which also counts the messages sent by the update handlers
+TELEGRAM_GLOBAL_RATE = float(os.environ.get("TELEGRAM_GLOBAL_RATE", 25))
+TELEGRAM_GLOBAL_BURST = int(os.environ.get("TELEGRAM_GLOBAL_BURST", 25))
+TELEGRAM_CHAT_RATE = float(os.environ.get("TELEGRAM_CHAT_RATE", 1))
+TELEGRAM_CHAT_BURST = int(os.environ.get("TELEGRAM_CHAT_BURST", 3))
+# Attempts of a delivery failing with RetryAfter or network errors
+TELEGRAM_MAX_ATTEMPTS = int(os.environ.get("TELEGRAM_MAX_ATTEMPTS", 5))
+# Deliveries waiting in the queues of all the chats
+TELEGRAM_MAX_QUEUED_DELIVERIES = int(
+    os.environ.get("TELEGRAM_MAX_QUEUED_DELIVERIES", 1000))
+# Token buckets kept for the chats without queued messages
+MAX_IDLE_CHAT_BUCKETS = 10000
+
+
+class TokenBucket:
+    """Holds up to capacity tokens, refilled at rate tokens per second"""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def delay(self) -> float:
+        """Seconds until a token is available, 0 if it is now"""
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+        token_delay = max(0.0, (1 - self.tokens) / self.rate)
+        return max(token_delay, self.paused_until - now)
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        """Empties the bucket and gives no tokens for the next seconds"""
+        self.delay()
+        self.tokens = 0.0
+        self.paused_until = max(
+            self.paused_until, time.monotonic() + seconds)
+
+
+class Delivery:
+    """
+    A message to send, or the edit of a message, queued in a chat.
+    Awaiting it returns the id of the message once delivered, or None if the delivery failed.
+    """
+
+    def __init__(
+        self,
+        chat_id: str,
+        text: str,
+        parse_mode: Optional[str] = None,
+        target: Union[None, int, "Delivery"] = None
+    ) -> None:
+        self.chat_id = chat_id
+        self.text = text
+        self.parse_mode = parse_mode
+        # Message to edit: its id, or the Delivery sending it
+        self.target = target
+        self.started = False
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    @property
+    def is_edit(self) -> bool:
+        return self.target is not None
+
+    @property
+    def message_id(self) -> Optional[int]:
+        if not self.future.done():
+            return None
+        return self.future.result()
+
+    def __await__(self):
+        return self.future.__await__()
+
+
+class DeliveryScheduler:
+
+    def __init__(
+        self,
+        bot: Bot,
+        global_rate: float = TELEGRAM_GLOBAL_RATE,
+        global_burst: int = TELEGRAM_GLOBAL_BURST,
+        chat_rate: float = TELEGRAM_CHAT_RATE,
+        chat_burst: int = TELEGRAM_CHAT_BURST,
+        max_attempts: int = TELEGRAM_MAX_ATTEMPTS,
+        max_queued: int = TELEGRAM_MAX_QUEUED_DELIVERIES
+    ) -> None:
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_attempts = max_attempts
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self.queues: Dict[str, Deque[Delivery]] = {}
+        self.workers: Dict[str, asyncio.Task] = {}
+        self.max_queued = max_queued
+        self.queued = 0
+        self.not_full = asyncio.Event()
+        self.not_full.set()
+        self.counters = {
+            "api_calls": 0,
+            "coalesced": 0,
+            "retries": 0,
+            "failed": 0
+        }
+
+    def send_message(
+        self,
+        chat_id: str,
+        text: str,
+        parse_mode: Optional[str] = None
+    ) -> Delivery:
+        delivery = Delivery(chat_id, text, parse_mode)
+        self._enqueue(delivery)
+        return delivery
+
+    def edit_message_text(
+        self,
+        chat_id: str,
+        message: Union[int, Delivery],
+        text: str,
+        parse_mode: Optional[str] = None
+    ) -> Delivery:
+        """Edits a message, given its id or the Delivery sending it, even if it's still queued"""
+
+        queue = self.queues.get(chat_id)
+        last = queue[-1] if queue else None
+        if last is not None and not last.started and (
+            last is message or (last.is_edit and last.target == message)
+        ):
+            last.text = text
+            last.parse_mode = parse_mode
+            self.counters["coalesced"] += 1
+            return last
+
+        delivery = Delivery(chat_id, text, parse_mode, target=message)
+        self._enqueue(delivery)
+        return delivery
+
+    async def wait_until_not_full(self) -> None:
+        """
+        Waits until fewer than max_queued deliveries are queued.
+        Nothing may suspend between this and the send_message or edit_message_text it guards.
+        """
+        while self.queued >= self.max_queued:
+            await self.not_full.wait()
+
+    async def join(self) -> None:
+        """Waits until the queued messages are delivered"""
+        while self.workers:
+            await asyncio.gather(*self.workers.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "active_chats": len(self.workers)
+        }
+
+    def _enqueue(self, delivery: Delivery) -> None:
+        chat_id = delivery.chat_id
+        self.queues.setdefault(chat_id, deque()).append(delivery)
+        self.queued += 1
+        if self.queued >= self.max_queued:
+            self.not_full.clear()
+        if chat_id not in self.workers:
+            self.workers[chat_id] = asyncio.create_task(
+                self._run_chat(chat_id))
+
+    def _dequeued(self, count: int) -> None:
+        self.queued -= count
+        if self.queued < self.max_queued:
+            self.not_full.set()
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self.chat_buckets[chat_id] = bucket
+        self.chat_buckets.move_to_end(chat_id)
+
+        while len(self.chat_buckets) > MAX_IDLE_CHAT_BUCKETS + len(self.workers):
+            oldest_chat_id = next(iter(self.chat_buckets))
+            if oldest_chat_id in self.workers:
+                break
+            del self.chat_buckets[oldest_chat_id]
+        return bucket
+
+    async def _run_chat(self, chat_id: str) -> None:
+        queue = self.queues[chat_id]
+        try:
+            while queue:
+                await self._deliver(queue[0])
+                queue.popleft()
+                self._dequeued(1)
+        finally:
+            # The queue is left with messages only if the task was cancelled
+            for delivery in queue:
+                delivery.future.cancel()
+            self._dequeued(len(queue))
+            del self.workers[chat_id]
+            del self.queues[chat_id]
+
+    async def _acquire(self, chat_id: str) -> None:
+        chat_bucket = self._chat_bucket(chat_id)
+        while True:
+            delay = max(chat_bucket.delay(), self.global_bucket.delay())
+            if delay <= 0:
+                chat_bucket.take()
+                self.global_bucket.take()
+                return
+            await asyncio.sleep(delay)
+
+    async def _deliver(self, delivery: Delivery) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            await self._acquire(delivery.chat_id)
+            # Edits queued from now on can't replace the text anymore
+            delivery.started = True
+            try:
+                delivery.future.set_result(await self._call(delivery))
+                return
+            except RetryAfter as e:
+                logger.warning(
+                    f"Telegram asked to wait {e.retry_after}s before sending to chat {delivery.chat_id}")
+                self._chat_bucket(delivery.chat_id).pause(e.retry_after)
+            except BadRequest as e:
+                if delivery.is_edit and "not modified" in str(e):
+                    delivery.future.set_result(self._target_message_id(delivery))
+                    return
+                logger.error(
+                    f"Telegram rejected a message to chat {delivery.chat_id}: {e}")
+                break
+            except NetworkError as e:
+                logger.warning(
+                    f"Could not send a message to chat {delivery.chat_id}: {e}")
+                await asyncio.sleep(min(2 ** attempt, 30))
+            except TelegramError as e:
+                logger.error(
+                    f"Telegram rejected a message to chat {delivery.chat_id}: {e}")
+                break
+            if attempt < self.max_attempts:
+                self.counters["retries"] += 1
+
+        self.counters["failed"] += 1
+        delivery.future.set_result(None)
+
+    async def _call(self, delivery: Delivery) -> Optional[int]:
+        if not delivery.is_edit:
+            self.counters["api_calls"] += 1
+            sent_message = await self.bot.send_message(
+                chat_id=delivery.chat_id,
+                text=delivery.text,
+                parse_mode=delivery.parse_mode
+            )
+            return sent_message.message_id
+
+        message_id = self._target_message_id(delivery)
+        if message_id is None:
+            logger.error(
+                f"Not editing a message of chat {delivery.chat_id} that was not delivered")
+            return None
+        self.counters["api_calls"] += 1
+        await self.bot.edit_message_text(
+            chat_id=delivery.chat_id,
+            message_id=message_id,
+            text=delivery.text,
+            parse_mode=delivery.parse_mode
+        )
+        return message_id
+
+    @staticmethod
+    def _target_message_id(delivery: Delivery) -> Optional[int]:
+        if isinstance(delivery.target, Delivery):
+            return delivery.target.message_id
+        return delivery.target
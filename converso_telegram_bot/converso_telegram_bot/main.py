@@ -9,6 +9,7 @@ from converso_telegram_bot.constants import MessageQueues
 
 from converso_telegram_bot.bot.bot import ConversoTelegramBot
 from converso_telegram_bot.consumer import ConversoProcessor
+from converso_telegram_bot.stats_logger import log_stats_periodically
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
 
@@ -41,5 +42,12 @@ if __name__ == "__main__":
     # Start the RabbitMQ consumer
     asyncio.get_event_loop().create_task(rabbitmq_consumer.run_consumer())
 
+    # Log the counters of the consumer, of the deliveries and of the transcriptions
+    asyncio.get_event_loop().create_task(log_stats_periodically({
+        "RabbitMQ consumer": rabbitmq_consumer.stats,
+        "Delivery scheduler": converso_processor.delivery_scheduler.stats,
+        "Voice transcriber": bot.update_handler.voice_transcriber.stats
+    }))
+
     # Start the bot at last because it is a blocking operation
     bot.start()
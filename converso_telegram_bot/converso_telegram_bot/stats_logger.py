@@ -0,0 +1,32 @@
+"""
+Periodic log of the counters of the bot components.
+
+The bot serves no HTTP routes, so the stats of the RabbitMQ consumer, of the DeliveryScheduler
+and of the VoiceTranscriber are logged every STATS_LOG_INTERVAL seconds, one line per component.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two logs of the stats, 0 to never log them
+STATS_LOG_INTERVAL = float(os.environ.get("STATS_LOG_INTERVAL", 60))
+
+
+async def log_stats_periodically(
+    stats: Dict[str, Callable[[], dict]],
+    interval: float = STATS_LOG_INTERVAL
+) -> None:
+    """Logs the stats returned by each function, by component name, every interval seconds"""
+    if interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        for name, get_stats in stats.items():
+            try:
+                logger.info(f"{name} stats: {get_stats()}")
+            except Exception:
+                logger.exception(f"Cannot get the stats of {name}")
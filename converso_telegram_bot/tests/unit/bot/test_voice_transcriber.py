@@ -0,0 +1,71 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from converso_telegram_bot.bot.voice_transcriber import VoiceTranscriber
+
+from ..mocks import FakeBot
+
+
+class FakeTranscriptions:
+    """Stand-in of AsyncOpenAI().audio.transcriptions, failing with the errors given"""
+
+    def __init__(self) -> None:
+        self.files = []
+        self.errors = []
+
+    async def create(self, model: str, file: tuple, language: str):
+        self.files.append(file)
+        await asyncio.sleep(0.01)
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(text=f"Transcript of {len(file[1])} bytes")
+
+
+def _transcriber():
+    bot = FakeBot()
+    bot.files["file-1"] = b"voice"
+    transcriptions = FakeTranscriptions()
+    openai_client = SimpleNamespace(
+        audio=SimpleNamespace(transcriptions=transcriptions))
+    return VoiceTranscriber(bot, openai_client=openai_client), bot, transcriptions
+
+
+def _voice(file_id="file-1"):
+    return SimpleNamespace(file_id=file_id, file_unique_id=f"unique-{file_id}", duration=2)
+
+
+def test_voice_message_arriving_while_transcribed_is_transcribed_once():
+    async def main():
+        voice_transcriber, bot, transcriptions = _transcriber()
+        transcripts = await asyncio.gather(
+            voice_transcriber.transcribe(_voice()),
+            voice_transcriber.transcribe(_voice())
+        )
+        return transcripts, bot, transcriptions, voice_transcriber.stats()
+
+    transcripts, bot, transcriptions, stats = asyncio.run(main())
+
+    assert transcripts == ["Transcript of 5 bytes", "Transcript of 5 bytes"]
+    assert bot.calls == [("get_file", "file-1")]
+    assert transcriptions.files == [("audio.ogg", b"voice")]
+    assert stats["transcriptions"] == 1
+    assert stats["cache_hits"] == 1
+    assert stats["cached"] == 1
+
+
+def test_failed_transcription_is_retried_by_the_next_request():
+    async def main():
+        voice_transcriber, _, transcriptions = _transcriber()
+        transcriptions.errors = [RuntimeError("Service unavailable")]
+        with pytest.raises(RuntimeError):
+            await voice_transcriber.transcribe(_voice())
+        return await voice_transcriber.transcribe(_voice()), transcriptions, voice_transcriber.stats()
+
+    transcript, transcriptions, stats = asyncio.run(main())
+
+    assert transcript == "Transcript of 5 bytes"
+    assert len(transcriptions.files) == 2
+    assert stats["failures"] == 1
+    assert stats["transcriptions"] == 1
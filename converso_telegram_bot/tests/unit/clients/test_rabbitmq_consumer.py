@@ -0,0 +1,151 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from converso_telegram_bot.clients.rabbitmq.rabbitmq_consumer import (
+    RabbitMQConsumer, _AckBatcher)
+
+
+class FakeMessage:
+    """Stand-in of an aio_pika message, recording its acks"""
+
+    def __init__(self, delivery_tag: int, body, acks: list) -> None:
+        self.delivery_tag = delivery_tag
+        self.body = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.acks = acks
+
+    async def ack(self, multiple: bool = False) -> None:
+        self.acks.append((self.delivery_tag, multiple))
+
+
+class FakeExchange:
+
+    def __init__(self, acks: list) -> None:
+        self.acks = acks
+        self.published = []
+
+    async def publish(self, message, routing_key: str) -> None:
+        # Recorded in the acks, to check that the message is acked once dead-lettered
+        self.acks.append(("published", routing_key))
+        self.published.append(message)
+
+
+def _ack_batcher(batch_size=3, max_blocked=10):
+    # The interval is long enough that only full batches are acked during the tests
+    return _AckBatcher(batch_size=batch_size, interval=60, max_blocked=max_blocked)
+
+
+def _receive(ack_batcher, acks, delivery_tags):
+    return [ack_batcher.received(FakeMessage(delivery_tag, {}, acks)) for delivery_tag in delivery_tags]
+
+
+def test_messages_processed_without_gaps_are_acked_together():
+    acks = []
+
+    async def main():
+        ack_batcher = _ack_batcher()
+        first, second, third, fourth = _receive(ack_batcher, acks, [1, 2, 3, 4])
+        await ack_batcher.processed(second)
+        await ack_batcher.processed(third)
+        await ack_batcher.processed(fourth)
+        # The first message holds back the batch
+        acks_before_first = list(acks)
+        await ack_batcher.processed(first)
+        return acks_before_first, ack_batcher
+
+    acks_before_first, ack_batcher = asyncio.run(main())
+
+    assert acks_before_first == []
+    assert acks == [(4, True)]
+    assert len(ack_batcher.pending) == 0
+
+
+def test_messages_blocked_by_a_slow_one_are_acked_one_by_one():
+    acks = []
+
+    async def main():
+        ack_batcher = _ack_batcher(max_blocked=2)
+        slow, second, third = _receive(ack_batcher, acks, [1, 2, 3])
+        await ack_batcher.processed(second)
+        await ack_batcher.processed(third)
+        one_by_one = list(acks)
+        await ack_batcher.processed(slow)
+        await ack_batcher.flush()
+        return one_by_one
+
+    one_by_one = asyncio.run(main())
+
+    assert one_by_one == [(2, False), (3, False)]
+    assert acks == [(2, False), (3, False), (1, True)]
+
+
+def test_channel_opened_again_resets_the_batch():
+    acks = []
+
+    async def main():
+        ack_batcher = _ack_batcher(batch_size=2)
+        old_first, old_second = _receive(ack_batcher, acks, [1, 2])
+        await ack_batcher.processed(old_second)
+        # The channel is opened again, and the messages not acked are delivered again
+        first, second = _receive(ack_batcher, acks, [1, 2])
+        # Processing of a message received before, ending after the new deliveries
+        await ack_batcher.processed(old_first)
+        processed_count = ack_batcher.processed_count
+        await ack_batcher.processed(first)
+        await ack_batcher.processed(second)
+        return processed_count, first, second
+
+    processed_count, first, second = asyncio.run(main())
+
+    assert processed_count == 0
+    assert acks == [(2, True)]
+    assert second.message.acks is acks
+
+
+def test_poison_message_is_dead_lettered_then_acked():
+    acks = []
+
+    async def main():
+        async def on_message_callback(body):
+            raise AssertionError("not called")
+
+        consumer = RabbitMQConsumer(
+            on_message_callback, "converso_out", ack_batch_size=1,
+            dead_letter_queue="converso_out.dead_letter")
+        exchange = FakeExchange(acks)
+        consumer.channel = SimpleNamespace(default_exchange=exchange)
+        await consumer.on_message(FakeMessage(1, b"not json", acks))
+        return consumer, exchange
+
+    consumer, exchange = asyncio.run(main())
+
+    assert acks == [("published", "converso_out.dead_letter"), (1, True)]
+    assert exchange.published[0].body == b"not json"
+    assert exchange.published[0].headers["x-original-queue"] == "converso_out"
+    assert exchange.published[0].headers["x-error"].startswith("JSONDecodeError")
+    assert consumer.dead_lettered == 1
+
+
+def test_message_is_acked_once_its_delivery_completes():
+    acks = []
+
+    async def main():
+        delivered = asyncio.get_running_loop().create_future()
+
+        async def on_message_callback(body):
+            return delivered
+
+        consumer = RabbitMQConsumer(
+            on_message_callback, "converso_out", ack_batch_size=1)
+        task = asyncio.create_task(
+            consumer.on_message(FakeMessage(1, {"chat_id": "1"}, acks)))
+        await asyncio.sleep(0.01)
+        acks_before_delivery = list(acks)
+        delivered.set_result(1)
+        await task
+        return acks_before_delivery
+
+    acks_before_delivery = asyncio.run(main())
+
+    assert acks_before_delivery == []
+    assert acks == [(1, True)]
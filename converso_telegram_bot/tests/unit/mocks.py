@@ -0,0 +1,57 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+
+class FakeFile:
+
+    def __init__(self, content: bytes) -> None:
+        self.content = content
+
+    async def download_to_memory(self, out) -> None:
+        out.write(self.content)
+
+
+class FakeBot:
+    """
+    Stand-in of the telegram Bot, keeping the text of the messages sent and edited,
+    and serving the content of files by file_id.
+    The exceptions in errors are raised, in order, by the next calls.
+    """
+
+    def __init__(self) -> None:
+        self.messages: Dict[int, str] = {}
+        self.files: Dict[str, bytes] = {}
+        self.calls: List[tuple] = []
+        self.errors: List[Exception] = []
+        self.next_message_id = 1
+
+    async def send_message(self, chat_id: str, text: str, parse_mode: Optional[str] = None):
+        self.calls.append(("send_message", chat_id, text))
+        if self.errors:
+            raise self.errors.pop(0)
+        message_id = self.next_message_id
+        self.next_message_id += 1
+        self.messages[message_id] = text
+        return SimpleNamespace(message_id=message_id)
+
+    async def edit_message_text(
+        self,
+        chat_id: str,
+        message_id: int,
+        text: str,
+        parse_mode: Optional[str] = None
+    ):
+        self.calls.append(("edit_message_text", chat_id, message_id, text))
+        if self.errors:
+            raise self.errors.pop(0)
+        self.messages[message_id] = text
+        return True
+
+    async def get_file(self, file_id: str):
+        self.calls.append(("get_file", file_id))
+        if self.errors:
+            raise self.errors.pop(0)
+        # Lets the concurrent requests of the same file start meanwhile
+        await asyncio.sleep(0)
+        return FakeFile(self.files[file_id])
@@ -0,0 +1,80 @@
+import asyncio
+
+from converso_telegram_bot.consumer import ConversoProcessor
+from converso_telegram_bot.delivery_scheduler import DeliveryScheduler
+
+from .mocks import FakeBot
+
+
+def _process(messages):
+    """Processes the messages in order, and returns the bot once they are delivered"""
+    bot = FakeBot()
+
+    async def main():
+        delivery_scheduler = DeliveryScheduler(
+            bot, global_rate=1000, global_burst=1000, chat_rate=1000, chat_burst=1000)
+        processor = ConversoProcessor(bot, delivery_scheduler)
+        for message in messages:
+            await processor.on_message_callback(message)
+        await delivery_scheduler.join()
+
+    asyncio.run(main())
+    return bot
+
+
+def _delta(stream_id, content):
+    return {"type": "TEXT_DELTA", "chat_id": "1", "stream_id": stream_id, "content": content}
+
+
+def _text(content, stream_ids=()):
+    return {"type": "TEXT", "chat_id": "1", "content": content, "stream_ids": list(stream_ids)}
+
+
+def test_streamed_answer_is_edited_with_the_final_text():
+    bot = _process([
+        _delta("s1", "Hello"),
+        _delta("s1", " world"),
+        _text("Hello world!", stream_ids=["s1"])
+    ])
+
+    assert bot.messages == {1: "Hello world!"}
+    assert [call[0] for call in bot.calls].count("send_message") == 1
+
+
+def test_answer_without_stream_is_sent():
+    bot = _process([_text("Hello")])
+
+    assert bot.messages == {1: "Hello"}
+
+
+def test_later_stream_of_the_turn_replaces_the_previous_one():
+    bot = _process([
+        _delta("s1", "Let me check"),
+        _delta("s2", "It is"),
+        _delta("s2", " sunny"),
+        # Late delta of the replaced stream
+        _delta("s1", " the weather"),
+    ])
+
+    assert bot.messages == {1: "It is sunny"}
+
+
+def test_deltas_arriving_after_the_final_answer_are_ignored():
+    bot = _process([
+        _delta("s1", "Hello"),
+        _text("Hello world", stream_ids=["s1"]),
+        _delta("s1", " world"),
+    ])
+
+    assert bot.messages == {1: "Hello world"}
+
+
+def test_messages_of_other_turns_start_new_messages():
+    bot = _process([
+        _delta("s1", "First"),
+        _text("First answer", stream_ids=["s1"]),
+        _delta("s2", "Second"),
+        _text("Second answer", stream_ids=["s2"]),
+    ])
+
+    assert bot.messages == {1: "First answer", 2: "Second answer"}
@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+from telegram.error import BadRequest, RetryAfter
+
+from converso_telegram_bot.delivery_scheduler import DeliveryScheduler
+
+from .mocks import FakeBot
+
+
+def _scheduler(bot, **kwargs):
+    params = {"global_rate": 1000, "global_burst": 1000,
+              "chat_rate": 1000, "chat_burst": 1000, **kwargs}
+    return DeliveryScheduler(bot, **params)
+
+
+def test_edits_waiting_in_the_queue_are_merged():
+    bot = FakeBot()
+
+    async def main():
+        delivery_scheduler = _scheduler(bot)
+        message = delivery_scheduler.send_message("1", "Hello")
+        # Queued after the message while it's still waiting: only the latest text is sent
+        merged = delivery_scheduler.edit_message_text("1", message, "Hello world")
+        await delivery_scheduler.join()
+        first_edit = delivery_scheduler.edit_message_text("1", message, "Hello world!")
+        second_edit = delivery_scheduler.edit_message_text("1", message, "Hello world!!")
+        await delivery_scheduler.join()
+        return delivery_scheduler, message, merged, first_edit, second_edit
+
+    delivery_scheduler, message, merged, first_edit, second_edit = asyncio.run(main())
+
+    assert merged is message
+    assert second_edit is first_edit
+    assert bot.calls == [
+        ("send_message", "1", "Hello world"),
+        ("edit_message_text", "1", 1, "Hello world!!")
+    ]
+    assert delivery_scheduler.counters["coalesced"] == 2
+
+
+def test_retry_after_pauses_the_chat():
+    bot = FakeBot()
+    bot.errors = [RetryAfter(0.2)]
+
+    async def main():
+        delivery_scheduler = _scheduler(bot)
+        start = time.monotonic()
+        first = delivery_scheduler.send_message("1", "First")
+        second = delivery_scheduler.send_message("1", "Second")
+        other_chat = delivery_scheduler.send_message("2", "Other")
+        await other_chat
+        other_chat_delay = time.monotonic() - start
+        await first
+        first_delay = time.monotonic() - start
+        await second
+        return delivery_scheduler, other_chat_delay, first_delay
+
+    delivery_scheduler, other_chat_delay, first_delay = asyncio.run(main())
+
+    assert first_delay >= 0.2
+    assert other_chat_delay < 0.2
+    assert [call[2] for call in bot.calls if call[1] == "1"] == [
+        "First", "First", "Second"]
+    assert delivery_scheduler.counters["retries"] == 1
+
+
+def test_edit_of_a_message_not_delivered_is_skipped():
+    bot = FakeBot()
+    bot.errors = [BadRequest("Chat not found")]
+
+    async def main():
+        delivery_scheduler = _scheduler(bot)
+        message = delivery_scheduler.send_message("1", "Hello")
+        await delivery_scheduler.join()
+        edit = delivery_scheduler.edit_message_text("1", message, "Hello world")
+        return delivery_scheduler, await message, await edit
+
+    delivery_scheduler, message_id, edit_message_id = asyncio.run(main())
+
+    assert message_id is None
+    assert edit_message_id is None
+    assert bot.calls == [("send_message", "1", "Hello")]
+    assert delivery_scheduler.counters["failed"] == 1
+
+
+def test_edit_not_modifying_the_message_is_delivered():
+    bot = FakeBot()
+
+    async def main():
+        delivery_scheduler = _scheduler(bot)
+        message = delivery_scheduler.send_message("1", "Hello")
+        await message
+        bot.errors = [BadRequest(
+            "Message is not modified: specified new message content and reply markup are "
+            "exactly the same as a current content and reply markup of the message")]
+        edit = delivery_scheduler.edit_message_text("1", message, "Hello")
+        return delivery_scheduler, await edit
+
+    delivery_scheduler, edit_message_id = asyncio.run(main())
+
+    assert edit_message_id == 1
+    assert delivery_scheduler.counters["failed"] == 0
+
+
+def test_queuing_waits_while_the_queues_are_full():
+    bot = FakeBot()
+
+    async def main():
+        delivery_scheduler = _scheduler(
+            bot, chat_rate=10, chat_burst=1, max_queued=2)
+        delivery_scheduler.send_message("1", "First")
+        delivery_scheduler.send_message("1", "Second")
+        assert delivery_scheduler.stats()["queued"] == 2
+
+        await delivery_scheduler.wait_until_not_full()
+        queued = delivery_scheduler.stats()["queued"]
+        await delivery_scheduler.join()
+        return queued, delivery_scheduler.stats()["queued"]
+
+    queued, queued_after_join = asyncio.run(main())
+
+    assert queued == 1
+    assert queued_after_join == 0
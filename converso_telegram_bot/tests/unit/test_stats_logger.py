@@ -0,0 +1,29 @@
+import asyncio
+import logging
+
+from converso_telegram_bot.stats_logger import log_stats_periodically
+
+
+def test_stats_are_logged_every_interval(caplog):
+    def failing_stats():
+        raise RuntimeError("Not started")
+
+    async def main():
+        task = asyncio.create_task(log_stats_periodically({
+            "Consumer": lambda: {"acks": 3},
+            "Scheduler": failing_stats
+        }, interval=0.01))
+        await asyncio.sleep(0.035)
+        task.cancel()
+
+    with caplog.at_level(logging.INFO, logger="converso_telegram_bot.stats_logger"):
+        asyncio.run(main())
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages.count("Consumer stats: {'acks': 3}") >= 2
+    assert "Cannot get the stats of Scheduler" in messages
+
+
+def test_stats_are_not_logged_without_interval():
+    asyncio.run(asyncio.wait_for(
+        log_stats_periodically({"Consumer": dict}, interval=0), timeout=1))
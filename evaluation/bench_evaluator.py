@@ -0,0 +1,99 @@
+"""
+Wall time of an evaluation run by concurrency, offline.
+
+The conversations of --test-cases test cases are first recorded in a cassette from a local
+chat model answering after --llm-latency seconds, then replayed from the cassette with the
+recorded latency, with each of the --concurrency values. The stand-in never calls the target
+tool, so every conversation lasts until the max iterations, as the longest real ones.
+
+    python bench_evaluator.py --test-cases 16 --concurrency 1 4 8 --requests-per-minute 3000
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import evaluator
+import evaluator_helpers
+from evaluator_helpers import cassette_chat_model
+from results_loader import iter_evaluation_logs
+
+
+def use_cassette(mode: str, path: str, latency: str) -> None:
+    """The LLMs of the evaluation built from now on answer from the cassette"""
+    cassette_chat_model.LLM_CASSETTE_MODE = mode
+    cassette_chat_model.LLM_CASSETTE_PATH = path
+    cassette_chat_model.LLM_CASSETTE_LATENCY = latency
+
+
+def run(args, run_name: str, concurrency: int, test_cases: int) -> float:
+    start = time.perf_counter()
+    evaluator.run_evaluation(argparse.Namespace(
+        agent=args.agent,
+        run_name=run_name,
+        concurrency=concurrency,
+        requests_per_minute=args.requests_per_minute,
+        tool=None,
+        use_case=None,
+        shard=None,
+        shard_by="id"
+    ))
+    wall_time = time.perf_counter() - start
+    # The test cases failing with an error are not logged
+    logfile = os.path.join(evaluator.LOGS_PATH, args.agent, f"{run_name}.jsonl")
+    completed = sum(1 for _ in iter_evaluation_logs(logfile))
+    if completed != test_cases:
+        raise RuntimeError(f"{test_cases - completed} test cases of {run_name} failed")
+    return wall_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--agent", choices=["form", "basic"], default="form")
+    parser.add_argument("--test-cases", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests-per-minute", type=float, default=3000)
+    parser.add_argument("--llm-latency", type=float, default=0.2,
+                        help="Seconds of each recorded LLM response")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    # Set when evaluator.py is imported, and not reachable offline
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+    os.environ["OPENAI_API_KEY"] = "sk-..."
+    directory = tempfile.mkdtemp(prefix="converso_bench_evaluator_")
+    evaluator.LOGS_PATH = directory
+    evaluator_helpers.ChatOpenAI = lambda **params: FakeListChatModel(
+        responses=["Could you give me more details?"], sleep=args.llm_latency)
+    with open(evaluator.TEST_CASES_PATH) as f:
+        test_cases = json.load(f)[:args.test_cases]
+    evaluator.TEST_CASES_PATH = os.path.join(directory, "prompts.json")
+    with open(evaluator.TEST_CASES_PATH, "w") as f:
+        json.dump(test_cases, f)
+    cassette_path = os.path.join(directory, "cassette.jsonl")
+
+    use_cassette("record", cassette_path, "0")
+    recording = run(
+        args, "recorded", max(args.concurrency), len(test_cases))
+    print({"recorded_in_s": round(recording, 2),
+           **cassette_chat_model.get_cassette(cassette_path).stats()})
+
+    use_cassette("replay", cassette_path, "recorded")
+    for concurrency in args.concurrency:
+        wall_time = run(
+            args, f"replayed-{concurrency}", concurrency, len(test_cases))
+        print({
+            "concurrency": concurrency,
+            "test_cases": len(test_cases),
+            "wall_time_s": round(wall_time, 2),
+            "test_cases/min": round(len(test_cases) / wall_time * 60, 1)
+        })
+    print(cassette_chat_model.get_cassette(cassette_path).stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -13,14 +13,34 @@ For each output of every node of the conversational engine, the evaluator checks
 If it is, the evaluator raises a SuccessfulExecution exception.
 If the maximum number of iterations is reached, the evaluator raises a MaxIterationsReached exception and the test is considered failed.
 
-The results of the evaluation are logged in the logs folder.
+The results of the evaluation are logged in the logs folder, one JSON line per test case
+(see results_loader.py to read them).
 
 The evaluation is done for 2 different types of agents:
 - the BasicAgent, which uses the structured tools from Langchain
 - the FormAgent, which uses the form tools extension from Converso
+
+Test cases run concurrently in a pool of threads, and the LLM requests are rate limited.
+The test cases already in the log are skipped, so that a run started with the same
+--run-name resumes where it stopped. Runs can be split in shards, by tool, use case or id,
+each executed by a separate process:
+
+    python evaluator.py --agent form --concurrency 8 --requests-per-minute 500
+    python evaluator.py --run-name full --processes 4 --shard-by use_case
+    python evaluator.py --run-name full --shard 1/4 --shard-by use_case
+
+With LLM_CASSETTE_MODE=record the LLM responses are stored in a cassette, and with replay the
+evaluation runs again on them without network (see the cassette_chat_model.py of the chatbot).
+bench_evaluator.py measures the wall time of a run by concurrency in this way.
 """
+import argparse
 import json
+import logging
 import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 from evaluator_helpers import *
 
@@ -33,51 +53,57 @@ os.environ["LANGCHAIN_PROJECT"] = "converso-cost-analysis3"
 
 TEST_CASES_PATH = os.path.join(
     os.path.dirname(__file__), "prompts/prompts.json")
+LOGS_PATH = os.path.join(os.path.dirname(__file__), "logs")
+
+# Test cases run at the same time, and LLM requests per minute of all of them (user and agent)
+EVALUATION_CONCURRENCY = int(os.environ.get("EVALUATION_CONCURRENCY", 8))
+EVALUATION_REQUESTS_PER_MINUTE = float(
+    os.environ.get("EVALUATION_REQUESTS_PER_MINUTE", 500))
+
+GOODBYE_MESSAGES = ["Goodbye!", "Thank you!",
+                    "Thank you, you too!", "Thank you! Goodbye!"]
+
+
+def build_tools(agent: str) -> list:
+    if agent == "form":
+        from tools import form_tools as tools
+    else:
+        from tools import structured_tools as tools
+    return [
+        tools.GoogleCalendarCreatorEvaluation(),
+        tools.GoogleCalendarRetrieverEvaluation(),
+        tools.GmailRetrieverEvaluation(),
+        tools.GmailSenderEvaluation(),
+        tools.OnlinePurchaseEvaluation()
+    ]
+
+
+def run_test_case(
+    test_case: dict,
+    agent: str,
+    logfile: str,
+    rate_limiter: LLMRateLimiter
+) -> EvaluationLogger:
+    """Simulates the conversation of the test case, and returns the logger with its result"""
+
+    SystemModelClass = FormAgentExecutorForEvaluation if agent == "form" \
+        else BasicAgentExecutorForEvaluation
+    evaluation_logger = EvaluationLogger(type=agent, logfile=logfile)
 
-EVALUATE_FORM_AGENT = True
-if EVALUATE_FORM_AGENT:
-    from tools.form_tools import *
-    evaluation_logger = EvaluationLogger(type="form")
-    SystemModelClass = FormAgentExecutorForEvaluation
-else:
-    from tools.structured_tools import *
-    evaluation_logger = EvaluationLogger(type="basic")
-    SystemModelClass = BasicAgentExecutorForEvaluation
-
-test_cases = json.loads(open(TEST_CASES_PATH).read())
-
-# Hack to resume after a crash
-# test_cases = [test_cases[240:]]
-
-test_cases = [
-    test_case for test_case in test_cases if test_case["tool"] == "OnlinePurchase"]
-
-for test_case in test_cases:
     try:
-        id = test_case["id"]
-        prompt = test_case["prompt"]
-        tool = test_case["tool"]
-        payload = test_case["payload"]
-        use_case = test_case["use_case"]
-
-        user_model = UserLLMForEvaluation()
+        user_model = UserLLMForEvaluation(callbacks=[rate_limiter])
         system_model = SystemModelClass(
-            tools=[
-                GoogleCalendarCreatorEvaluation(),
-                GoogleCalendarRetrieverEvaluation(),
-                GmailRetrieverEvaluation(),
-                GmailSenderEvaluation(),
-                OnlinePurchaseEvaluation()
-            ],
+            tools=build_tools(agent),
             target_tool_call={
-                "tool": tool,
-                "payload": payload
+                "tool": test_case["tool"],
+                "payload": test_case["payload"]
             }
         )
 
-        evaluation_logger.start_new_log(id, prompt, use_case)
+        evaluation_logger.start_new_log(
+            test_case["id"], test_case["prompt"], test_case["use_case"])
 
-        user_response = user_model.execute_first(prompt)
+        user_response = user_model.execute_first(test_case["prompt"])
         evaluation_logger.log_user_message(user_response)
 
         while True:
@@ -86,7 +112,7 @@ for test_case in test_cases:
             user_response = user_model.execute(system_response)
             evaluation_logger.log_user_message(user_response)
 
-            if user_response in ["Goodbye!", "Thank you!", "Thank you, you too!", "Thank you! Goodbye!"]:
+            if user_response in GOODBYE_MESSAGES:
                 raise ConversationAborted()
     except SuccessfulExecution:
         evaluation_logger.log_result("Successful execution")
@@ -94,5 +120,107 @@ for test_case in test_cases:
         evaluation_logger.log_result("Max iterations reached")
     except ConversationAborted:
         evaluation_logger.log_result("Conversation aborted")
-    finally:
+    return evaluation_logger
+
+
+def select_shard(test_cases: list, shard: str, shard_by: str) -> list:
+    """
+    Test cases of the shard "index/count": the values of shard_by (tool, use_case or id)
+    are sorted and assigned to the shards in turn.
+    """
+    index, count = (int(value) for value in shard.split("/"))
+    if not 0 <= index < count:
+        raise ValueError(f"Invalid shard {shard}")
+    values = sorted({test_case[shard_by] for test_case in test_cases})
+    shard_values = set(values[index::count])
+    return [test_case for test_case in test_cases if test_case[shard_by] in shard_values]
+
+
+def run_evaluation(args) -> None:
+    test_cases = json.loads(open(TEST_CASES_PATH).read())
+    if args.tool:
+        test_cases = [
+            test_case for test_case in test_cases if test_case["tool"] in args.tool]
+    if args.use_case:
+        test_cases = [
+            test_case for test_case in test_cases if test_case["use_case"] in args.use_case]
+    run_name = args.run_name
+    if args.shard:
+        test_cases = select_shard(test_cases, args.shard, args.shard_by)
+        run_name = f"{run_name}-shard-{args.shard.replace('/', '-of-')}"
+
+    logfile = os.path.join(LOGS_PATH, args.agent, f"{run_name}.jsonl")
+    checkpoint = EvaluationCheckpoint(logfile)
+    pending = [
+        test_case for test_case in test_cases if not checkpoint.is_completed(test_case["id"])]
+    logging.info(
+        f"Run {run_name}: {len(pending)} test cases to run, {len(test_cases) - len(pending)} already completed")
+
+    rate_limiter = LLMRateLimiter(args.requests_per_minute)
+    limit_agent_llm_rate(rate_limiter)
+
+    def run(test_case: dict) -> None:
+        try:
+            evaluation_logger = run_test_case(
+                test_case, args.agent, logfile, rate_limiter)
+        except Exception as e:
+            # Not logged: the test case runs again when the run is resumed
+            logging.exception(f"Test case {test_case['id']} failed: {e}")
+            return
         evaluation_logger.dump()
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(run, pending))
+
+
+def run_processes(args) -> None:
+    """Runs every shard in a separate process, sharing the rate limit"""
+    arguments = [
+        "--agent", args.agent,
+        "--run-name", args.run_name,
+        "--concurrency", str(args.concurrency),
+        "--requests-per-minute", str(args.requests_per_minute / args.processes),
+        "--shard-by", args.shard_by
+    ]
+    if args.tool:
+        arguments += ["--tool", *args.tool]
+    if args.use_case:
+        arguments += ["--use-case", *args.use_case]
+
+    processes = [
+        subprocess.Popen([sys.executable, __file__, *arguments,
+                         "--shard", f"{index}/{args.processes}"])
+        for index in range(args.processes)
+    ]
+    return_codes = [process.wait() for process in processes]
+    if any(return_codes):
+        sys.exit(f"Shards failed with return codes {return_codes}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evaluates the conversational engine")
+    parser.add_argument("--agent", choices=["form", "basic"], default="form")
+    parser.add_argument("--run-name", default=datetime.now().strftime('%Y-%m-%d-%H%M%S'),
+                        help="Name of the log file: a run with the same name is resumed")
+    parser.add_argument("--concurrency", type=int,
+                        default=EVALUATION_CONCURRENCY)
+    parser.add_argument("--requests-per-minute", type=float,
+                        default=EVALUATION_REQUESTS_PER_MINUTE)
+    parser.add_argument("--tool", nargs="+",
+                        help="Runs only the test cases of these tools")
+    parser.add_argument("--use-case", nargs="+",
+                        help="Runs only the test cases of these use cases")
+    parser.add_argument("--shard-by", choices=["tool", "use_case", "id"], default="tool")
+    parser.add_argument("--shard", help="Runs only the shard index/count, e.g. 0/4")
+    parser.add_argument("--processes", type=int,
+                        help="Runs the shards in this many processes, with concurrency threads each")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    if args.processes:
+        run_processes(args)
+    else:
+        run_evaluation(args)
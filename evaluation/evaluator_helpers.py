@@ -1,17 +1,38 @@
+import atexit
 import json
 import os
+import sys
+import threading
+import time
 from datetime import datetime
-from typing import Any, Dict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set
 
 from langchain.agents.output_parsers.openai_tools import OpenAIToolAgentAction
 from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_openai import ChatOpenAI
 
+# The evaluation runs the installed converso package, and imports the tools and the
+# record/replay layer of the chat models from the chatbot next to it
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "converso_chatbot"))
+
 from converso.conversational_engine.form_agent.form_agent_executor import \
     FormAgentExecutor
+from converso.conversational_engine.form_agent import model_factory
+from converso_chatbot.conversational_engine.form_agent import cassette_chat_model
+from results_loader import iter_evaluation_logs
 
 LLM_MODEL = os.environ.get("LLM_MODEL", "gpt-3.5-turbo-0125")
 
+# The logs are synced to disk every EVALUATION_LOG_FSYNC_EVERY test cases, or after
+# EVALUATION_LOG_FSYNC_INTERVAL seconds
+EVALUATION_LOG_FSYNC_EVERY = int(
+    os.environ.get("EVALUATION_LOG_FSYNC_EVERY", 20))
+EVALUATION_LOG_FSYNC_INTERVAL = float(
+    os.environ.get("EVALUATION_LOG_FSYNC_INTERVAL", 5))
+
 
 class MaxIterationsReached(Exception):
     pass
@@ -59,12 +80,55 @@ def normalize_json(json_data):
     return json_data
 
 
+class LLMRateLimiter(BaseCallbackHandler):
+    """
+    Callback handler that spaces the LLM requests of all the threads, so that at most
+    requests_per_minute are sent. Each request waits for its slot before being sent.
+    """
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60 / requests_per_minute
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.wait()
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.wait()
+
+
+def limit_agent_llm_rate(rate_limiter: LLMRateLimiter):
+    """
+    The agents build their LLM with ModelFactory.build_llm at every step, calling ChatOpenAI
+    with its parameters: the ChatOpenAI of the model_factory module is replaced, so that
+    ModelFactory.build_llm keeps choosing the parameters, and the LLM gets the rate limiter
+    and answers from the cassette when LLM_CASSETTE_MODE is set
+    """
+
+    def build_rate_limited_llm(**params):
+        callbacks = [*(params.pop("callbacks", None) or []), rate_limiter]
+        return cassette_chat_model.create_chat_model(ChatOpenAI, callbacks=callbacks, **params)
+
+    model_factory.ChatOpenAI = build_rate_limited_llm
+
+
 class UserLLMForEvaluation:
-    def __init__(self):
-        self.llm = ChatOpenAI(
+    def __init__(self, callbacks: Optional[List[BaseCallbackHandler]] = None):
+        self.llm = cassette_chat_model.create_chat_model(
+            ChatOpenAI,
             model=LLM_MODEL,
             temperature=0,
-            verbose=True
+            verbose=True,
+            callbacks=callbacks
         )
         self.history = []
 
@@ -228,15 +292,82 @@ class BasicAgentExecutorForEvaluation(ExecutorForEvaluation):
             raise SuccessfulExecution()
 
 
+class JSONLWriter:
+    """
+    Appends records to a JSON Lines file, one line per record.
+
+    Every record is flushed as soon as it's written, so it survives a crash of the process,
+    and synced to disk in batches (fsync), so it survives a crash of the machine unless it's
+    in the last batch. Writes are serialized, so the threads of a run share the writer of
+    their file (see get_jsonl_writer), while processes write to different files.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fsync_every: int = EVALUATION_LOG_FSYNC_EVERY,
+        fsync_interval: float = EVALUATION_LOG_FSYNC_INTERVAL
+    ) -> None:
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A crash while writing leaves a truncated line: the next record starts on a new one
+        truncated = False
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                truncated = f.read(1) != b"\n"
+        self.file = open(path, "a", encoding="utf-8")
+        if truncated:
+            self.file.write("\n")
+
+    def write(self, record: dict) -> None:
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            self.unsynced += 1
+            if self.unsynced >= self.fsync_every or \
+                    time.monotonic() - self.synced_at >= self.fsync_interval:
+                self._sync()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file.closed:
+                return
+            self._sync()
+            self.file.close()
+
+    def _sync(self) -> None:
+        if self.unsynced:
+            os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+
+@lru_cache(maxsize=None)
+def get_jsonl_writer(path: str) -> JSONLWriter:
+    """The writer of the file shared by the loggers of the process, closed at exit"""
+    writer = JSONLWriter(path)
+    atexit.register(writer.close)
+    return writer
+
+
 class EvaluationLogger:
 
     def __init__(
         self,
-        type: str
+        type: str,
+        logfile: Optional[str] = None
     ) -> None:
         self.type = type
-        self.logfile = os.path.join(
-            os.path.dirname(__file__), "logs", self.type, f"{datetime.now().strftime('%Y-%m-%d-%H%M%S')}.json")
+        self.logfile = logfile or os.path.join(
+            os.path.dirname(__file__), "logs", self.type, f"{datetime.now().strftime('%Y-%m-%d-%H%M%S')}.jsonl")
 
         self.log = {
             "id": None,
@@ -272,10 +403,20 @@ class EvaluationLogger:
         self.log["result"] = result
 
     def dump(self):
-        if not os.path.exists(self.logfile):
-            open(self.logfile, "w").write("[]")
+        get_jsonl_writer(self.logfile).write(self.log)
+
+
+class EvaluationCheckpoint:
+    """
+    Ids of the test cases completed by a run, so that the run can be resumed.
+    They are the ones in the log of the run: a test case is completed once its log is dumped,
+    and the log and the checkpoint can't disagree after a crash.
+    """
+
+    def __init__(self, logfile: str) -> None:
+        self.completed: Set[str] = {
+            str(log["id"]) for log in iter_evaluation_logs(logfile) if log.get("result")
+        }
 
-        logs = json.loads(open(self.logfile).read())
-        logs.append(self.log)
-        with open(self.logfile, "w") as f:
-            f.write(json.dumps(logs, indent=4))
+    def is_completed(self, id) -> bool:
+        return str(id) in self.completed
@@ -0,0 +1,150 @@
+"""
+Module used to load the results of the evaluation.
+
+The logs are read one test case at a time, both the JSON Lines logs written by the
+EvaluationLogger and the JSON array logs of the previous runs (e.g. logs/form/final.json),
+so a run of any size is loaded without reading it all in memory.
+
+The results are counted by agent type and tool or use case, as in the tables behind
+result_percentage_by_tool.png and result_percentage_by_use_case.png:
+
+    python results_loader.py --basic logs/basic/final.json --form logs/form/final.json
+"""
+import argparse
+import json
+import logging
+import os
+from collections import Counter, defaultdict
+from typing import Dict, Iterator, Tuple
+
+PROMPTS_PATH = os.path.join(os.path.dirname(__file__), "prompts/prompts.json")
+
+# Conversations aborted are failures as the ones reaching the max iterations
+RESULT_LABELS = {
+    "Successful execution": "Success",
+    "Max iterations reached": "Failure",
+    "Conversation aborted": "Failure"
+}
+
+_CHUNK_SIZE = 64 * 1024
+
+
+def iter_evaluation_logs(path: str) -> Iterator[dict]:
+    """The logs of the test cases in the file, in order. Yields nothing if the file doesn't exist"""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first == "[":
+            yield from _iter_json_array(f)
+        else:
+            yield from _iter_json_lines(f)
+
+
+def _iter_json_lines(f) -> Iterator[dict]:
+    for number, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            # The last line of a run that crashed while writing it
+            logging.warning(
+                f"Skipping the invalid line {number} of {f.name}")
+
+
+def _iter_json_array(f) -> Iterator[dict]:
+    decoder = json.JSONDecoder()
+    buffer = f.read(_CHUNK_SIZE).lstrip()[1:]
+    end_of_file = False
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            item, index = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if end_of_file:
+                logging.warning(f"Skipping the incomplete end of {f.name}")
+                return
+            chunk = f.read(_CHUNK_SIZE)
+            end_of_file = not chunk
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[index:]
+
+
+def load_test_cases(path: str = PROMPTS_PATH) -> Dict[int, dict]:
+    """Tool and use case of the test cases, by id"""
+    with open(path, encoding="utf-8") as f:
+        return {
+            test_case["id"]: {
+                "tool": test_case["tool"],
+                "use_case": test_case["use_case"]
+            }
+            for test_case in json.load(f)
+        }
+
+
+def count_results(
+    logs: Dict[str, str],
+    by: str,
+    prompts_path: str = PROMPTS_PATH
+) -> Dict[Tuple[str, str], Counter]:
+    """
+    Counts the results of the logs by agent type and by the "tool" or "use_case" of the test cases.
+    logs maps the agent type (basic, form) to its log file.
+    """
+    test_cases = load_test_cases(prompts_path)
+    counts: Dict[Tuple[str, str], Counter] = defaultdict(Counter)
+    for type, path in logs.items():
+        for log in iter_evaluation_logs(path):
+            if log.get("result") is None or log.get("id") not in test_cases:
+                continue
+            result = RESULT_LABELS.get(log["result"], log["result"])
+            counts[(type, test_cases[log["id"]][by])][result] += 1
+    return dict(counts)
+
+
+def result_percentages(counts: Dict[Tuple[str, str], Counter]) -> Dict[Tuple[str, str], Dict[str, float]]:
+    """Share of each result in the counts of every row"""
+    return {
+        key: {result: count / sum(row.values()) for result, count in row.items()}
+        for key, row in counts.items()
+    }
+
+
+def to_dataframe(table: Dict[Tuple[str, str], Dict[str, float]]):
+    """The table as a pandas DataFrame indexed by type and tool (or use case), as in evaluation.ipynb"""
+    import pandas as pd
+
+    return pd.DataFrame.from_dict(table, orient="index").fillna(0).sort_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Prints the results of the evaluation by tool and use case")
+    parser.add_argument("--basic", help="Log of the basic agent")
+    parser.add_argument("--form", help="Log of the form agent")
+    args = parser.parse_args()
+
+    logs = {type: path for type, path in (
+        ("basic", args.basic), ("form", args.form)) if path}
+    for by in ("tool", "use_case"):
+        counts = count_results(logs, by)
+        percentages = result_percentages(counts)
+        print(f"\nResults by {by}")
+        for key in sorted(counts):
+            row = ", ".join(
+                f"{result}: {count} ({percentages[key][result]:.1%})"
+                for result, count in sorted(counts[key].items())
+            )
+            print(f"{key[0]:<6} {key[1]:<32} {row}")
+
+
+if __name__ == "__main__":
+    main()
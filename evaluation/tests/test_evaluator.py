@@ -0,0 +1,144 @@
+import argparse
+import json
+import threading
+import time
+
+import pytest
+
+import evaluator
+from converso.conversational_engine.form_agent import model_factory
+from evaluator_helpers import (EvaluationLogger, LLMRateLimiter,
+                               limit_agent_llm_rate)
+
+TEST_CASES = [
+    {"id": id, "tool": tool, "use_case": use_case, "prompt": f"Prompt {id}", "payload": {}}
+    for id, (tool, use_case) in enumerate([
+        ("GmailSender", "CONFUSED_USER"),
+        ("GmailSender", "ALL_INFORMATION_FIRST_MESSAGE"),
+        ("OnlinePurchase", "CONFUSED_USER"),
+        ("GoogleCalendarCreator", "CONFUSED_USER"),
+        ("OnlinePurchase", "NO_INFORMATION_FIRST_MESSAGE")
+    ], start=1)
+]
+
+
+def _args(**kwargs):
+    return argparse.Namespace(**{
+        "agent": "form",
+        "run_name": "run",
+        "concurrency": 2,
+        "requests_per_minute": 60000,
+        "tool": None,
+        "use_case": None,
+        "shard": None,
+        "shard_by": "tool",
+        **kwargs
+    })
+
+
+def test_shards_split_the_test_cases_by_value():
+    shards = [evaluator.select_shard(TEST_CASES, f"{index}/2", "tool")
+              for index in range(2)]
+
+    # Tools sorted: GmailSender, GoogleCalendarCreator, OnlinePurchase
+    assert [test_case["id"] for test_case in shards[0]] == [1, 2, 3, 5]
+    assert [test_case["id"] for test_case in shards[1]] == [4]
+    assert evaluator.select_shard(TEST_CASES, "0/1", "id") == TEST_CASES
+
+
+def test_invalid_shard():
+    with pytest.raises(ValueError):
+        evaluator.select_shard(TEST_CASES, "2/2", "tool")
+
+
+class EvaluationRun:
+    """Runs the test cases with a stand-in of run_test_case, failing for the ids in failing"""
+
+    def __init__(self) -> None:
+        self.executed = []
+        self.failing = set()
+        self.lock = threading.Lock()
+
+    def run_test_case(self, test_case, agent, logfile, rate_limiter):
+        with self.lock:
+            self.executed.append(test_case["id"])
+        if test_case["id"] in self.failing:
+            raise RuntimeError("Connection reset")
+        evaluation_logger = EvaluationLogger(type=agent, logfile=logfile)
+        evaluation_logger.start_new_log(
+            test_case["id"], test_case["prompt"], test_case["use_case"])
+        evaluation_logger.log_result("Successful execution")
+        return evaluation_logger
+
+
+@pytest.fixture
+def evaluation_run(tmp_path, monkeypatch):
+    test_cases_path = tmp_path / "prompts.json"
+    test_cases_path.write_text(json.dumps(TEST_CASES))
+    evaluation_run = EvaluationRun()
+    monkeypatch.setattr(evaluator, "TEST_CASES_PATH", str(test_cases_path))
+    monkeypatch.setattr(evaluator, "LOGS_PATH", str(tmp_path / "logs"))
+    monkeypatch.setattr(evaluator, "limit_agent_llm_rate", lambda rate_limiter: None)
+    monkeypatch.setattr(evaluator, "run_test_case", evaluation_run.run_test_case)
+    return evaluation_run
+
+
+def test_resumed_run_executes_only_the_test_cases_not_logged(evaluation_run, tmp_path):
+    evaluation_run.failing.add(2)
+    evaluator.run_evaluation(_args())
+    first_run = sorted(evaluation_run.executed)
+    evaluation_run.failing.clear()
+    evaluation_run.executed.clear()
+
+    evaluator.run_evaluation(_args())
+
+    assert first_run == [1, 2, 3, 4, 5]
+    # The failed test case was not logged, so it runs again
+    assert evaluation_run.executed == [2]
+    logs = [json.loads(line) for line in (
+        tmp_path / "logs" / "form" / "run.jsonl").read_text().splitlines()]
+    assert sorted(log["id"] for log in logs) == [1, 2, 3, 4, 5]
+
+
+def test_shards_have_their_own_log(evaluation_run, tmp_path):
+    evaluator.run_evaluation(_args(shard="1/2"))
+
+    assert evaluation_run.executed == [4]
+    assert (tmp_path / "logs" / "form" / "run-shard-1-of-2.jsonl").exists()
+
+
+def test_rate_limiter_spaces_the_requests_of_all_the_threads():
+    rate_limiter = LLMRateLimiter(requests_per_minute=600)
+    sent_at = []
+    lock = threading.Lock()
+
+    def send():
+        rate_limiter.wait()
+        with lock:
+            sent_at.append(time.monotonic())
+
+    threads = [threading.Thread(target=send) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    sent_at.sort()
+    intervals = [later - earlier for earlier, later in zip(sent_at, sent_at[1:])]
+    assert min(intervals) >= 0.09
+    assert sent_at[-1] - sent_at[0] < 0.5
+
+
+def test_agent_llms_keep_the_parameters_of_the_model_factory(monkeypatch):
+    # evaluator.py empties the key when imported
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-...")
+    # Restored at the end of the test
+    monkeypatch.setattr(model_factory, "ChatOpenAI", model_factory.ChatOpenAI)
+    rate_limiter = LLMRateLimiter(requests_per_minute=600)
+
+    limit_agent_llm_rate(rate_limiter)
+    llm = model_factory.ModelFactory.build_llm("GmailSender")
+
+    assert llm.callbacks == [rate_limiter]
+    assert llm.model_name == model_factory.LLM_MODEL
+    assert llm.model_kwargs["tool_choice"]["function"]["name"] == "GmailSender"
@@ -0,0 +1,32 @@
+import json
+
+from evaluator_helpers import JSONLWriter
+from results_loader import iter_evaluation_logs
+
+
+def test_records_are_appended_one_per_line(tmp_path):
+    path = tmp_path / "logs" / "run.jsonl"
+    writer = JSONLWriter(str(path), fsync_every=2)
+    writer.write({"id": 1})
+    # Flushed before being synced
+    assert path.read_text() == '{"id": 1}\n'
+    writer.write({"id": 2})
+    writer.close()
+
+    writer = JSONLWriter(str(path))
+    writer.write({"id": 3})
+    writer.close()
+
+    assert [json.loads(line) for line in path.read_text().splitlines()] == [
+        {"id": 1}, {"id": 2}, {"id": 3}]
+
+
+def test_record_after_a_truncated_line_starts_a_new_line(tmp_path):
+    path = tmp_path / "run.jsonl"
+    path.write_text('{"id": 1}\n{"id": 2, "mess')
+
+    writer = JSONLWriter(str(path))
+    writer.write({"id": 3})
+    writer.close()
+
+    assert list(iter_evaluation_logs(str(path))) == [{"id": 1}, {"id": 3}]
@@ -0,0 +1,67 @@
+import json
+from collections import Counter
+
+import results_loader
+from results_loader import count_results, iter_evaluation_logs
+
+LOGS = [
+    {"id": id, "messages": [{"User": "Hi " * 20}], "result": "Successful execution"}
+    for id in range(1, 6)
+]
+
+
+def test_json_lines_logs_are_read_in_order(tmp_path):
+    path = tmp_path / "run.jsonl"
+    path.write_text("".join(json.dumps(log) + "\n" for log in LOGS))
+
+    assert list(iter_evaluation_logs(str(path))) == LOGS
+
+
+def test_truncated_last_line_is_skipped(tmp_path):
+    path = tmp_path / "run.jsonl"
+    path.write_text(
+        "".join(json.dumps(log) + "\n" for log in LOGS[:2]) + json.dumps(LOGS[2])[:30])
+
+    assert list(iter_evaluation_logs(str(path))) == LOGS[:2]
+
+
+def test_json_array_is_read_across_chunks(tmp_path, monkeypatch):
+    # The chunks end in the middle of the objects
+    monkeypatch.setattr(results_loader, "_CHUNK_SIZE", 16)
+    path = tmp_path / "final.json"
+    path.write_text(json.dumps(LOGS, indent=4))
+
+    assert list(iter_evaluation_logs(str(path))) == LOGS
+
+
+def test_incomplete_end_of_json_array_is_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr(results_loader, "_CHUNK_SIZE", 16)
+    path = tmp_path / "final.json"
+    content = json.dumps(LOGS)
+    # Written until the middle of the last object
+    path.write_text(content[:content.rindex("{") + 20])
+
+    assert list(iter_evaluation_logs(str(path))) == LOGS[:-1]
+
+
+def test_missing_log_has_no_test_cases(tmp_path):
+    assert list(iter_evaluation_logs(str(tmp_path / "missing.jsonl"))) == []
+
+
+def test_results_are_counted_by_tool(tmp_path):
+    prompts_path = tmp_path / "prompts.json"
+    prompts_path.write_text(json.dumps([
+        {"id": 1, "tool": "GmailSender", "use_case": "CONFUSED_USER"},
+        {"id": 2, "tool": "GmailSender", "use_case": "CONFUSED_USER"}
+    ]))
+    path = tmp_path / "run.jsonl"
+    path.write_text("\n".join(json.dumps(log) for log in [
+        {"id": 1, "result": "Successful execution"},
+        {"id": 2, "result": "Conversation aborted"},
+        # Not in the test cases
+        {"id": 3, "result": "Successful execution"}
+    ]))
+
+    counts = count_results({"form": str(path)}, "tool", str(prompts_path))
+
+    assert counts == {("form", "GmailSender"): Counter(Success=1, Failure=1)}